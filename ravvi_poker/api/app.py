@@ -4,6 +4,7 @@ from fastapi import FastAPI, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
 
 from ..db import DBI
+from .utils import CodecJSONResponse
 
 from . import users
 from . import auth
@@ -15,6 +16,7 @@ from . import ws
 from . import engine
 from . import info
 from . import chips
+from . import games
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +37,7 @@ async def lifespan(app: FastAPI):
     # shutdown end
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=CodecJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -54,6 +56,7 @@ v1.include_router(clubs.router.router)
 v1.include_router(tables.router.router)
 v1.include_router(info.router.router)
 v1.include_router(chips.router.router)
+v1.include_router(games.router.router)
 v1.include_router(ws.router)
 
 
@@ -0,0 +1 @@
+from . import history
\ No newline at end of file
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from fastapi import HTTPException, Query
+from starlette.status import HTTP_404_NOT_FOUND
+
+from .router import *
+from ..utils import SessionUUID, get_session_and_user
+from ...db import DBI
+from ...engine.history import decode_hand
+
+
+def get_hand_info(row, user_id):
+    return dict(
+        game_id=row.game_id,
+        table_id=row.table_id,
+        begin_ts=row.begin_ts,
+        end_ts=row.end_ts,
+        **decode_hand(row.data, user_id=user_id)
+    )
+
+
+@router.get("/history", status_code=200, summary="Get user hands history")
+async def v1_get_games_history(session_uuid: SessionUUID,
+                               table_id: int | None = None,
+                               ts_from: datetime | None = None,
+                               ts_to: datetime | None = None,
+                               before_id: int | None = None,
+                               limit: int = Query(default=50, ge=1, le=200)):
+    async with DBI() as db:
+        _, user = await get_session_and_user(db, session_uuid)
+        rows = await db.get_games_history(user_id=user.id, table_id=table_id, ts_from=ts_from, ts_to=ts_to,
+                                          before_id=before_id, limit=limit)
+    return [get_hand_info(row, user.id) for row in rows]
+
+
+@router.get("/{game_id}/history", status_code=200, summary="Get hand history")
+async def v1_get_game_history(game_id: int, session_uuid: SessionUUID):
+    async with DBI() as db:
+        _, user = await get_session_and_user(db, session_uuid)
+        row = await db.get_game_history(game_id)
+    if not row or user.id not in row.user_ids:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Game not found")
+    return get_hand_info(row, user.id)
@@ -0,0 +1,3 @@
+from fastapi import APIRouter
+
+router = APIRouter(prefix="/games", tags=["games"])
\ No newline at end of file
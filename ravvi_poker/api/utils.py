@@ -5,8 +5,10 @@ from typing import Annotated
 from starlette.status import HTTP_400_BAD_REQUEST, HTTP_401_UNAUTHORIZED, HTTP_403_FORBIDDEN, HTTP_404_NOT_FOUND
 from fastapi import Depends
 from fastapi.exceptions import HTTPException
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordBearer
 
+from .. import codec
 from ..db import DBI
 from ..engine.jwt import jwt_get
 
@@ -14,6 +16,14 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login_form")
 
 forbidden_words = ['fuck', 'shit', 'f*ck', 'f**k']
 
+
+class CodecJSONResponse(JSONResponse):
+    """Ответы api через общий JSON кодек"""
+
+    def render(self, content) -> bytes:
+        return codec.dumpb(content)
+
+
 async def get_current_session_uuid(access_token: Annotated[str, Depends(oauth2_scheme)]):
     session_uuid = jwt_get(access_token, "session_uuid")
     if not session_uuid:
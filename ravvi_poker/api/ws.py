@@ -43,3 +43,11 @@ async def v1_ws_endpoint(ws: WebSocket, access_token: str = None):
     await client.recv_commands()
 
 
+
+
+@router.get("/ws/stats", summary="Current user clients outbound queues stats")
+async def v1_ws_stats(session_uuid: SessionUUID):
+    async with DBI() as db:
+        _, user = await get_session_and_user(db, session_uuid)
+    # только клиенты пользователя сессии
+    return manager.get_clients_stats(user_id=user.id)
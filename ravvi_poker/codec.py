@@ -0,0 +1,76 @@
+"""JSON для БД, оповещений, websocket и api
+
+Используется orjson, если он установлен (pip install ravvi_poker[fast]), иначе стандартный json.
+Decimal записывается числом без потери цифр (как str(Decimal)): orjson.Fragment, если поддерживается,
+иначе default возвращает строку с меткой, а метка в готовом JSON заменяется цифрами.
+"""
+import re
+import json
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+Fragment = getattr(orjson, "Fragment", None)
+
+# управляющий символ в строке всегда экранируется (\u0000), в данных игры его нет
+DECIMAL_MARK = "\x00decimal:"
+DECIMAL_MARK_ESCAPED = "\\u0000decimal:"
+DECIMAL_RE = re.compile(r'"\\u0000decimal:([-+.0-9eE]+)"')
+DECIMAL_RE_BYTES = re.compile(DECIMAL_RE.pattern.encode())
+
+
+def default(x):
+    """Типы, которые не кодируются напрямую"""
+    if isinstance(x, Decimal):
+        if not x.is_finite():
+            return float(x)
+        if Fragment is not None:
+            return Fragment(str(x))
+        return DECIMAL_MARK + str(x)
+    if hasattr(x, "__int__"):
+        return int(x)
+    if hasattr(x, "__str__"):
+        return str(x)
+    type_name = x.__class__.__name__
+    raise TypeError(f"Object of type {type_name} is not serializable")
+
+
+def put_decimals(data: str) -> str:
+    if DECIMAL_MARK_ESCAPED not in data:
+        return data
+    return DECIMAL_RE.sub(r"\1", data)
+
+
+def put_decimals_bytes(data: bytes) -> bytes:
+    if DECIMAL_MARK_ESCAPED.encode() not in data:
+        return data
+    return DECIMAL_RE_BYTES.sub(rb"\1", data)
+
+
+if orjson is not None:
+    BACKEND = "orjson"
+    # datetime как и в стандартном json передается в default (str), ключи словарей приводятся к строкам
+    OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def dumpb(obj) -> bytes:
+        return put_decimals_bytes(orjson.dumps(obj, default=default, option=OPTIONS))
+
+    def dumps(obj) -> str:
+        return put_decimals(orjson.dumps(obj, default=default, option=OPTIONS).decode())
+
+    loads = orjson.loads
+
+else:  # pragma: no cover
+    BACKEND = "json"
+    _encoder = json.JSONEncoder(default=default, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(obj) -> str:
+        return put_decimals(_encoder.encode(obj))
+
+    def dumpb(obj) -> bytes:
+        return dumps(obj).encode()
+
+    loads = json.loads
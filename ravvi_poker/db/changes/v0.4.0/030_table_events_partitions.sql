@@ -0,0 +1,170 @@
+-- table_cmd / table_msg: разделы по дням (created_ts), архив и удаление старых разделов
+-- применение: ravvi_poker_db migrate <database> v0.4.0, обслуживание: ravvi_poker_db partitions <database>
+-- скрипт повторяемый: уже разбитая на разделы таблица не изменяется
+-- существующая таблица подключается разделом <table>_legacy (до конца текущего дня) без копирования данных,
+-- первичный ключ раздела включает created_ts: ссылка table_msg.cmd_id -> table_cmd удаляется
+-- (журнал команд архивируется независимо от сообщений)
+-- последовательности остаются CACHE 1: кэш выдает id не по порядку записи, а догрузка после переподключения
+-- (id > last_id) рассчитывает на возрастание id
+
+-- архив: одна запись на стол и день, строки раздела в порядке id (jsonb сжимается TOAST)
+CREATE TABLE IF NOT EXISTS public.table_cmd_archive (
+    table_id bigint NOT NULL,
+    day date NOT NULL,
+    id_first bigint NOT NULL,
+    id_last bigint NOT NULL,
+    rows_count integer NOT NULL,
+    data jsonb NOT NULL,
+    archived_ts timestamp without time zone DEFAULT public.now_utc() NOT NULL,
+    CONSTRAINT table_cmd_archive_pkey PRIMARY KEY (table_id, id_first)
+);
+
+CREATE TABLE IF NOT EXISTS public.table_msg_archive (
+    table_id bigint NOT NULL,
+    day date NOT NULL,
+    id_first bigint NOT NULL,
+    id_last bigint NOT NULL,
+    rows_count integer NOT NULL,
+    data jsonb NOT NULL,
+    archived_ts timestamp without time zone DEFAULT public.now_utc() NOT NULL,
+    CONSTRAINT table_msg_archive_pkey PRIMARY KEY (table_id, id_first)
+);
+
+DO $$
+DECLARE
+  cutover timestamp := date_trunc('day', public.now_utc()) + interval '1 day';
+BEGIN
+  IF (SELECT relkind FROM pg_class WHERE oid = 'public.table_cmd'::regclass) = 'r' THEN
+    ALTER TABLE public.table_msg DROP CONSTRAINT IF EXISTS table_msg_fk_cmd;
+    ALTER TABLE public.table_cmd RENAME TO table_cmd_legacy;
+    -- ключ раздела (id, created_ts) строится при подключении
+    ALTER TABLE public.table_cmd_legacy DROP CONSTRAINT table_cmd_pkey;
+    DROP TRIGGER IF EXISTS table_cmd_created_trg ON public.table_cmd_legacy;
+    CREATE TABLE public.table_cmd (
+        id bigint DEFAULT nextval('public.table_cmd_id_seq'::regclass) NOT NULL,
+        client_id bigint NOT NULL,
+        table_id bigint NOT NULL,
+        cmd_type integer NOT NULL,
+        props jsonb,
+        created_ts timestamp without time zone DEFAULT public.now_utc() NOT NULL,
+        processed_ts timestamp without time zone,
+        CONSTRAINT table_cmd_pkey PRIMARY KEY (id, created_ts),
+        CONSTRAINT table_cmd_fk_client FOREIGN KEY (client_id) REFERENCES public.user_client(id) ON UPDATE RESTRICT ON DELETE RESTRICT,
+        CONSTRAINT table_cmd_fk_table FOREIGN KEY (table_id) REFERENCES public.table_profile(id) ON UPDATE RESTRICT ON DELETE CASCADE
+    ) PARTITION BY RANGE (created_ts);
+    ALTER SEQUENCE public.table_cmd_id_seq OWNED BY public.table_cmd.id;
+    -- граница раздела проверена ограничением: подключение без просмотра таблицы
+    EXECUTE format('ALTER TABLE public.table_cmd_legacy ADD CONSTRAINT table_cmd_legacy_bound CHECK (created_ts < %L)', cutover);
+    EXECUTE format('ALTER TABLE public.table_cmd ATTACH PARTITION public.table_cmd_legacy FOR VALUES FROM (MINVALUE) TO (%L)', cutover);
+    CREATE TABLE public.table_cmd_default PARTITION OF public.table_cmd DEFAULT;
+  END IF;
+
+  IF (SELECT relkind FROM pg_class WHERE oid = 'public.table_msg'::regclass) = 'r' THEN
+    ALTER TABLE public.table_msg RENAME TO table_msg_legacy;
+    -- ключ раздела (id, created_ts) строится при подключении
+    ALTER TABLE public.table_msg_legacy DROP CONSTRAINT table_msg_pkey;
+    ALTER INDEX IF EXISTS public.table_msg_idx_table RENAME TO table_msg_legacy_idx_table;
+    DROP TRIGGER IF EXISTS table_msg_created_trg ON public.table_msg_legacy;
+    CREATE TABLE public.table_msg (
+        id bigint DEFAULT nextval('public.table_msg_id_seq'::regclass) NOT NULL,
+        cmd_id bigint,
+        client_id bigint,
+        table_id bigint NOT NULL,
+        game_id bigint,
+        msg_type integer NOT NULL,
+        props jsonb,
+        created_ts timestamp without time zone DEFAULT public.now_utc() NOT NULL,
+        CONSTRAINT table_msg_pkey PRIMARY KEY (id, created_ts),
+        CONSTRAINT table_msg_fk_client FOREIGN KEY (client_id) REFERENCES public.user_client(id) ON UPDATE RESTRICT ON DELETE RESTRICT,
+        CONSTRAINT table_msg_fk_game FOREIGN KEY (game_id) REFERENCES public.game_profile(id) ON UPDATE RESTRICT ON DELETE RESTRICT,
+        CONSTRAINT table_msg_fk_table FOREIGN KEY (table_id) REFERENCES public.table_profile(id) ON UPDATE RESTRICT ON DELETE RESTRICT
+    ) PARTITION BY RANGE (created_ts);
+    ALTER SEQUENCE public.table_msg_id_seq OWNED BY public.table_msg.id;
+    EXECUTE format('ALTER TABLE public.table_msg_legacy ADD CONSTRAINT table_msg_legacy_bound CHECK (created_ts < %L)', cutover);
+    EXECUTE format('ALTER TABLE public.table_msg ATTACH PARTITION public.table_msg_legacy FOR VALUES FROM (MINVALUE) TO (%L)', cutover);
+    CREATE TABLE public.table_msg_default PARTITION OF public.table_msg DEFAULT;
+  END IF;
+END $$;
+
+-- индексы создаются на всех разделах
+-- догрузка необработанных команд (get_table_cmds_after)
+CREATE INDEX IF NOT EXISTS table_cmd_idx_pending ON public.table_cmd USING btree (id) WHERE processed_ts IS NULL;
+-- догрузка сообщений стола (get_table_msgs_after) и клиентов (get_client_msgs_after)
+CREATE INDEX IF NOT EXISTS table_msg_idx_table ON public.table_msg USING btree (table_id, id);
+CREATE INDEX IF NOT EXISTS table_msg_idx_client ON public.table_msg USING btree (id) WHERE client_id IS NOT NULL;
+
+-- триггеры оповещений (011_table_events.sql) на разбитых таблицах
+DROP TRIGGER IF EXISTS table_cmd_created_trg ON public.table_cmd;
+CREATE TRIGGER table_cmd_created_trg AFTER INSERT ON public.table_cmd FOR EACH ROW EXECUTE FUNCTION public.table_cmd_created_trg_func();
+DROP TRIGGER IF EXISTS table_msg_created_trg ON public.table_msg;
+CREATE TRIGGER table_msg_created_trg AFTER INSERT ON public.table_msg REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION public.table_msg_created_trg_func();
+
+-- разделы таблицы и их границы (NULL: MINVALUE или раздел по умолчанию)
+CREATE OR REPLACE FUNCTION public.table_events_partitions(parent varchar)
+RETURNS TABLE(table_name varchar, ts_from timestamp, ts_to timestamp)
+    LANGUAGE sql STABLE
+    AS $$
+  SELECT c.relname::varchar,
+    substring(b FROM 'FROM \(''([^'']+)''\)')::timestamp,
+    substring(b FROM 'TO \(''([^'']+)''\)')::timestamp
+  FROM pg_inherits i
+  JOIN pg_class c ON c.oid = i.inhrelid
+  CROSS JOIN pg_get_expr(c.relpartbound, c.oid) AS b
+  WHERE i.inhparent = ('public.' || parent)::regclass
+  ORDER BY 3 NULLS FIRST
+$$;
+
+-- обслуживание разделов (запускается ежедневно):
+-- создание разделов на ahead_days дней вперед (и для строк, попавших в раздел по умолчанию),
+-- архивирование и удаление разделов, закончившихся раньше keep_days дней назад (keep_days NULL - без удаления)
+-- новый раздел создается отдельной таблицей и подключается (ATTACH не блокирует запись в таблицу)
+CREATE OR REPLACE FUNCTION public.table_events_maintain(keep_days integer DEFAULT NULL, ahead_days integer DEFAULT 3)
+RETURNS TABLE(action varchar, table_name varchar)
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+  today date := public.now_utc()::date;
+  tbl varchar;
+  d date;
+  part varchar;
+  p RECORD;
+BEGIN
+  FOREACH tbl IN ARRAY ARRAY['table_cmd', 'table_msg'] LOOP
+    EXECUTE format('SELECT min(created_ts)::date FROM public.%I', tbl || '_default') INTO d;
+    d := least(coalesce(d, today), today);
+    WHILE d <= today + ahead_days LOOP
+      IF NOT EXISTS (SELECT 1 FROM public.table_events_partitions(tbl) x
+                     WHERE x.ts_to > d AND (x.ts_from IS NULL OR x.ts_from <= d)) THEN
+        part := tbl || '_p' || to_char(d, 'YYYYMMDD');
+        EXECUTE format('CREATE TABLE public.%I (LIKE public.%I INCLUDING DEFAULTS)', part, tbl);
+        EXECUTE format('WITH x AS (DELETE FROM public.%I WHERE created_ts >= %L AND created_ts < %L RETURNING *) '
+                       'INSERT INTO public.%I SELECT * FROM x', tbl || '_default', d, d + 1, part);
+        EXECUTE format('ALTER TABLE public.%I ADD CONSTRAINT %I CHECK (created_ts >= %L AND created_ts < %L)',
+                       part, part || '_bound', d, d + 1);
+        EXECUTE format('ALTER TABLE public.%I ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+                       tbl, part, d, d + 1);
+        action := 'create';
+        table_name := part;
+        RETURN NEXT;
+      END IF;
+      d := d + 1;
+    END LOOP;
+
+    IF keep_days IS NULL THEN
+      CONTINUE;
+    END IF;
+    FOR p IN SELECT * FROM public.table_events_partitions(tbl) x WHERE x.ts_to <= today - keep_days LOOP
+      EXECUTE format('INSERT INTO public.%I (table_id, day, id_first, id_last, rows_count, data) '
+                     'SELECT table_id, created_ts::date, min(id), max(id), count(*), '
+                     'jsonb_agg(to_jsonb(x) - ''table_id'' ORDER BY id) '
+                     'FROM public.%I x GROUP BY table_id, created_ts::date', tbl || '_archive', p.table_name);
+      EXECUTE format('ALTER TABLE public.%I DETACH PARTITION public.%I', tbl, p.table_name);
+      EXECUTE format('DROP TABLE public.%I', p.table_name);
+      action := 'archive';
+      table_name := p.table_name;
+      RETURN NEXT;
+    END LOOP;
+  END LOOP;
+END; $$;
+
+SELECT * FROM public.table_events_maintain();
@@ -3,6 +3,7 @@ import argparse
 
 from . import schema
 from . import deploy
+from . import changes
 from . import utils
 
 
@@ -19,6 +20,16 @@ def cmd_deploy_changes(args):
     """Apply schema changes and data manipulation during version upgrade"""
     utils.apply_sql_files(args.database, deploy.getSQLFiles())
 
+def cmd_migrate(args):
+    """Apply version migration scripts from db/changes"""
+    utils.apply_sql_files(args.database, changes.getSQLFiles(args.version))
+
+def cmd_partitions(args):
+    """Create table_cmd/table_msg partitions ahead and archive old ones (run daily)"""
+    for action, table_name in utils.maintain_partitions(args.database, keep_days=args.keep_days,
+                                                        ahead_days=args.ahead_days):
+        print(action, table_name)
+
 def main(args=None):
     parser = argparse.ArgumentParser()
     parser.set_defaults(func=None)
@@ -40,6 +51,19 @@ def main(args=None):
     cmd.set_defaults(func=cmd_deploy_changes)
     cmd.add_argument("database", nargs="?", help="Name of database")
 
+    # MIGRATE
+    cmd = commands.add_parser("migrate", help="Apply version migration")
+    cmd.set_defaults(func=cmd_migrate)
+    cmd.add_argument("database", help="Name of database")
+    cmd.add_argument("version", help="Migration version (db/changes), e.g. v0.4.0")
+
+    # PARTITIONS
+    cmd = commands.add_parser("partitions", help="Maintain table_cmd/table_msg partitions")
+    cmd.set_defaults(func=cmd_partitions)
+    cmd.add_argument("database", nargs="?", help="Name of database")
+    cmd.add_argument("--keep-days", type=int, default=None, help="Archive partitions older than N days")
+    cmd.add_argument("--ahead-days", type=int, default=3, help="Create partitions N days ahead")
+
     args = parser.parse_args(args=args)
     if not args.func:
         parser.print_help()
@@ -2,17 +2,23 @@ import datetime
 import decimal
 import logging
 import os
-import json
 import base64
+import inspect
+import contextlib
 from decimal import Decimal
 
 import psycopg
+import psycopg.types.json
 from psycopg.rows import namedtuple_row, dict_row
 from psycopg.connection import Notify
 from .pool import DBIPool
+from .. import codec
 
 logger = logging.getLogger(__name__)
 
+# json/jsonb из БД декодируются тем же кодеком
+psycopg.types.json.set_json_loads(codec.loads)
+
 class DBIError(Exception):
     def __init__(self, msg: str|psycopg.errors.RaiseException) -> None:
         self.code = None
@@ -38,6 +44,10 @@ class DBI:
     DB_USER = os.getenv("RAVVI_POKER_DB_USER", "postgres")
     DB_PASSWORD = os.getenv("RAVVI_POKER_DB_PASSWORD", "password")
     POOL_LIMIT = int(os.getenv("RAVVI_POKER_DB_POOL_LIMIT", "10"))
+    POOL_MIN = int(os.getenv("RAVVI_POKER_DB_POOL_MIN", "2"))
+    POOL_MAX_LIFETIME = int(os.getenv("RAVVI_POKER_DB_POOL_MAX_LIFETIME", "3600"))
+    # частые запросы движка подготавливаются на сервере (отключить для pgbouncer в режиме transaction)
+    PREPARE_HOT = os.getenv("RAVVI_POKER_DB_PREPARE_HOT", "1") == "1"
     APPLICATION_NAME = 'CPS'
     CONNECT_TIMEOUT = 15
 
@@ -62,7 +72,9 @@ class DBI:
 
     @classmethod
     async def pool_open(cls):
-        cls.pool = DBIPool(conninfo=cls.conninfo(), limit=cls.POOL_LIMIT)
+        cls.pool = DBIPool(conninfo=cls.conninfo(), limit=cls.POOL_LIMIT, min_size=cls.POOL_MIN,
+                           max_lifetime=cls.POOL_MAX_LIFETIME)
+        await cls.pool.open()
         logger.debug("pool: ready")
 
     @classmethod
@@ -70,13 +82,29 @@ class DBI:
         if not cls.pool:
             return
         await cls.pool.close()
+        logger.debug("pool: closed %s", cls.pool.get_stats())
         cls.pool = None
-        logger.debug("pool: closed")
+
+    @classmethod
+    def pool_stats(cls):
+        """Размер пула и время ожидания соединения"""
+        return cls.pool.get_stats() if cls.pool else None
 
     def __init__(self, *, log=None, use_pool=True) -> None:
         self.log = log or logger
         self.dbi_pool = self.pool if use_pool else None
         self.dbi = None
+        # сообщения столов, записываемые одним INSERT при фиксации транзакции
+        self.table_msgs = []
+        # команды, отмечаемые обработанными при фиксации транзакции
+        self.table_cmds_processed = []
+        # вызываются после фиксации транзакции / при откате (например, возврат сообщений журнала стола)
+        self.on_commit = []
+        self.on_rollback = []
+        # сообщения столов клиентам этого процесса (local_bus), доставляются после фиксации транзакции
+        self.local_msgs = []
+        # prepare=None - решение psycopg (prepare_threshold)
+        self.prepare_hot = True if self.PREPARE_HOT else None
 
     async def connect(self):
         if self.dbi_pool:
@@ -95,11 +123,32 @@ class DBI:
         return self.dbi.transaction()
 
     async def commit(self):
-        await self.dbi.commit()
+        if (self.table_msgs or self.table_cmds_processed) and psycopg.Pipeline.is_supported():
+            # запись пакета, отметка команд и COMMIT уходят на сервер одной отправкой
+            async with self.dbi.pipeline():
+                await self.flush_table_msgs()
+                await self.flush_table_cmds_processed()
+                await self.dbi.commit()
+        else:
+            await self.flush_table_msgs()
+            await self.flush_table_cmds_processed()
+            await self.dbi.commit()
+        hooks, self.on_commit, self.on_rollback = self.on_commit, [], []
+        await self.call_hooks(hooks)
 
     async def rollback(self):
+        self.table_msgs.clear()
+        self.table_cmds_processed.clear()
+        hooks, self.on_commit, self.on_rollback = self.on_rollback, [], []
+        await self.call_hooks(hooks)
         await self.dbi.rollback()
 
+    async def call_hooks(self, hooks):
+        for hook in hooks:
+            result = hook()
+            if inspect.isawaitable(result):
+                await result
+
     def cursor(self, *args, row_factory=namedtuple_row, **kwargs):
         return self.dbi.cursor(*args, row_factory=row_factory, **kwargs)
 
@@ -116,11 +165,20 @@ class DBI:
         return self
 
     async def __aexit__(self, exc_type, exc_value, exc_tb):
-        if exc_type is None:
-            await self.commit()
-        else:
-            await self.rollback()
-        await self.close(exc_type=exc_type)
+        # соединение возвращается в пул и при ошибке фиксации (запись пакета сообщений выполняется в commit)
+        try:
+            if exc_type is None:
+                try:
+                    await self.commit()
+                except BaseException as ex:
+                    exc_type = type(ex)
+                    with contextlib.suppress(Exception):
+                        await self.rollback()
+                    raise
+            else:
+                await self.rollback()
+        finally:
+            await self.close(exc_type=exc_type)
 
     def use_id_or_uuid(self, id, uuid):
         if id is not None:
@@ -140,7 +198,7 @@ class DBI:
     # DEVICE
 
     async def create_device(self, props=None):
-        props = json.dumps(props) if props else None
+        props = self.json_dumps(props) if props else None
         sql = "INSERT INTO user_device (props) VALUES (%s) RETURNING *"
         async with self.cursor() as cursor:
             await cursor.execute(sql, (props,))
@@ -372,7 +430,7 @@ class DBI:
         where c.{key}=%s
         """  # nosec
         async with self.cursor() as cursor:
-            await cursor.execute(sql, (value,))
+            await cursor.execute(sql, (value,), prepare=self.prepare_hot)
             row = await cursor.fetchone()
         return row
 
@@ -530,7 +588,7 @@ class DBI:
             sql = "UPDATE club_member SET balance=balance+(%s) WHERE id=%s RETURNING balance"
             await cursor.execute(sql, (amount, member_id))
             row = await cursor.fetchone()
-            props = json.dumps({"table_id": table_id})
+            props = self.json_dumps({"table_id": table_id})
             sql = "INSERT INTO user_account_txn (account_id, txn_type, txn_value, total_balance, sender_id, props) VALUES (%s, %s, %s, %s, %s, %s) RETURNING *"
             await cursor.execute(sql, (member_id, txntype, amount, row.balance, sender_id, props))
             # txn = await cursor.fetchone()
@@ -625,7 +683,7 @@ class DBI:
 
     async def create_table(self, *, club_id=0, table_type, table_name, table_seats, game_type, game_subtype,
                            props=None):
-        props = json.dumps(props or {})
+        props = self.json_dumps(props or {})
         sql = "INSERT INTO table_profile (club_id, table_type, table_name, table_seats, game_type, game_subtype, props) VALUES (%s,%s,%s,%s,%s,%s,%s) RETURNING *"
         async with self.cursor() as cursor:
             await cursor.execute(sql, (club_id, table_type, table_name, table_seats, game_type, game_subtype, props))
@@ -681,6 +739,7 @@ class DBI:
                     status,
                     table_id,
                 ),
+                prepare=self.prepare_hot,
             )
             row = await cursor.fetchone()
         return row
@@ -776,20 +835,23 @@ class DBI:
     # GAMES
 
     async def create_game(self, *, table_id: int, game_type, game_subtype, props, players):
-        # TODO возможно стоит написать JSONCustomDecoder
-        for key, item in props.items():
-            if isinstance(item, Decimal):
-                props[key] = float(item)
-        props = json.dumps(props or {})
-        async with self.cursor() as cursor:
-            sql = "INSERT INTO game_profile (table_id,game_type,game_subtype,props) VALUES (%s,%s,%s,%s) RETURNING *"
-            await cursor.execute(sql, (table_id, game_type, game_subtype, props))
-            game = await cursor.fetchone()
-            if players:
-                sql = "INSERT INTO game_player (game_id, user_id, balance_begin) VALUES (%s, %s, %s)"
-                params_seq = [(game.id, u.id, u.balance) for u in players]
-                await cursor.executemany(sql, params_seq)
-        return game
+        """Игра и ее игроки одним запросом"""
+        props = self.json_dumps(props or {})
+        players = players or []
+        sql = """
+        WITH game AS (
+            INSERT INTO game_profile (table_id,game_type,game_subtype,props) VALUES (%s,%s,%s,%s) RETURNING *
+        ), game_players AS (
+            INSERT INTO game_player (game_id, user_id, balance_begin)
+            SELECT game.id, x.user_id, x.balance FROM game, unnest(%s::bigint[], %s::numeric[]) AS x(user_id, balance)
+        )
+        SELECT * FROM game
+        """
+        async with self.cursor() as cursor:
+            await cursor.execute(sql, (table_id, game_type, game_subtype, props,
+                                       [u.id for u in players], [u.balance for u in players]),
+                                 prepare=self.prepare_hot)
+            return await cursor.fetchone()
 
     async def get_game_and_players(self, id: int):
         async with self.cursor() as cursor:
@@ -800,14 +862,63 @@ class DBI:
         return game, players
 
     async def close_game(self, id: int, players):
-        player_sql = "UPDATE game_player SET balance_end=%s WHERE game_id=%s AND user_id=%s"
-        profile_sql = "UPDATE game_profile SET end_ts=now_utc() WHERE id=%s RETURNING *"
+        """Итоговые балансы всех игроков и завершение игры одним запросом"""
+        sql = """
+        WITH game_players AS (
+            UPDATE game_player p SET balance_end=x.balance
+            FROM unnest(%s::bigint[], %s::numeric[]) AS x(user_id, balance)
+            WHERE p.game_id=%s AND p.user_id=x.user_id
+        )
+        UPDATE game_profile SET end_ts=now_utc() WHERE id=%s RETURNING *
+        """
+        async with self.cursor() as cursor:
+            await cursor.execute(sql, ([u.id for u in players], [u.balance for u in players], id, id),
+                                 prepare=self.prepare_hot)
+            return await cursor.fetchone()
+
+    async def create_game_history(self, id: int, *, user_ids, data: bytes):
+        """История раздачи (engine.history), время и стол берутся из game_profile"""
+        sql = """
+        INSERT INTO game_history (game_id, table_id, begin_ts, end_ts, user_ids, data)
+        SELECT id, table_id, begin_ts, coalesce(end_ts, now_utc()), %s, %s FROM game_profile WHERE id=%s
+        ON CONFLICT (game_id) DO NOTHING
+        """
+        async with self.cursor() as cursor:
+            await cursor.execute(sql, (user_ids, data, id), prepare=self.prepare_hot)
+
+    async def get_game_history(self, id: int):
         async with self.cursor() as cursor:
-            for u in players:
-                await cursor.execute(player_sql, (u.balance, id, u.id))
-            await cursor.execute(profile_sql, (id,))
+            await cursor.execute("SELECT * FROM game_history WHERE game_id=%s", (id,))
             return await cursor.fetchone()
 
+    async def get_games_history(self, *, user_id=None, table_id=None, ts_from=None, ts_to=None, before_id=None,
+                                limit=100):
+        """Истории раздач в порядке убывания game_id (before_id - следующая страница)"""
+        where, params = [], []
+        if user_id is not None:
+            where.append("user_ids @> ARRAY[%s]::bigint[]")
+            params.append(user_id)
+        if table_id is not None:
+            where.append("table_id=%s")
+            params.append(table_id)
+        if ts_from is not None:
+            where.append("end_ts>=%s")
+            params.append(ts_from)
+        if ts_to is not None:
+            where.append("end_ts<%s")
+            params.append(ts_to)
+        if before_id is not None:
+            where.append("game_id<%s")
+            params.append(before_id)
+        sql = "SELECT * FROM game_history"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY game_id DESC LIMIT %s"
+        params.append(limit)
+        async with self.cursor() as cursor:
+            await cursor.execute(sql, params)
+            return await cursor.fetchall()
+
     async def all_players_games(self, user_id):
         sql = "SELECT game_id FROM game_player WHERE user_id=%s"
         async with self.cursor() as cursor:
@@ -824,39 +935,64 @@ class DBI:
 
     # EVENTS (TABLE_CMD)
 
-    def json_dumps(self, obj):
-        def encoder(x):
-            if isinstance(x, Decimal):
-                return float(x)
-            if hasattr(x, "__int__"):
-                return int(x)
-            if hasattr(x, "__str__"):
-                return str(x)
-            type_name = x.__class__.__name__
-            raise TypeError(f"Object of type {type_name} is not serializable")
-
-        return json.dumps(obj, default=encoder)
+    @staticmethod
+    def json_dumps(obj):
+        return codec.dumps(obj)
 
     # EVENTS (TABLE_CMD)
 
-    async def create_table_cmd(self, *, client_id, table_id, cmd_type, props):
+    async def set_events_origin(self, origin):
+        """Процесс-источник событий в текущей транзакции (попадает в оповещение table_msg)"""
+        async with self.cursor() as cursor:
+            await cursor.execute("SELECT set_config('ravvi.origin', %s, true)", (origin,))
+
+    async def create_table_cmd(self, *, client_id, table_id, cmd_type, props, processed=False):
         props = self.json_dumps(props or {})
         async with self.cursor() as cursor:
             await cursor.execute(
-                "INSERT INTO table_cmd (client_id, table_id, cmd_type, props) VALUES (%s,%s,%s,%s) RETURNING id, created_ts",
-                (client_id, table_id, cmd_type, props),
+                "INSERT INTO table_cmd (client_id, table_id, cmd_type, props, processed_ts) VALUES (%s,%s,%s,%s,CASE WHEN %s THEN now_utc() END) RETURNING id, created_ts",
+                (client_id, table_id, cmd_type, props, processed),
+                prepare=self.prepare_hot,
             )
             return await cursor.fetchone()
 
     async def get_table_cmd(self, id):
         async with self.cursor() as cursor:
-            await cursor.execute("SELECT * FROM table_cmd WHERE id=%s", (id,))
+            await cursor.execute("SELECT * FROM table_cmd WHERE id=%s", (id,), prepare=self.prepare_hot)
             row = await cursor.fetchone()
         return row
 
+    async def get_table_cmd_last_id(self):
+        async with self.cursor() as cursor:
+            await cursor.execute("SELECT coalesce(max(id), 0) AS id FROM table_cmd")
+            row = await cursor.fetchone()
+        return row.id
+
+    async def get_table_cmds_unprocessed(self, table_ids):
+        """Необработанные команды столов в порядке записи (без отсечки по id: транзакции фиксируются не по порядку id)"""
+        async with self.cursor() as cursor:
+            await cursor.execute(
+                "SELECT id, table_id FROM table_cmd WHERE table_id = ANY(%s) AND processed_ts IS NULL ORDER BY id",
+                (list(table_ids),),
+            )
+            return await cursor.fetchall()
+
     async def set_table_cmd_processed(self, id):
         async with self.cursor() as cursor:
-            await cursor.execute("UPDATE table_cmd SET processed_ts=now_utc() WHERE id=%s", (id,))
+            await cursor.execute("UPDATE table_cmd SET processed_ts=now_utc() WHERE id=%s", (id,),
+                                 prepare=self.prepare_hot)
+
+    def add_table_cmd_processed(self, id):
+        """Отметка обработки команды при фиксации транзакции (вместе с записью сообщений)"""
+        self.table_cmds_processed.append(id)
+
+    async def flush_table_cmds_processed(self):
+        if not self.table_cmds_processed:
+            return
+        ids, self.table_cmds_processed = self.table_cmds_processed, []
+        async with self.cursor() as cursor:
+            await cursor.execute("UPDATE table_cmd SET processed_ts=now_utc() WHERE id=ANY(%s)", (ids,),
+                                 prepare=self.prepare_hot)
 
     # EVENTS (TABLE_MSG)
 
@@ -866,16 +1002,62 @@ class DBI:
             await cursor.execute(
                 "INSERT INTO table_msg (table_id, game_id, msg_type, props, cmd_id, client_id) VALUES (%s,%s,%s,%s,%s,%s) RETURNING id, created_ts",
                 (table_id, game_id, msg_type, props, cmd_id, client_id),
+                prepare=self.prepare_hot,
             )
             row = await cursor.fetchone()
         return row
 
+    def add_table_msg(self, *, table_id, game_id, msg_type, props, cmd_id=None, client_id=None):
+        """Сообщение стола в пакет текущей транзакции"""
+        self.table_msgs.append((table_id, game_id, int(msg_type), self.json_dumps(props or {}), cmd_id, client_id))
+
+    async def flush_table_msgs(self):
+        """Запись пакета сообщений одним INSERT (одно оповещение table_msg), порядок сохраняется"""
+        if not self.table_msgs:
+            return
+        rows, self.table_msgs = self.table_msgs, []
+        columns = list(zip(*rows))
+        # без RETURNING: в режиме pipeline не требует ожидания ответа
+        async with self.cursor() as cursor:
+            await cursor.execute(
+                "INSERT INTO table_msg (table_id, game_id, msg_type, props, cmd_id, client_id) "
+                "SELECT table_id, game_id, msg_type, props, cmd_id, client_id "
+                "FROM unnest(%s::bigint[], %s::bigint[], %s::integer[], %s::jsonb[], %s::bigint[], %s::bigint[]) "
+                "WITH ORDINALITY AS x(table_id, game_id, msg_type, props, cmd_id, client_id, n) ORDER BY n",
+                [list(x) for x in columns],
+                prepare=self.prepare_hot,
+            )
+
     async def get_table_msg(self, id):
         async with self.cursor() as cursor:
             await cursor.execute("SELECT * FROM table_msg WHERE id=%s", (id,))
             row = await cursor.fetchone()
         return row
 
+    async def get_table_msgs_after(self, table_id, msg_id):
+        """Сообщения стола для всех (без client_id) после msg_id в порядке записи"""
+        async with self.cursor() as cursor:
+            await cursor.execute(
+                "SELECT * FROM table_msg WHERE table_id=%s AND id>%s AND client_id IS NULL ORDER BY id",
+                (table_id, msg_id),
+            )
+            return await cursor.fetchall()
+
+    async def get_table_msg_last_id(self):
+        async with self.cursor() as cursor:
+            await cursor.execute("SELECT coalesce(max(id), 0) AS id FROM table_msg")
+            row = await cursor.fetchone()
+        return row.id
+
+    async def get_client_msgs_after(self, msg_id, client_ids):
+        """Сообщения клиентам client_ids после msg_id в порядке записи"""
+        async with self.cursor() as cursor:
+            await cursor.execute(
+                "SELECT * FROM table_msg WHERE id>%s AND client_id = ANY(%s) ORDER BY id",
+                (msg_id, list(client_ids)),
+            )
+            return await cursor.fetchall()
+
     # CHIPS TXN
 
     async def get_chips_txn(self, txn_id):
@@ -1078,7 +1260,7 @@ class DBI:
     async def update_status_txn(self, txn_id, status):
         sql = "UPDATE user_account_txn SET props = props::jsonb || %s::jsonb WHERE id = %s RETURNING *"
         async with self.cursor() as cursor:
-            await cursor.execute(sql, (json.dumps({"status": status}), txn_id))
+            await cursor.execute(sql, (self.json_dumps({"status": status}), txn_id))
             row = await cursor.fetchone()
         return row
 
@@ -1129,7 +1311,7 @@ class DBI:
         sql = "INSERT INTO public.user_account_txn (account_id, txn_type, txn_value, props) VALUES (%s, %s, %s, %s::jsonb) RETURNING *"
         txn_type = "REPLENISHMENT"
         props = {"balance": balance, "status": "consider"}
-        props_json = json.dumps(props)  # Преобразование словаря в JSON-строку
+        props_json = self.json_dumps(props)  # Преобразование словаря в JSON-строку
         async with self.cursor() as cursor:
             await cursor.execute(sql, (account_id, txn_type, amount, props_json))
             row = await cursor.fetchone()
@@ -1179,7 +1361,7 @@ class DBI:
         async with self.cursor() as cursor:
             await cursor.execute(sql, (amount, user_account_id))
             row = await cursor.fetchone()
-            props = json.dumps({"balance_type": balance})
+            props = self.json_dumps({"balance_type": balance})
             # amount = -amount
             sql = "INSERT INTO user_account_txn (account_id, txn_type, txn_value, total_balance, sender_id, props) VALUES (%s, %s, %s, %s, %s, %s) RETURNING *"
             await cursor.execute(sql, (user_account_id, txn_type, amount, row.balance, sender_id, props))
@@ -1191,7 +1373,7 @@ class DBI:
         async with self.cursor() as cursor:
             await cursor.execute(sql, (amount, account_id))
             row = await cursor.fetchone()
-            props = json.dumps({"balance_type": 'balance_shared'})
+            props = self.json_dumps({"balance_type": 'balance_shared'})
             # amount = -amount
             sql = "INSERT INTO user_account_txn (account_id, txn_type, txn_value, total_balance, sender_id, props) VALUES (%s, %s, %s, %s, %s, %s) RETURNING *"
             await cursor.execute(sql, (account_id, "MOVEIN", amount, row.balance, user_id, props))
@@ -1216,7 +1398,7 @@ class DBI:
             else:
                 await cursor.execute(sql, (amount, account_id,))
                 row = await cursor.fetchone()
-            props = json.dumps({"balance_type": "balance_shared"})
+            props = self.json_dumps({"balance_type": "balance_shared"})
             sql = "INSERT INTO user_account_txn (account_id, txn_type, txn_value, total_balance, sender_id, props) VALUES (%s, %s, %s, %s, %s, %s) RETURNING *"
             amount = -amount
             await cursor.execute(sql, (account_id, "MOVEOUT", amount, row.balance_shared, sender_id, props))
@@ -1227,7 +1409,7 @@ class DBI:
         get_balance_shared_sql = "SELECT balance_shared FROM club_member WHERE id = %s"
         reset_balance_shared_sql = "UPDATE club_member SET balance_shared =%s WHERE id=%s"
         txn_sql = "INSERT INTO user_account_txn (account_id, txn_type, txn_value, total_balance, sender_id, props) VALUES (%s, %s, %s, %s, %s, %s) RETURNING *"
-        props = json.dumps({"balance_type": "balance_shared"})
+        props = self.json_dumps({"balance_type": "balance_shared"})
         async with self.cursor() as cursor:
             await cursor.execute(get_balance_shared_sql, (account_id,))
             row = await cursor.fetchone()
@@ -1239,7 +1421,7 @@ class DBI:
         get_balance_sql = "SELECT balance FROM club_member WHERE id = %s"
         reset_balance_sql = "UPDATE club_member SET balance =%s WHERE id=%s"
         txn_sql = "INSERT INTO user_account_txn (account_id, txn_type, txn_value, total_balance, sender_id, props) VALUES (%s, %s, %s, %s, %s, %s) RETURNING *"
-        props = json.dumps({"balance_type": "balance"})
+        props = self.json_dumps({"balance_type": "balance"})
 
         async with self.cursor() as cursor:
             await cursor.execute(get_balance_sql, (account_id,))
@@ -1267,7 +1449,7 @@ class DBI:
             else:
                 await cursor.execute(sql, (amount, account_id,))
                 row = await cursor.fetchone()
-            props = json.dumps({"balance_type": "balance"})
+            props = self.json_dumps({"balance_type": "balance"})
             sql = "INSERT INTO user_account_txn (account_id, txn_type, txn_value, total_balance, sender_id, props) VALUES (%s, %s, %s, %s, %s, %s) RETURNING *"
             amount = -amount
             await cursor.execute(sql, (account_id, "CASHOUT", amount, row.balance, sender_id, props))
@@ -1289,7 +1471,7 @@ class DBI:
     async def get_user_requests_to_replenishment(self, account_id):
         sql = "SELECT * FROM user_account_txn WHERE account_id = %s AND props @> %s::jsonb"
         async with self.cursor() as cursor:
-            await cursor.execute(sql, (account_id, json.dumps({"status": "consider"})))
+            await cursor.execute(sql, (account_id, self.json_dumps({"status": "consider"})))
             row = await cursor.fetchone()
         return row
         # ACCOUNT STATISTICS
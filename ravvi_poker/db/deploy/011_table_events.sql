@@ -0,0 +1,76 @@
+-- команды, обработанные в процессе движка (локальная доставка), пишутся для аудита и не требуют оповещения
+-- команда целиком передается в оповещении, если укладывается в лимит pg_notify, иначе только cmd_id
+CREATE OR REPLACE FUNCTION public.table_cmd_created_trg_func() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+  payload VARCHAR;
+  x VARCHAR;
+BEGIN
+  IF NEW.processed_ts IS NOT NULL THEN
+    RETURN NEW;
+  END IF;
+  SELECT json_build_object('cmd_id', NEW.id, 'table_id', NEW.table_id, 'client_id', NEW.client_id,
+    'cmd_type', NEW.cmd_type, 'props', NEW.props)::VARCHAR INTO payload;
+  IF octet_length(payload) > 7900 THEN
+    SELECT json_build_object('cmd_id', NEW.id, 'table_id', NEW.table_id)::VARCHAR INTO payload;
+  END IF;
+  SELECT pg_notify('table_cmd', payload) INTO x;
+  RETURN NEW;
+END; $$;
+
+-- оповещения на INSERT (в том числе многострочный): msgs - сообщения в порядке id
+-- сообщения стола идут в канал стола table_msg_<table_id>, сообщения клиенту (client_id) - в общий канал table_msg
+-- origin: процесс, уже доставивший сообщения своим клиентам (ravvi.origin в транзакции записи)
+-- сообщение целиком передается в оповещении, если укладывается в лимит pg_notify, иначе только msg_id,
+-- оповещение отправляется при смене канала или стола и при превышении лимита, порядок сообщений сохраняется
+-- (оповещение относится к одному столу: слушатель обрабатывает столы параллельно)
+CREATE OR REPLACE FUNCTION public.table_msg_created_trg_func() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+  r RECORD;
+  item JSONB;
+  item_size INTEGER;
+  items JSONB := '[]';
+  items_size INTEGER := 0;
+  channel VARCHAR;
+  items_channel VARCHAR;
+  items_table_id BIGINT;
+  origin VARCHAR := NULLIF(current_setting('ravvi.origin', true), '');
+BEGIN
+  FOR r IN SELECT * FROM new_rows ORDER BY id LOOP
+    IF r.client_id IS NULL THEN
+      channel := 'table_msg_' || r.table_id;
+    ELSE
+      channel := 'table_msg';
+    END IF;
+    item := jsonb_build_object('msg_id', r.id, 'table_id', r.table_id, 'origin', origin,
+      'game_id', r.game_id, 'msg_type', r.msg_type, 'cmd_id', r.cmd_id, 'client_id', r.client_id,
+      'props', r.props);
+    item_size := octet_length(item::VARCHAR);
+    IF item_size > 7900 THEN
+      item := jsonb_build_object('msg_id', r.id, 'table_id', r.table_id, 'origin', origin);
+      item_size := octet_length(item::VARCHAR);
+    END IF;
+    IF items_size > 0 AND (items_size + item_size > 7900 OR channel <> items_channel OR r.table_id <> items_table_id) THEN
+      PERFORM pg_notify(items_channel, jsonb_build_object('msgs', items)::VARCHAR);
+      items := '[]';
+      items_size := 0;
+    END IF;
+    items := items || jsonb_build_array(item);
+    items_size := items_size + item_size + 2;
+    items_channel := channel;
+    items_table_id := r.table_id;
+  END LOOP;
+  IF items_size > 0 THEN
+    PERFORM pg_notify(items_channel, jsonb_build_object('msgs', items)::VARCHAR);
+  END IF;
+  RETURN NULL;
+END; $$;
+
+DROP TRIGGER IF EXISTS table_msg_created_trg ON public.table_msg;
+CREATE TRIGGER table_msg_created_trg AFTER INSERT ON public.table_msg REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION public.table_msg_created_trg_func();
+
+-- чтение пропущенных сообщений стола при подписке на канал стола
+CREATE INDEX IF NOT EXISTS table_msg_idx_table ON public.table_msg USING btree (table_id, id);
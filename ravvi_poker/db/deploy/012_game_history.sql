@@ -0,0 +1,16 @@
+-- история раздач: одна сжатая запись на игру (engine.history), пишется при закрытии игры
+CREATE TABLE IF NOT EXISTS public.game_history (
+    game_id bigint NOT NULL,
+    table_id bigint NOT NULL,
+    begin_ts timestamp without time zone NOT NULL,
+    end_ts timestamp without time zone NOT NULL,
+    user_ids bigint[] NOT NULL,
+    data bytea NOT NULL,
+    CONSTRAINT game_history_pkey PRIMARY KEY (game_id),
+    CONSTRAINT game_history_fk_game FOREIGN KEY (game_id) REFERENCES public.game_profile(id)
+);
+
+-- поиск по столу, игроку и времени
+CREATE INDEX IF NOT EXISTS game_history_idx_table ON public.game_history USING btree (table_id, game_id);
+CREATE INDEX IF NOT EXISTS game_history_idx_end_ts ON public.game_history USING btree (end_ts);
+CREATE INDEX IF NOT EXISTS game_history_idx_users ON public.game_history USING gin (user_ids);
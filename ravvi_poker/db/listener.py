@@ -1,24 +1,65 @@
+import os
+import time
 import logging
 import asyncio
-import json
 import contextlib
+from collections import deque
 
 from .dbi import DBI, Notify
+from .. import codec
 
 logger = logging.getLogger(__name__)
 
+
+def get_notify_ids(payload) -> list:
+    """id событий в оповещении: table_cmd (cmd_id) или пакет table_msg (msgs)"""
+    if "msgs" in payload:
+        return [x["msg_id"] for x in payload["msgs"]]
+    if "cmd_id" in payload:
+        return [payload["cmd_id"]]
+    return []
+
+
+def skip_notify_ids(payload, ids):
+    """Оповещение без уже обработанных событий (None - ничего не осталось)"""
+    if "msgs" in payload:
+        msgs = [x for x in payload["msgs"] if x["msg_id"] not in ids]
+        return dict(payload, msgs=msgs) if msgs else None
+    if payload.get("cmd_id", None) in ids:
+        return None
+    return payload
+
+
 class DBI_Listener:
+    # период проверки изменений списка каналов при отсутствии оповещений (сек)
+    NOTIFY_TIMEOUT = 0.2
+    # максимальное количество одновременно выполняемых обработчиков (по разным ключам)
+    CONCURRENCY = int(os.getenv("RAVVI_POKER_LISTENER_CONCURRENCY", "16"))
 
     def __init__(self, *, log=None) -> None:
         super().__init__()
         self.log = log or logger
         self.task : asyncio.Task = None
+        # остановка запрошена (stop): ошибка в цикле не приводит к переподключению
+        self.stopping = False
         self.ready = asyncio.Event()
         self.channels = {}
+        self.channel_keys = {}
+        self.channels_version = 0
+        # канал -> id последнего полученного события (table_cmd.id / table_msg.id)
+        self.channels_last_id = {}
+        # канал -> id событий, прочитанных после переподключения (повторные оповещения о них пропускаются)
+        self.replayed = {}
         self.pg_backend_pid = None
+        # очереди обработки: ключ (стол) -> deque[(time, handler, kwargs)], по одному обработчику на ключ
+        self.queues = {}
+        self.workers = {}
+        self.semaphore = asyncio.Semaphore(self.CONCURRENCY)
+        self.stats = dict(notifies=0, processed=0, lag_last=0.0, lag_max=0.0)
 
     async def start(self):
         self.log.debug("start ...")
+        self.stopping = False
         self.task = asyncio.create_task(self.run())
         await self.ready.wait()
         self.log.info("started")
@@ -27,11 +68,17 @@ class DBI_Listener:
         if not self.task:
             return
         self.log.debug("stop ...")
+        self.stopping = True
         if not self.task.done():
             self.task.cancel()
         with contextlib.suppress(asyncio.exceptions.CancelledError):
             await self.task
         self.task = None
+        workers = list(self.workers.values())
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self.queues.clear()
         self.log.info("stopped")
 
     async def run(self):
@@ -42,9 +89,12 @@ class DBI_Listener:
                 async with DBI(log=self.log, use_pool=False) as dbi:
                     async with dbi.transaction():
                         self.pg_backend_pid = await dbi.get_pg_backend_pid()
-                        for key in self.channels:
+                        listening = set(self.channels)
+                        for key in listening:
                             self.log.info("listen: %s", key)
                             await dbi.listen(key)
+                    # после переподключения: события, оповещения о которых пропущены, до живых оповещений
+                    await self.replay_channels(dbi, listening)
                     try:
                         await self.on_listen(self.pg_backend_pid)
                     except Exception as ex:
@@ -53,11 +103,17 @@ class DBI_Listener:
                         continue
                     self.ready.set()
                     self.log.info('ready, process notifications ...')
-                    async for msg in dbi.dbi.notifies():
-                        try:
-                            await self.on_notify(msg)
-                        except Exception as ex:
-                            self.log.exception("on_notify_handles", ex)
+                    while True:
+                        channels_version = self.channels_version
+                        async for msg in dbi.dbi.notifies(timeout=self.NOTIFY_TIMEOUT):
+                            try:
+                                await self.on_notify(msg)
+                            except Exception as ex:
+                                self.log.exception("on_notify_handles", ex)
+                            if channels_version != self.channels_version:
+                                break
+                        if channels_version != self.channels_version:
+                            listening = await self.update_channels(dbi, listening)
             except asyncio.CancelledError:
                 self.log.info("cancelled")
                 break
@@ -66,6 +122,10 @@ class DBI_Listener:
             #    await asyncio.sleep(1)
             except Exception as ex:
                 self.log.exception("%s", ex)
+                # отмена во время закрытия соединения может смениться другой ошибкой
+                if self.stopping:
+                    break
+                await asyncio.sleep(1)
             finally:
                 self.ready.clear()
         self.log.info("end")
@@ -73,14 +133,136 @@ class DBI_Listener:
     async def on_listen(self, backend_id: int):
         pass
 
+    def add_channel(self, channel, handler, key=None, last_id=None):
+        """Подписка на канал во время работы, LISTEN выполняется в цикле оповещений
+        key - ключ очереди, в которой выполняется on_channel_listen (по умолчанию канал)
+        last_id - id последнего известного события канала
+        """
+        self.channels[channel] = handler
+        if key is not None:
+            self.channel_keys[channel] = key
+        if last_id is not None:
+            self.channels_last_id[channel] = last_id
+        self.channels_version += 1
+
+    def remove_channel(self, channel):
+        self.channel_keys.pop(channel, None)
+        self.channels_last_id.pop(channel, None)
+        if self.channels.pop(channel, None) is not None:
+            self.channels_version += 1
+
+    async def update_channels(self, dbi, listening: set) -> set:
+        channels = set(self.channels)
+        added = channels - listening
+        removed = listening - channels
+        async with dbi.transaction():
+            for key in removed:
+                self.log.info("unlisten: %s", key)
+                await dbi.unlisten(key)
+            for key in added:
+                self.log.info("listen: %s", key)
+                await dbi.listen(key)
+        # в очереди ключа канала: пропущенные сообщения обрабатываются раньше полученных после LISTEN
+        for key in added:
+            self.dispatch(self.channel_keys.get(key, key), self.on_channel_listen, dict(channel=key))
+        return channels
+
+    async def replay_channels(self, dbi, listening):
+        replayed = {}
+        events = []
+        for channel in listening:
+            last_id = self.channels_last_id.get(channel, None)
+            if last_id is None:
+                # оповещений еще не было (первое подключение)
+                continue
+            try:
+                async with dbi.transaction():
+                    payloads = await self.on_replay(dbi, channel, last_id)
+            except Exception as ex:
+                self.log.exception("on_replay(%s): %s", channel, ex)
+                continue
+            ids = set()
+            for payload in payloads:
+                payload_ids = get_notify_ids(payload)
+                ids.update(payload_ids)
+                events.append((min(payload_ids, default=0), channel, payload))
+            if ids:
+                self.log.info("replay: %s %s events after %s", channel, len(ids), last_id)
+                replayed[channel] = ids
+        # события разных каналов (сообщения стола и сообщения клиентам) в общем порядке id
+        events.sort(key=lambda x: x[0])
+        for _, channel, payload in events:
+            self.notify(channel, payload)
+        self.replayed = replayed
+
+    async def on_replay(self, dbi, channel, last_id) -> list:
+        """События канала после last_id (оповещения о них могли быть пропущены), одним запросом по id
+
+        Возвращает payload оповещений в порядке id
+        """
+        return []
+
+    async def on_channel_listen(self, channel):
+        """Канал добавлен во время работы: оповещения, отправленные до LISTEN, не будут получены"""
+        pass
+
+    def get_notify_key(self, channel, payload):
+        """Ключ очереди: оповещения одного стола обрабатываются строго по порядку, разных столов - параллельно"""
+        table_id = payload.get("table_id", None)
+        if table_id is None and payload.get("msgs"):
+            table_id = payload["msgs"][0].get("table_id", None)
+        if table_id is None:
+            return channel
+        return table_id
+
     async def on_notify(self, msg: Notify):
         self.log.debug("on_notify: %s", msg)
-        handler = self.channels.get(msg.channel)
+        self.stats["notifies"] += 1
+        payload = codec.loads(msg.payload) if msg.payload else {}
+        replayed = self.replayed.get(msg.channel, None)
+        if replayed:
+            payload = skip_notify_ids(payload, replayed)
+            if payload is None:
+                return
+        self.notify(msg.channel, payload)
+
+    def notify(self, channel, payload):
+        last_id = max(get_notify_ids(payload), default=None)
+        if last_id is not None and last_id > self.channels_last_id.get(channel, 0):
+            self.channels_last_id[channel] = last_id
+        handler = self.channels.get(channel)
         if callable(handler):
-            payload = json.loads(msg.payload) if msg.payload else {}
-            try:
-                await handler(**payload)
-            except Exception as ex:
-                self.log.exception("on_notify(%s) handler: %s", msg.channel, ex)
-        self.log.debug("on_notify: done %s", msg)
-           
+            self.dispatch(self.get_notify_key(channel, payload), handler, payload)
+
+    def dispatch(self, key, handler, kwargs):
+        queue = self.queues.get(key, None)
+        if queue is None:
+            queue = self.queues[key] = deque()
+        queue.append((time.monotonic(), handler, kwargs))
+        if key not in self.workers:
+            self.workers[key] = asyncio.create_task(self.worker(key, queue))
+
+    async def worker(self, key, queue: deque):
+        try:
+            while queue:
+                async with self.semaphore:
+                    ts, handler, kwargs = queue.popleft()
+                    lag = time.monotonic() - ts
+                    self.stats["lag_last"] = lag
+                    self.stats["lag_max"] = max(self.stats["lag_max"], lag)
+                    try:
+                        await handler(**kwargs)
+                    except Exception as ex:
+                        self.log.exception("on_notify(%s) handler: %s", key, ex)
+                    self.stats["processed"] += 1
+        finally:
+            # между проверкой пустой очереди и удалением нет переключения задач
+            self.workers.pop(key, None)
+            if not queue:
+                self.queues.pop(key, None)
+
+    def get_stats(self):
+        return dict(self.stats,
+                    keys=len(self.queues),
+                    queued=sum(len(q) for q in self.queues.values()),
+                    concurrency=self.CONCURRENCY)
@@ -1,36 +1,150 @@
+import time
 import asyncio
+import logging
+import contextlib
 import psycopg
+from psycopg.pq import TransactionStatus
 from collections import deque
 
+logger = logging.getLogger(__name__)
+
+
 class DBIPool:
-    def __init__(self, conninfo, limit=5, cache_limit=None) -> None:
+    """Пул соединений
+
+    limit - максимальное количество выданных соединений, min_size - соединения, открытые заранее
+    и поддерживаемые после ошибок. Простаивающее дольше check_idle сек соединение проверяется перед выдачей,
+    соединение старше max_lifetime сек закрывается при возврате.
+    """
+
+    def __init__(self, conninfo, limit=5, min_size=None, *, max_lifetime=3600, check_idle=30) -> None:
         self.conninfo = conninfo
+        self.limit = limit
+        self.min_size = min(limit, int(limit/2) if min_size is None else min_size)
+        self.max_lifetime = max_lifetime
+        self.check_idle = check_idle
         self.lock = asyncio.Semaphore(limit)
-        self.cache_limit = min(limit, cache_limit or int(limit/2))
-        self.cache = deque()
+        # свободные соединения: (соединение, время возврата), выдается последнее возвращенное
+        self.idle = deque()
+        # соединение -> время открытия
+        self.created = {}
+        self.closed = False
+        self.fill_task = None
+        self.stats = dict(acquired=0, wait_total=0.0, wait_max=0.0, wait_last=0.0,
+                          connected=0, discarded=0, checked=0)
+
+    @property
+    def size(self):
+        return len(self.created)
 
     async def open(self):
-        pass
+        # соединения открываются заранее, чтобы первые запросы не ждали подключения
+        self.closed = False
+        try:
+            await self.fill(retry=False)
+        except psycopg.Error as ex:
+            logger.warning("pool: prewarm failed: %s", ex)
+            self.start_fill()
 
     async def close(self):
-        while self.cache:
-            dbi = self.cache.pop()
-            await dbi.close()
+        self.closed = True
+        if self.fill_task:
+            self.fill_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.fill_task
+            self.fill_task = None
+        while self.idle:
+            dbi, _ = self.idle.pop()
+            await self.discard(dbi)
 
     async def getconn(self):
+        started = time.monotonic()
         await self.lock.acquire()
-        if self.cache:
-            dbi = self.cache.pop()
-        else:
-            dbi = await psycopg.AsyncConnection.connect(self.conninfo)
+        try:
+            dbi = await self.get_idle()
+            if dbi is None:
+                dbi = await self.connect()
+        except BaseException:
+            self.lock.release()
+            raise
+        wait = time.monotonic() - started
+        self.stats["acquired"] += 1
+        self.stats["wait_total"] += wait
+        self.stats["wait_last"] = wait
+        self.stats["wait_max"] = max(self.stats["wait_max"], wait)
         return dbi
 
     async def putconn(self, dbi, exc_type):
-        if exc_type:
+        try:
+            # после ошибки запроса соединение уже откачено (DBI.rollback) и может использоваться дальше
+            if self.closed or self.size > self.limit or not self.is_usable(dbi) or self.is_expired(dbi):
+                await self.discard(dbi)
+            else:
+                self.idle.append((dbi, time.monotonic()))
+        finally:
+            self.lock.release()
+        self.start_fill()
+
+    async def get_idle(self):
+        while self.idle:
+            dbi, ts = self.idle.pop()
+            if not self.is_usable(dbi) or self.is_expired(dbi):
+                await self.discard(dbi)
+                continue
+            if time.monotonic() - ts > self.check_idle:
+                self.stats["checked"] += 1
+                try:
+                    await dbi.execute("SELECT 1")
+                    await dbi.rollback()
+                except psycopg.Error as ex:
+                    logger.warning("pool: idle connection check failed: %s", ex)
+                    await self.discard(dbi)
+                    continue
+            return dbi
+        return None
+
+    def is_usable(self, dbi):
+        return not dbi.closed and not dbi.broken and dbi.info.transaction_status == TransactionStatus.IDLE
+
+    def is_expired(self, dbi):
+        return time.monotonic() - self.created.get(dbi, 0) > self.max_lifetime
+
+    async def connect(self):
+        dbi = await psycopg.AsyncConnection.connect(self.conninfo)
+        self.created[dbi] = time.monotonic()
+        self.stats["connected"] += 1
+        return dbi
+
+    async def discard(self, dbi):
+        self.created.pop(dbi, None)
+        self.stats["discarded"] += 1
+        with contextlib.suppress(psycopg.Error):
             await dbi.close()
-        else:
-            self.cache.append(dbi)
-            if len(self.cache)>self.cache_limit:
-                dbi = self.cache.popleft()
-                await dbi.close()
-        self.lock.release()
+
+    def start_fill(self):
+        # закрытые соединения заменяются в фоне
+        if self.closed or self.size >= self.min_size:
+            return
+        if self.fill_task and not self.fill_task.done():
+            return
+        self.fill_task = asyncio.create_task(self.fill())
+
+    async def fill(self, retry=True):
+        while not self.closed and self.size < self.min_size:
+            try:
+                dbi = await self.connect()
+            except psycopg.Error as ex:
+                if not retry:
+                    raise
+                logger.warning("pool: connect failed: %s", ex)
+                await asyncio.sleep(1)
+                continue
+            self.idle.appendleft((dbi, time.monotonic()))
+
+    def get_stats(self):
+        acquired = self.stats["acquired"]
+        return dict(self.stats,
+                    size=self.size,
+                    idle=len(self.idle),
+                    used=self.size - len(self.idle),
+                    wait_avg=self.stats["wait_total"] / acquired if acquired else 0.0)
@@ -21,3 +21,14 @@ def apply_sql_files(db_name, sql_files):
             #sql = sql.replace("%", "%%")
             dbi.execute(sql)
         dbi.commit()
+
+def maintain_partitions(db_name, keep_days=None, ahead_days=3):
+    """Разделы table_cmd/table_msg (db/changes/v0.4.0): создание вперед, архивирование старых"""
+    conninfo = DBI.conninfo(db_name)
+    with psycopg.connect(conninfo, autocommit=False) as dbi:
+        # не задерживаем запись в таблицы, если отключение раздела ждет блокировку
+        dbi.execute("SET lock_timeout = '5s'")
+        rows = dbi.execute("SELECT action, table_name FROM table_events_maintain(%s, %s)",
+                           (keep_days, ahead_days)).fetchall()
+        dbi.commit()
+    return rows
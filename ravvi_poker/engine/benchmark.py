@@ -0,0 +1,192 @@
+import contextlib
+import json
+import os
+import platform
+import random
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+from .poker.bet import Bet
+from .poker.bomb_pot import BombPotMixin
+from .poker.double_board import DoubleBoardMixin
+from .poker.hi_low import HiLowMixin
+from .poker.multibank import get_banks
+from .poker.nlh import Poker_NLH_REGULAR, Poker_NLH_6P
+from .poker.plo import Poker_PLO_4, Poker_PLO_5, Poker_PLO_6
+from .user import User
+
+# варианты игр: класс игры и модификаторы, как их создает Table.game_factory
+VARIANTS = {
+    "nlh": dict(game_class=Poker_NLH_REGULAR),
+    "nlh_36": dict(game_class=Poker_NLH_6P),
+    "plo4": dict(game_class=Poker_PLO_4),
+    "plo5": dict(game_class=Poker_PLO_5),
+    "plo6": dict(game_class=Poker_PLO_6),
+    "plo4_hi_low": dict(game_class=Poker_PLO_4, mixin=HiLowMixin),
+    "nlh_double_board": dict(game_class=Poker_NLH_REGULAR, mixin=DoubleBoardMixin),
+    "plo4_bomb_pot": dict(game_class=Poker_PLO_4, mixin=[BombPotMixin, DoubleBoardMixin], bomb_pot=True),
+}
+
+OPERATIONS = ["get_best_hand", "get_banks", "get_bet_options", "get_rounds_results"]
+
+BLIND_SMALL = Decimal(1)
+BLIND_BIG = Decimal(2)
+BOMBPOT_BLIND_MULTIPLIER = 5
+
+
+class BenchmarkTable:
+    """Минимальный стол для создания игры без БД и клиентов"""
+    TABLE_TYPE = "BENCHMARK"
+
+    def __init__(self, players_required=2) -> None:
+        self.game_modes_config = SimpleNamespace(players_required=players_required)
+        self.seven_deuce = None
+        self.bombpot = None
+        self.ante = None
+
+
+def check_variant(variant, players_num):
+    """Раздача варианта на players_num игроков (карты игроков и полные борды) помещается в колоду"""
+    options = VARIANTS[variant]
+    game_class = options["game_class"]
+    mixin = options.get("mixin") or []
+    boards_num = 2 if DoubleBoardMixin in (mixin if isinstance(mixin, list) else [mixin]) else 1
+    player_cards = game_class.PLAYER_CARDS_FREFLOP
+    board_cards = boards_num * 5
+    if players_num < 2:
+        raise ValueError(f"{variant}: at least 2 players required")
+    if players_num * player_cards + board_cards > game_class.GAME_DECK:
+        max_players = (game_class.GAME_DECK - board_cards) // player_cards
+        raise ValueError(f"{variant}: {players_num} players need {players_num * player_cards + board_cards} cards, "
+                         f"deck has {game_class.GAME_DECK} (max {max_players} players)")
+
+
+def create_game(variant, rng: random.Random, players_num):
+    """Игра с розданными картами, полными бордами и случайными ставками игроков"""
+    check_variant(variant, players_num)
+    options = VARIANTS[variant]
+    users = []
+    for user_id in range(1, players_num + 1):
+        user = User(user_id, f"u{user_id}")
+        user.balance = Decimal(rng.randint(50, 500))
+        users.append(user)
+    kwargs = dict(blind_small=BLIND_SMALL, blind_big=BLIND_BIG)
+    if "mixin" in options:
+        kwargs.update(mixin=options["mixin"])
+    if options.get("bomb_pot"):
+        kwargs.update(bombpot_blind_multiplier=BOMBPOT_BLIND_MULTIPLIER)
+    game = options["game_class"](BenchmarkTable(), users, **kwargs)
+
+    game.deck_seed = rng.getrandbits(32)
+    game.setup_boards()
+    for _ in range(game.PLAYER_CARDS_FREFLOP):
+        for p in game.players:
+            p.cards.append(game.deck.get_next())
+    for board in game.boards:
+        for _ in range(5):
+            board.append_card(game.deck.get_next())
+
+    # уровень ставок раунда: игроки в игре уравнивают его или идут олл-ин, сбросившие ставят меньше,
+    # первый игрок всегда покрывает уровень
+    level = BLIND_BIG * rng.randint(1, 100)
+    game.players[0].user.balance = max(game.players[0].user.balance, level + BLIND_BIG)
+    for num, p in enumerate(game.players):
+        if options.get("bomb_pot"):
+            bet_type, bet_total = Bet.BOMBPOT_ANTE, BLIND_BIG * BOMBPOT_BLIND_MULTIPLIER
+        elif num >= 2 and rng.random() < 0.3:
+            bet_type, bet_total = Bet.FOLD, BLIND_BIG * rng.randint(0, int(level / BLIND_BIG) - 1)
+        elif p.user.balance <= level:
+            bet_type, bet_total = Bet.ALLIN, p.user.balance
+        else:
+            bet_type, bet_total = Bet.CALL, level
+        bet_total = min(bet_total, p.user.balance)
+        p.bet_type = bet_type
+        p.bet_total = bet_total
+        p.bet_amount = bet_total
+        p.user.balance -= bet_total
+    game.bet_level = max(p.bet_amount for p in game.players)
+    game.bet_raise = BLIND_BIG
+    game.bet_total = sum(p.bet_total for p in game.players)
+    return game
+
+
+def get_stats(latencies) -> dict:
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    calls = len(latencies)
+    return dict(
+        calls=calls,
+        total_sec=round(total, 6),
+        ops_per_sec=round(calls / total, 1) if total else None,
+        mean_us=round(total / calls * 1e6, 3) if calls else None,
+        p50_us=round(latencies[calls // 2] * 1e6, 3) if calls else None,
+        p99_us=round(latencies[min(calls - 1, calls * 99 // 100)] * 1e6, 3) if calls else None,
+    )
+
+
+def run_variant(variant, *, deals, seed, players_num) -> dict:
+    rng = random.Random(f"{seed}:{variant}")
+    latencies = {op: [] for op in OPERATIONS}
+    perf_counter = time.perf_counter
+    for _ in range(deals):
+        game = create_game(variant, rng, players_num)
+
+        for p in game.players:
+            hands = []
+            for board in game.boards:
+                t = perf_counter()
+                result = game.get_best_hand(p.cards, board)
+                latencies["get_best_hand"].append(perf_counter() - t)
+                hands.extend(result if isinstance(result, list) else [result])
+            p.hands = hands
+
+        t = perf_counter()
+        banks, _ = get_banks(game.players)
+        latencies["get_banks"].append(perf_counter() - t)
+        game.banks = banks
+
+        for p in game.players:
+            t = perf_counter()
+            game.get_bet_options(p)
+            latencies["get_bet_options"].append(perf_counter() - t)
+
+        t = perf_counter()
+        game.get_rounds_results()
+        latencies["get_rounds_results"].append(perf_counter() - t)
+
+    results = {op: get_stats(values) for op, values in latencies.items()}
+    best_hand = results["get_best_hand"]
+    results["hands_per_sec"] = best_hand["ops_per_sec"]
+    return results
+
+
+def run_benchmark(variants=None, *, deals=1000, seed=0, players_num=6) -> dict:
+    """Замер производительности движка на одинаковых (seed) раздачах для сравнения между коммитами"""
+    variants = variants or list(VARIANTS)
+    results = {}
+    # часть кода движка пишет отладку в stdout, в замер и вывод она не попадает
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for variant in variants:
+            results[variant] = run_variant(variant, deals=deals, seed=seed, players_num=players_num)
+    return dict(
+        seed=seed,
+        deals=deals,
+        players=players_num,
+        python=platform.python_version(),
+        results=results,
+    )
+
+
+def format_report(report, as_json=False) -> str:
+    if as_json:
+        return json.dumps(report, indent=2)
+    lines = [f"seed={report['seed']} deals={report['deals']} players={report['players']} "
+             f"python={report['python']}"]
+    for variant, results in report["results"].items():
+        lines.append(f"{variant}: hands/sec {results['hands_per_sec']}")
+        for op in OPERATIONS:
+            stats = results[op]
+            lines.append(f"  {op:<20} calls {stats['calls']:>8} ops/sec {stats['ops_per_sec']:>12} "
+                         f"mean {stats['mean_us']:>10}us p50 {stats['p50_us']:>10}us p99 {stats['p99_us']:>10}us")
+    return "\n".join(lines)
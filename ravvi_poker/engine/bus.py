@@ -0,0 +1,165 @@
+import asyncio
+import uuid
+
+from .. import codec
+from ..db import DBI
+from ..logging import getLogger
+from .events import Message
+
+logger = getLogger(__name__)
+
+
+class LocalBus:
+    """
+    Доставка команд и сообщений внутри процесса, когда TablesManager и ClientsManager запущены вместе (api).
+    Если стол обслуживается этим процессом, команда передается столу напрямую, а сообщения стола - клиентам.
+    Запись в table_cmd/table_msg остается для аудита и клиентов других процессов и выполняется асинхронно.
+    Сообщения, отправленные в транзакции стола, доставляются после ее фиксации, при откате не отправляются.
+    """
+
+    # максимальное количество событий в одной транзакции записи
+    AUDIT_BATCH_SIZE = 100
+    # пауза перед повтором записи после ошибки (сек), удваивается до AUDIT_RETRY_DELAY_MAX
+    AUDIT_RETRY_DELAY = 0.5
+    AUDIT_RETRY_DELAY_MAX = 30
+    # количество попыток записи события (ошибки соединения повторяются без ограничения до остановки)
+    AUDIT_RETRY_LIMIT = 5
+
+    def __init__(self) -> None:
+        self.log = logger
+        # метка процесса: по ней менеджер клиентов пропускает оповещения о своих же сообщениях
+        self.origin = uuid.uuid4().hex
+        self.tables_manager = None
+        self.clients_manager = None
+        self.audit_queue = None
+        self.audit_task = None
+        self.audit_stopping = False
+
+    @property
+    def is_active(self):
+        return self.tables_manager is not None and self.clients_manager is not None
+
+    def get_table(self, table_id):
+        if not self.is_active:
+            return None
+        return self.tables_manager.tables.get(table_id, None)
+
+    async def register_tables_manager(self, manager):
+        self.tables_manager = manager
+        self.start_audit()
+
+    async def register_clients_manager(self, manager):
+        self.clients_manager = manager
+        self.start_audit()
+
+    async def unregister_tables_manager(self, manager):
+        if self.tables_manager is manager:
+            self.tables_manager = None
+            await self.stop_audit()
+
+    async def unregister_clients_manager(self, manager):
+        if self.clients_manager is manager:
+            self.clients_manager = None
+            await self.stop_audit()
+
+    async def send_cmd(self, table, *, client_id, user_id, cmd_type, props):
+        """Обработка команды столом этого процесса"""
+        await self.tables_manager.handle_table_cmd(table, cmd_id=None, client_id=client_id, user_id=user_id,
+                                                   cmd_type=cmd_type, props=props)
+        self.audit("cmd", client_id=client_id, table_id=table.table_id, cmd_type=cmd_type, props=props,
+                   processed=True)
+
+    async def emit_msg(self, msg: Message, db: DBI | None = None, *, transactional=True):
+        """Доставка сообщения стола клиентам этого процесса
+
+        db - транзакция стола: сообщение доставляется после ее фиксации и не отправляется при откате.
+        Сообщение игры (transactional=False) от отката не зависит и ждет транзакцию только для сохранения
+        порядка, если в ней уже есть сообщения стола.
+        """
+        kwargs = dict(msg)
+        props = kwargs.pop("props")
+        # снимок свойств в том виде, в котором их получили бы из table_msg
+        props = codec.loads(codec.dumpb(props or {}))
+        if db is not None and (transactional or db.local_msgs):
+            if not db.local_msgs:
+                db.on_commit.append(lambda: self.emit_local_msgs(db, committed=True))
+                db.on_rollback.append(lambda: self.emit_local_msgs(db, committed=False))
+            db.local_msgs.append((kwargs, props, transactional))
+            return
+        await self.deliver_msg(kwargs, props)
+
+    async def emit_local_msgs(self, db: DBI, *, committed):
+        msgs, db.local_msgs = db.local_msgs, []
+        for kwargs, props, transactional in msgs:
+            if committed or not transactional:
+                await self.deliver_msg(kwargs, props)
+
+    async def deliver_msg(self, kwargs, props):
+        if self.clients_manager is not None:
+            await self.clients_manager.dispatch_msg(Message(**kwargs, **props))
+        self.audit("msg", **kwargs, props=props)
+
+    def audit(self, kind, **kwargs):
+        if self.audit_queue is None:
+            self.start_audit()
+        self.audit_queue.put_nowait((kind, kwargs))
+
+    def start_audit(self):
+        if self.audit_task is not None:
+            return
+        self.audit_queue = asyncio.Queue()
+        self.audit_task = asyncio.create_task(self.audit_loop())
+
+    async def stop_audit(self):
+        if self.audit_task is None:
+            return
+        # дописываем накопленные события
+        self.audit_stopping = True
+        await self.audit_queue.put(None)
+        await self.audit_task
+        self.audit_task = None
+        self.audit_queue = None
+        self.audit_stopping = False
+
+    async def audit_loop(self):
+        self.log.info("audit: begin")
+        done = False
+        while not done:
+            batch = [await self.audit_queue.get()]
+            while not self.audit_queue.empty() and len(batch) < self.AUDIT_BATCH_SIZE:
+                batch.append(self.audit_queue.get_nowait())
+            if None in batch:
+                done = True
+                batch = batch[:batch.index(None)]
+            if not batch:
+                continue
+            await self.audit_write(batch)
+        self.log.info("audit: end")
+
+    async def audit_write(self, batch):
+        """Запись пакета событий с повторами, событие с ошибкой данных после AUDIT_RETRY_LIMIT попыток отбрасывается"""
+        attempts = 0
+        while batch:
+            # после ошибки события записываются по одному
+            size = 1 if attempts else len(batch)
+            try:
+                async with DBI(log=self.log) as db:
+                    await db.set_events_origin(self.origin)
+                    for kind, kwargs in batch[:size]:
+                        if kind == "cmd":
+                            await db.create_table_cmd(**kwargs)
+                        else:
+                            db.add_table_msg(**kwargs)
+            except Exception as ex:
+                attempts += 1
+                retry = isinstance(ex, DBI.OperationalError) and not self.audit_stopping
+                if attempts < self.AUDIT_RETRY_LIMIT or retry:
+                    self.log.warning("audit: write failed (%s/%s): %s", attempts, self.AUDIT_RETRY_LIMIT, ex)
+                    await asyncio.sleep(min(self.AUDIT_RETRY_DELAY * 2 ** (attempts - 1), self.AUDIT_RETRY_DELAY_MAX))
+                    continue
+                self.log.error("audit: event dropped after %s attempts: %s %s", attempts, ex, batch[0])
+            batch = batch[size:]
+            attempts = 0
+
+
+local_bus = LocalBus()
@@ -1,22 +1,55 @@
-from random import SystemRandom
+import os
+from random import Random
+
+# таблицы по коду карты (0 - закрытая карта): ранг 2..14, масть 1..4, бит в маске колоды
+CARD_RANK = [0] + [code % 13 + 2 for code in range(52)]
+CARD_SUIT = [0] + [code // 13 + 1 for code in range(52)]
+CARD_MASK = [0] + [1 << code for code in range(52)]
+# порядок карт в руке: по убыванию ранга, затем по масти
+CARD_ORDER = [0] + [(12 - code % 13) * 4 + code // 13 for code in range(52)]
+
+
+def get_cards_mask(codes) -> int:
+    mask = 0
+    for code in codes:
+        mask |= CARD_MASK[code]
+    return mask
+
 
 class Card:
+    """Карта; экземпляры неизменяемые и создаются один раз на код (Card(x) is Card(x))"""
+    __slots__ = ("code",)
+
     RANKS = ["2", "3", "4", "5", "6", "7", "8", "9", "T", "J", "Q", "K", "A"]
     # (S)pades(♠) (C)lubs(♣) (D)iamonds(♦) (H)earts(♥)
     SUITS = ["♠", "♣", "♦", "♥"]
     SUITS2 = ["S", "C", "D", "H"]
 
-    def __init__(self, code=None, *, rank=None, suit=None) -> None:
+    def __new__(cls, code=None, *, rank=None, suit=None) -> "Card":
         if code is None:
-            code = self.encode(suit=suit, rank=rank)
+            code = cls.encode(suit=suit, rank=rank)
         elif isinstance(code, str):
-            code = self.parse(code)
-        if code == 0:
-            self.code = 0
-        elif code < 1 or code > 52:
+            code = cls.parse(code)
+        elif isinstance(code, Card):
+            return code
+        if code < 0 or code > 52:
             raise ValueError(f"invalid card code: {code}")
-        else:
-            self.code = code
+        return CARDS[code]
+
+    @classmethod
+    def _create(cls, code) -> "Card":
+        card = object.__new__(cls)
+        object.__setattr__(card, "code", code)
+        return card
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Card is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Card is immutable")
+
+    def __reduce__(self):
+        return Card, (self.code,)
 
     @classmethod
     def get_suite_idx(cls, suit):
@@ -63,44 +96,103 @@ class Card:
 
     @property
     def rank(self):
-        if 1 <= self.code and self.code <= 52:
-            return (self.code - 1) % 13 + 2
-        else:
-            return None
+        return CARD_RANK[self.code] or None
 
     @property
     def suit(self):
-        if 1 <= self.code and self.code <= 52:
-            return int((self.code - 1) / 13) + 1
-        else:
-            return None
+        return CARD_SUIT[self.code] or None
 
     @property
     def mask(self):
-        return 1 << self.code - 1 if self.code else 0
+        return CARD_MASK[self.code]
 
     def __str__(self) -> str:
-        if self.code == 0:
-            return "XX"
-        return f"{self.RANKS[self.rank-2]}{self.SUITS[self.suit-1]}"
+        return CARD_NAME[self.code]
+
+
+CARDS = tuple(Card._create(code) for code in range(53))
+CARD_NAME = ["XX"] + [f"{Card.RANKS[code % 13]}{Card.SUITS[code // 13]}" for code in range(52)]
+
+
+class BufferedSystemRandom(Random):
+    """
+    Криптографический генератор как SystemRandom, но энтропия читается из os.urandom блоками,
+    а не отдельным системным вызовом на каждое случайное число.
+    """
+    BUFFER_SIZE = 4096
+
+    def __init__(self, buffer_size=None) -> None:
+        self.buffer_size = buffer_size or self.BUFFER_SIZE
+        self._buffer = b""
+        self._pos = 0
+        super().__init__()
+
+    def seed(self, *args, **kwargs) -> None:
+        # как и у SystemRandom, состояние не задается
+        self._buffer = b""
+        self._pos = 0
+
+    def getstate(self):
+        raise NotImplementedError("BufferedSystemRandom has no state")
+
+    def setstate(self, state):
+        raise NotImplementedError("BufferedSystemRandom has no state")
+
+    def randbytes(self, n) -> bytes:
+        if self._pos + n > len(self._buffer):
+            self._buffer = os.urandom(max(self.buffer_size, n))
+            self._pos = 0
+        data = self._buffer[self._pos:self._pos + n]
+        self._pos += n
+        return data
+
+    def getrandbits(self, k) -> int:
+        if k < 0:
+            raise ValueError("number of bits must be non-negative")
+        numbytes = (k + 7) // 8
+        x = int.from_bytes(self.randbytes(numbytes), "big")
+        return x >> (numbytes * 8 - k)
+
+    def random(self) -> float:
+        return (int.from_bytes(self.randbytes(7), "big") >> 3) * 2 ** -53
+
+
+# общий генератор колод, после fork дочерний процесс не должен повторять буфер родителя
+system_rng = BufferedSystemRandom()
+os.register_at_fork(after_in_child=system_rng.seed)
 
 
 class Deck:
-    def __init__(self, deck_type) -> None:
+    """
+    Колода перемешивается один раз при первой раздаче, карты выдаются по курсору.
+    rng - любой объект с методом shuffle (по умолчанию криптографический system_rng),
+    seed - детерминированный режим для симуляций, повторов и нагрузочных тестов.
+    """
+
+    def __init__(self, deck_type, *, rng=None, seed=None) -> None:
         if deck_type not in (36, 52):
             raise ValueError(f"Invalid deck_type {deck_type}")
         self.cards = list(range(1, 53))
         if deck_type == 36:
-            self.cards = list(filter(lambda x: Card(x).rank >= 6, self.cards))
-        self.rng = SystemRandom()
-        #self.rng.shuffle(self.cards)
+            self.cards = list(filter(lambda x: CARD_RANK[x] >= 6, self.cards))
+        if rng is None:
+            rng = Random(seed) if seed is not None else system_rng
+        self.rng = rng
+        self.cursor = None
+
+    def shuffle(self):
+        self.rng.shuffle(self.cards)
+        self.cursor = 0
 
     def get_next(self):
-        idx = self.rng.randint(0, len(self.cards)-1)
-        return self.cards.pop(idx)
+        if self.cursor is None:
+            self.shuffle()
+        card = self.cards[self.cursor]
+        self.cursor += 1
+        return card
 
     def __len__(self):
-        return len(self.cards)
-    
+        return len(self.cards) - (self.cursor or 0)
+
     def __iter__(self):
-        return iter(self.cards)
\ No newline at end of file
+        return iter(self.cards[self.cursor or 0:])
@@ -12,6 +12,17 @@ def cmd_run(args):
     run_async_loop()
 
 
+def cmd_bench(args):
+    from .benchmark import run_benchmark, format_report
+    report = run_benchmark(args.variant, deals=args.deals, seed=args.seed, players_num=args.players)
+    output = format_report(report, as_json=args.json)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
 def main():
     parser = argparse.ArgumentParser(usage="ravvi_poker_engine [-h] OPTIONS COMMAND ...")
     parser.set_defaults(func=None)
@@ -26,11 +37,29 @@ def main():
     cmd = commands.add_parser("run", help="Run service")
     cmd.set_defaults(func=cmd_run)
 
+    # BENCH
+    from .benchmark import VARIANTS, check_variant
+    cmd = bench_parser = commands.add_parser("bench", help="Run engine benchmark")
+    cmd.add_argument("--variant", action="append", choices=list(VARIANTS), help="game variant (default: all)")
+    cmd.add_argument("--deals", type=int, default=1000, help="deals per variant")
+    cmd.add_argument("--seed", type=int, default=0, help="deals seed")
+    cmd.add_argument("--players", type=int, default=6, help="players per deal")
+    cmd.add_argument("--json", action="store_true", help="JSON output")
+    cmd.add_argument("--output", help="output file")
+    cmd.set_defaults(func=cmd_bench)
+
     # parse arguments
     args = parser.parse_args()
     if not args.func:
         parser.print_help()
         exit(os.EX_USAGE)
+    if args.func is cmd_bench:
+        # колода должна вместить раздачу каждого варианта
+        for variant in args.variant or VARIANTS:
+            try:
+                check_variant(variant, args.players)
+            except ValueError as ex:
+                bench_parser.error(str(ex))
 
     # use parser args to configre logging
     logging_configure(args)
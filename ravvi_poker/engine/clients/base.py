@@ -1,4 +1,5 @@
 import asyncio
+from collections import deque
 
 from ...db import DBI
 from ..events import Message, Command
@@ -33,40 +34,108 @@ class ClientBase(ClientAbs):
 
 
 class ClientQueue(ClientBase):
+    # максимальное количество сообщений в очереди клиента,
+    # при превышении очередь сбрасывается и клиент получает актуальные TABLE_INFO своих столов
+    MSG_QUEUE_LIMIT = 500
 
     def __init__(self, manager: ClientsManager, client_id: int, user_id: int) -> None:
         super().__init__(manager, client_id, user_id)
-        self.msg_queue = asyncio.Queue()
+        # элементы очереди [msg, key], msg=None - сообщение заменено более новым
+        self.msg_queue = deque()
+        self.msg_queue_keys = {}
+        self.msg_queue_depth = 0
+        self.msg_queue_ready = asyncio.Event()
+        self.msg_queue_closed = False
+        self.msg_resync = False
         self.msg_task = None
+        self.msg_stats = dict(sent=0, coalesced=0, resync=0, depth_max=0)
 
     async def start(self):
         self.msg_task = asyncio.create_task(self.msg_queue_loop())
         await super().start()
 
     async def shutdown(self):
-        await self.msg_queue.put(None)
+        self.msg_queue_closed = True
+        self.msg_queue_ready.set()
 
     async def wait_done(self):
         await self.msg_task
 
+    @staticmethod
+    def get_coalesce_key(msg: Message):
+        """Ключ сообщений, из которых клиенту нужно только последнее"""
+        if msg.msg_type in (Message.Type.TABLE_INFO, Message.Type.GAME_PLAYER_MOVE):
+            return msg.msg_type, msg.table_id
+        if msg.msg_type == Message.Type.PLAYER_BALANCE:
+            return msg.msg_type, msg.table_id, msg.user_id
+        return None
+
     async def handle_msg(self, msg: Message):
-        await self.msg_queue.put(msg)
+        key = self.get_coalesce_key(msg)
+        if key is not None:
+            entry = self.msg_queue_keys.pop(key, None)
+            if entry is not None:
+                # предыдущее такое же сообщение еще не отправлено
+                entry[0] = None
+                self.msg_queue_depth -= 1
+                self.msg_stats["coalesced"] += 1
+        entry = [msg, key]
+        self.msg_queue.append(entry)
+        self.msg_queue_depth += 1
+        if key is not None:
+            self.msg_queue_keys[key] = entry
+        self.msg_stats["depth_max"] = max(self.msg_stats["depth_max"], self.msg_queue_depth)
+        if self.msg_queue_depth > self.MSG_QUEUE_LIMIT:
+            self.log.warning("msg_queue: limit %s exceeded, resync", self.MSG_QUEUE_LIMIT)
+            self.msg_queue.clear()
+            self.msg_queue_keys.clear()
+            self.msg_queue_depth = 0
+            # запрос TABLE_INFO выполняется циклом очереди (команда может обрабатываться столом в этом процессе)
+            self.msg_resync = True
+            self.msg_stats["resync"] += 1
+        self.msg_queue_ready.set()
+
+    async def send_resync(self):
+        for table_id in list(self.tables):
+            await self.send_cmd(Command(table_id=table_id, cmd_type=Command.Type.INFO, client_id=self.client_id))
+
+    async def get_next_msg(self) -> Message | None:
+        while True:
+            if self.msg_resync:
+                self.msg_resync = False
+                try:
+                    await self.send_resync()
+                except Exception as e:
+                    self.log.exception("resync: %s", e)
+            while self.msg_queue:
+                msg, key = entry = self.msg_queue.popleft()
+                if msg is None:
+                    continue
+                self.msg_queue_depth -= 1
+                if key is not None and self.msg_queue_keys.get(key) is entry:
+                    del self.msg_queue_keys[key]
+                return msg
+            if self.msg_queue_closed:
+                return None
+            self.msg_queue_ready.clear()
+            await self.msg_queue_ready.wait()
+
+    def get_stats(self) -> dict:
+        return dict(client_id=self.client_id, user_id=self.user_id, depth=self.msg_queue_depth, **self.msg_stats)
 
     async def msg_queue_loop(self):
         self.log.debug("msg_queue_loop: begin")
         while self.is_connected:
             # get next msg from queue
-            msg: Message = await self.msg_queue.get()
+            msg: Message = await self.get_next_msg()
             try:
                 if not msg:
                     await self.on_shutdown()
                     break
                 # handle message by client
                 await self.on_msg(msg)
+                self.msg_stats["sent"] += 1
             except Exception as e:
                 self.log.exception("msg: %s: %s", msg, e)
                 break
-            finally:
-                self.msg_queue.task_done()
         self.log.debug("msg_queue_loop: end")
-
@@ -2,6 +2,7 @@ import logging
 import asyncio
 
 from ...db import DBI, DBI_Listener
+from ..bus import local_bus
 from ..events import Command, Message
 from .abs import ClientAbs, ClientsMap
 
@@ -13,14 +14,24 @@ class ClientsManager:
         self.log = logger
         self.clients : ClientsMap= {}
         self.table_subscribers = {}
+        # каналы столов table_msg_<table_id>: id последнего доставленного сообщения стола
+        self.table_channels = {}
+        # table_id -> engine_status, сбрасывается по table_profile_status
+        self.tables_status = {}
         self.last_event_id = None
         self.listener = DBI_Listener(log=self.log)
+        self.listener.on_listen = self.on_listen
+        self.listener.on_replay = self.on_replay
+        self.listener.on_channel_listen = self.on_channel_listen
+        # table_msg - сообщения конкретным клиентам, сообщения столов - в каналах столов при наличии подписчиков
         self.listener.channels = {
             "table_msg": self.on_table_msg,
             "user_client_closed": self.on_user_client_closed,
+            "table_profile_status": self.on_table_profile_status,
         }
 
     async def start(self):
+        await local_bus.register_clients_manager(self)
         await self.listener.start()
 
     async def stop(self):
@@ -31,6 +42,7 @@ class ClientsManager:
         # ждем завершения работы всех клиентов
         await self._wait_client_closed()
         self.log.info("shutdown clients done")
+        await local_bus.unregister_clients_manager(self)
         # выключаем прием оповещений
         await self.listener.stop()
 
@@ -44,23 +56,64 @@ class ClientsManager:
             # remove client from table subscribers
             # сообщения от этого стола нам больше не интересны в любом случае
             self.unsubscribe(client, cmd.table_id)
+        table = local_bus.get_table(cmd.table_id)
+        if table:
+            # стол в этом же процессе
+            await local_bus.send_cmd(table, client_id=cmd.client_id, user_id=client.user_id,
+                                     cmd_type=cmd.cmd_type, props=cmd.props)
+            return
         # send cmd to db            
         async with DBI(log=self.log) as db:
-            table = await db.get_table(cmd.table_id)
-            if not table or table.engine_status != 5:
+            if await self.get_table_status(db, cmd.table_id) != 5:
                 msg = Message(msg_type=Message.Type.TABLE_ERROR, table_id=cmd.table_id)
                 await client.handle_msg(msg)
             await db.create_table_cmd(client_id=cmd.client_id, table_id=cmd.table_id, cmd_type=cmd.cmd_type, props=cmd.props)
 
-    async def on_table_msg(self, *, msg_id, table_id):
+    async def get_table_status(self, db, table_id):
+        engine_status = self.tables_status.get(table_id, None)
+        if engine_status is None:
+            table = await db.get_table(table_id)
+            if not table:
+                return None
+            engine_status = self.tables_status[table_id] = table.engine_status
+        return engine_status
+
+    async def on_table_profile_status(self, *, table_id, engine_status, engine_id):
+        self.tables_status.pop(table_id, None)
+
+    async def on_table_msg(self, *, msgs):
+        # сообщения одного INSERT в порядке записи
+        for item in msgs:
+            await self.handle_table_msg(**item)
+
+    async def handle_table_msg(self, *, msg_id, table_id, origin=None, game_id=None, msg_type=None, cmd_id=None,
+                               client_id=None, props=None):
         if not msg_id or not table_id:
             return
-        async with DBI() as dbi:
-            msg = await dbi.get_table_msg(msg_id)
-        if not msg:
+        if origin and origin == local_bus.origin:
+            # сообщение уже доставлено клиентам напрямую
             return
-        msg = Message(msg.id, msg_type=msg.msg_type, table_id=msg.table_id, game_id=msg.game_id, cmd_id=msg.cmd_id, client_id=msg.client_id, **msg.props)
+        if not client_id and table_id in self.table_channels:
+            last_msg_id = self.table_channels[table_id]
+            if last_msg_id is not None and msg_id <= last_msg_id:
+                # уже доставлено при чтении пропущенных сообщений
+                return
+            self.table_channels[table_id] = msg_id
+        if msg_type is not None:
+            # сообщение целиком в оповещении
+            msg = Message(msg_id, msg_type=msg_type, table_id=table_id, game_id=game_id, cmd_id=cmd_id,
+                          client_id=client_id, **(props or {}))
+        else:
+            # сообщение не поместилось в оповещение
+            async with DBI() as dbi:
+                msg = await dbi.get_table_msg(msg_id)
+            if not msg:
+                return
+            msg = Message(msg.id, msg_type=msg.msg_type, table_id=msg.table_id, game_id=msg.game_id, cmd_id=msg.cmd_id, client_id=msg.client_id, **msg.props)
         #self.log.debug("on_table_msg: %s %s %s", msg_id, msg.msg_type, msg.props)
+        await self.dispatch_msg(msg)
+
+    async def dispatch_msg(self, msg: Message):
         if msg.client_id:
             # send directly to specific client
             client = self.clients.get(msg.client_id, None)
@@ -71,15 +124,27 @@ class ClientsManager:
         if not subscribers:
             return
         counter = 0
-        for client in subscribers.values():
+        # публичный вид (None) и личные виды участников сообщения строятся один раз на всех получателей
+        private_user_ids = msg.get_private_user_ids()
+        views = {}
+        for client in list(subscribers.values()):
             if msg.msg_type == Message.Type.TABLE_INFO:
                 if msg.table_redirect_id:
                     self.unsubscribe(client, msg.table_id)
-                    self.subscribe(client, msg.table_redirect_id)
-            cmsg = msg.hide_private_info(client.user_id)
+                    self.subscribe(client, msg.table_redirect_id, msg.id)
+            view_key = client.user_id if client.user_id in private_user_ids else None
+            cmsg = views.get(view_key, None)
+            if cmsg is None:
+                cmsg = msg.hide_private_info(client.user_id)
+                views[view_key] = cmsg
             await client.handle_msg(cmsg)
             counter += 1
-        self.log.debug("on_table_msg: %s %s", counter, msg)
+        self.log.debug("dispatch_msg: %s %s", counter, msg)
+
+    def get_clients_stats(self, user_id=None) -> list[dict]:
+        """Состояние очередей сообщений клиентов (user_id - только клиенты пользователя)"""
+        return [x.get_stats() for x in self.clients.values()
+                if hasattr(x, "get_stats") and (user_id is None or x.user_id == user_id)]
 
     async def on_user_client_closed(self, *, client_id):
         self.log.info("on_user_client_closed %s", client_id)
@@ -93,11 +158,12 @@ class ClientsManager:
         await client.shutdown()
         await client.wait_done()
         
-    def subscribe(self, client, table_id):
+    def subscribe(self, client, table_id, msg_id=None):
         subscribers = self.table_subscribers.get(table_id, None)
         if subscribers is None:
             subscribers = {}
             self.table_subscribers[table_id] = subscribers
+            self.listen_table(table_id, msg_id)
         subscribers[client.client_id] = client
         client.tables.add(table_id)
 
@@ -111,3 +177,55 @@ class ClientsManager:
         # cleanup 
         if subscribers is not None and len(subscribers)==0:
             self.table_subscribers.pop(table_id, None)
+            self.unlisten_table(table_id)
+
+    def listen_table(self, table_id, msg_id=None):
+        """Прием сообщений стола, msg_id - сообщение, после которого нужны сообщения стола"""
+        if local_bus.get_table(table_id):
+            # стол в этом же процессе, сообщения доставляются напрямую
+            return
+        self.table_channels[table_id] = msg_id
+        self.listener.add_channel(f"table_msg_{table_id}", self.on_table_msg, key=table_id, last_id=msg_id)
+
+    def unlisten_table(self, table_id):
+        if self.table_channels.pop(table_id, False) is False:
+            return
+        self.listener.remove_channel(f"table_msg_{table_id}")
+
+    async def on_listen(self, backend_id):
+        # оповещения о смене статуса столов во время переподключения не повторяются
+        self.tables_status.clear()
+        if "table_msg" not in self.listener.channels_last_id:
+            async with DBI() as dbi:
+                self.listener.channels_last_id["table_msg"] = await dbi.get_table_msg_last_id()
+
+    async def on_replay(self, dbi, channel, last_id):
+        # сообщения, оповещения о которых пропущены при переподключении
+        if channel == "table_msg":
+            if not self.clients:
+                return []
+            rows = await dbi.get_client_msgs_after(last_id, self.clients)
+            # сообщения столов этого процесса уже доставлены напрямую (запись для аудита)
+            rows = [row for row in rows if not local_bus.get_table(row.table_id)]
+        elif channel.startswith("table_msg_"):
+            rows = await dbi.get_table_msgs_after(int(channel[len("table_msg_"):]), last_id)
+        else:
+            return []
+        return [dict(msgs=[dict(msg_id=row.id, table_id=row.table_id, game_id=row.game_id, msg_type=row.msg_type,
+                                cmd_id=row.cmd_id, client_id=row.client_id, props=row.props)])
+                for row in rows]
+
+    async def on_channel_listen(self, channel):
+        # сообщения стола, отправленные до LISTEN (например, в одной транзакции с TABLE_INFO подписки)
+        if not channel.startswith("table_msg_"):
+            return
+        table_id = int(channel[len("table_msg_"):])
+        msg_id = self.table_channels.get(table_id, None)
+        if msg_id is None:
+            return
+        async with DBI() as dbi:
+            rows = await dbi.get_table_msgs_after(table_id, msg_id)
+        for row in rows:
+            await self.handle_table_msg(msg_id=row.id, table_id=row.table_id, game_id=row.game_id,
+                                        msg_type=row.msg_type, cmd_id=row.cmd_id, client_id=row.client_id,
+                                        props=row.props)
@@ -2,6 +2,7 @@ import logging
 from starlette.websockets import WebSocket, WebSocketState
 from fastapi import WebSocketDisconnect
 
+from ... import codec
 from .base import ClientQueue, Message, ClientsManager
 
 logger = logging.getLogger(__name__)
@@ -20,15 +21,10 @@ class ClientWS(ClientQueue):
         return self.ws.client_state == WebSocketState.CONNECTED
 
     async def on_msg(self, msg: Message):
-        data = dict(msg)
-        # remove system internal props
-        for k in ('cmd_id','client_id'):
-            data.pop(k,None)
-        # move props to top level
-        props = data.pop('props')
-        data.update(props)
-        self.log.debug("send_json: %s", data)
-        await self.ws.send_json(data)
+        # JSON общий для всех клиентов, получающих этот вид сообщения
+        data = msg.to_json()
+        self.log.debug("send_text: %s", data)
+        await self.ws.send_text(data)
 
     async def on_shutdown(self):
         if self.is_connected:
@@ -38,7 +34,7 @@ class ClientWS(ClientQueue):
         self.log.info('recv_commands: ...')
         try:
             while self.is_connected:
-                cmd = await self.ws.receive_json()
+                cmd = codec.loads(await self.ws.receive_text())
                 self.log.debug("cmd: %s", cmd)
                 await self.send_cmd(cmd)
         except WebSocketDisconnect:
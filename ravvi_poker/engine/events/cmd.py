@@ -7,6 +7,7 @@ class CommandType(IntEnum):
     EXIT = 12
     TAKE_SEAT = 13
     BUYIN = 14
+    INFO = 15
 
     BET = 21
     SHOW_CARDS = 22
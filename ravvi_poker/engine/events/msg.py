@@ -1,6 +1,8 @@
 from enum import IntEnum, unique
 import copy
 
+from ... import codec
+
 
 @unique
 class MessageType(IntEnum):
@@ -22,6 +24,7 @@ class MessageType(IntEnum):
     GAME_ROUND = 302
     GAME_CARDS = 303
     GAME_PLAYER_MOVE = 304
+    GAME_EQUITY = 305
     GAME_PROPOSED_CARD_DROP = 310
     ROUND_RESULT = 390
     GAME_RESULT = 391
@@ -49,6 +52,7 @@ class Message(dict):
             table_id=table_id, game_id=game_id, msg_type=msg_type, cmd_id=cmd_id, client_id=client_id, props=props
         )
         self.id = id
+        self.json = None
 
     @property
     def table_id(self):
@@ -89,6 +93,14 @@ class Message(dict):
             **props,
         )
 
+    def get_private_user_ids(self) -> set:
+        """Пользователи, для которых сообщение отличается от публичного"""
+        if self.msg_type == Message.Type.TABLE_INFO:
+            return {u.get("user_id", None) for u in self.users or []}
+        elif self.msg_type in (Message.Type.PLAYER_CARDS, Message.Type.GAME_PLAYER_MOVE):
+            return {self.user_id}
+        return set()
+
     def hide_private_info(self, for_user_id):
         def hide_cards(props: dict):
             user_id = props.get("user_id", None)
@@ -115,14 +127,33 @@ class Message(dict):
             elif user_id == for_user_id:
                 props.update(visible_cards=visible_cards)
 
-        msg = self.clone()
+        # копируются только изменяемые словари, вложенные значения общие с исходным сообщением
+        msg = Message(
+            self.id,
+            table_id=self.table_id,
+            game_id=self.game_id,
+            msg_type=self.msg_type,
+            cmd_id=self.cmd_id,
+            client_id=self.client_id,
+            **self.props,
+        )
         if msg.msg_type == Message.Type.TABLE_INFO:
-            users = msg.users or []
+            users = [dict(u) for u in msg.users or []]
             for u in users:
                 hide_cards(u)
+            if msg.users is not None:
+                msg.props.update(users=users)
         elif msg.msg_type == Message.Type.PLAYER_CARDS:
             hide_cards(msg.props)
         elif msg.msg_type == Message.Type.GAME_PLAYER_MOVE:
             if msg.user_id != for_user_id:
                 msg.props.pop("options", None)
         return msg
+
+    def to_json(self) -> str:
+        """Сообщение для клиента: свойства на верхнем уровне, без служебных полей; кодируется один раз"""
+        if self.json is None:
+            data = {k: v for k, v in self.items() if k not in ("cmd_id", "client_id", "props")}
+            data.update(self.props)
+            self.json = codec.dumps(data)
+        return self.json
@@ -3,6 +3,7 @@ from enum import Enum
 
 from .cards import Deck
 from .events import Message, Command
+from .history import HandHistory
 from .player import Player
 from .poker.board import Board, BoardType
 from ..db import DBI
@@ -32,8 +33,11 @@ class Game:
         self.players = [self.player_factory(u) for u in users]
         self.dealer_id = None
         self.deck = None
+        self.deck_seed = None
         self.boards_types: list[BoardType] | None = None
         self.boards: list[Board] | None = None
+        # история раздачи (game_history)
+        self.history = HandHistory()
 
         self.condition = self.get_condition()
 
@@ -106,7 +110,7 @@ class Game:
 
     def setup_boards(self):
         # deck
-        self.deck = Deck(self.GAME_DECK)
+        self.deck = self.deck_factory()
         self.get_boards()
         self.boards = [Board(board_type) for board_type in self.boards_types]
         # players
@@ -114,6 +118,10 @@ class Game:
             p.cards = []
             p.cards_open = False
 
+    def deck_factory(self) -> Deck:
+        # deck_seed задается для воспроизводимых раздач (симуляции, повторы, нагрузочные тесты)
+        return Deck(self.GAME_DECK, seed=self.deck_seed)
+
     def get_boards(self):
         self.boards_types = [BoardType.BOARD1]
 
@@ -178,6 +186,10 @@ class Game:
                       )
         await self.emit_msg(db, msg)
 
+    async def broadcast_GAME_EQUITY(self, db, equities, **kwargs):
+        msg = Message(msg_type=Message.Type.GAME_EQUITY, equities=equities, **kwargs)
+        await self.emit_msg(db, msg)
+
     async def broadcast_GAME_ROUND_END(self, db, banks, bank_total):
         msg = Message(msg_type=Message.Type.GAME_ROUND, banks=banks, bank_total=bank_total)
         await self.emit_msg(db, msg)
@@ -196,8 +208,10 @@ class Game:
 
     async def emit_msg(self, db, msg):
         msg.update(game_id=self.game_id)
+        self.history.add(msg)
         if self.table:
-            await self.table.emit_msg(db, msg)
+            # ход игры не ждет записи сообщения в базу
+            await self.table.emit_game_msg(msg, db)
 
     async def run(self):
         raise NotImplementedError()
@@ -0,0 +1,99 @@
+import zlib
+
+from .. import codec
+from .events import Message
+
+
+class HandHistory:
+    """
+    История раздачи, собранная из сообщений игры, для записи в game_history при закрытии игры.
+    Действия хранятся по колонкам (игрок, ставка, сумма), игроки - индексами в списке users.
+    Запись сжимается (zlib), для поиска используются колонки game_history.
+    """
+
+    VERSION = 1
+
+    def __init__(self) -> None:
+        self.game_type = None
+        self.game_subtype = None
+        self.dealer_id = None
+        self.users = []
+        self.cards = {}
+        # игроки, открывшие карты
+        self.opened = set()
+        self.boards = []
+        self.actions = dict(user=[], bet=[], delta=[], amount=[], bank_total=[])
+        self.results = []
+        self.balances = []
+
+    def user_idx(self, user_id):
+        if user_id not in self.users:
+            self.users.append(user_id)
+        return self.users.index(user_id)
+
+    def add(self, msg: Message):
+        props = msg.props or {}
+        msg_type = msg.msg_type
+        if msg_type == Message.Type.GAME_BEGIN:
+            self.game_type = props.get("game_type")
+            self.game_subtype = props.get("game_subtype")
+            self.dealer_id = props.get("dealer_id")
+            for user_id in props.get("players") or []:
+                self.user_idx(user_id)
+        elif msg_type == Message.Type.PLAYER_CARDS:
+            idx = self.user_idx(props["user_id"])
+            self.cards[idx] = [int(x) for x in props.get("cards") or []]
+            if props.get("cards_open"):
+                self.opened.add(idx)
+        elif msg_type == Message.Type.GAME_CARDS:
+            self.boards = [[x["board_type"], [int(c) for c in x["cards"]]] for x in props.get("boards") or []]
+        elif msg_type == Message.Type.PLAYER_BET:
+            actions = self.actions
+            actions["user"].append(self.user_idx(props["user_id"]))
+            actions["bet"].append(props.get("bet"))
+            actions["delta"].append(props.get("delta"))
+            actions["amount"].append(props.get("amount"))
+            actions["bank_total"].append(props.get("bank_total"))
+        elif msg_type == Message.Type.ROUND_RESULT:
+            self.results.append(dict(rewards=props.get("rewards"), banks=props.get("banks"),
+                                     bank_total=props.get("bank_total")))
+        elif msg_type == Message.Type.GAME_RESULT:
+            self.balances = props.get("balances") or []
+
+    def to_dict(self) -> dict:
+        return dict(
+            v=self.VERSION,
+            game_type=self.game_type,
+            game_subtype=self.game_subtype,
+            dealer_id=self.dealer_id,
+            users=self.users,
+            cards=[self.cards.get(idx, []) for idx in range(len(self.users))],
+            opened=sorted(self.opened),
+            boards=self.boards,
+            actions=self.actions,
+            results=self.results,
+            balances=self.balances,
+        )
+
+    def encode(self) -> bytes:
+        return zlib.compress(codec.dumpb(self.to_dict()))
+
+
+def decode_hand(data: bytes, user_id: int | None = None) -> dict:
+    """Запись game_history.data в виде для клиента: действия списком в порядке игры.
+    Если задан user_id, закрытые карты других игроков не возвращаются.
+    """
+    hand = codec.loads(zlib.decompress(data))
+    users = hand["users"]
+    opened = set(hand.pop("opened"))
+    if user_id is not None:
+        hand["cards"] = [cards if uid == user_id or idx in opened else []
+                         for idx, (uid, cards) in enumerate(zip(users, hand["cards"]))]
+    actions = hand.pop("actions")
+    hand["actions"] = [
+        dict(user_id=users[idx], bet=bet, delta=delta, amount=amount, bank_total=bank_total)
+        for idx, bet, delta, amount, bank_total in zip(actions["user"], actions["bet"], actions["delta"],
+                                                       actions["amount"], actions["bank_total"])
+    ]
+    hand["cards"] = {user_id: cards for user_id, cards in zip(users, hand["cards"])}
+    return hand
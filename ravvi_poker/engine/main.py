@@ -2,6 +2,7 @@ import logging
 import asyncio
 
 from ..db import DBI
+from .poker.equity import equity_calculator
 from .tables.manager import TablesManager
 
 logger = logging.getLogger(__name__)
@@ -16,6 +17,7 @@ async def start_engine():
 
 async def stop_engine(engine):
     await engine.stop()
+    equity_calculator.shutdown()
     #await DBI.pool_close()
 
 
@@ -2,14 +2,17 @@ import asyncio
 import time
 from decimal import Decimal, ROUND_HALF_DOWN
 from enum import IntEnum, unique
-from itertools import groupby, combinations
+from itertools import combinations
 from typing import List, Tuple
 
 from .bet import Bet
 from .board import Board, BoardType
+from .equity import BOARD_SIZE, equity_calculator
+from .evaluator import HandEvaluator, HandState, LowHandEvaluator, rank_showdown
 from .hands import Hand, HandType, LowHand, LowHandType
-from .multibank import get_banks
+from .multibank import get_banks, get_bank_winners
 from .player import User, Player, PlayerRole
+from ..cards import Deck
 from ..events import Command
 from ..game import Game
 from ...logging import getLogger
@@ -35,6 +38,9 @@ class PokerBase(Game):
     SLEEP_SHOWDOWN_CARDS = 1.5
     SLEEP_GAME_END = 1
 
+    EQUITY_ENABLED = True
+    EQUITY_TIME_BUDGET = 0.5
+
     def __init__(self, table, users: List[User],
                  *, blind_small: Decimal = Decimal("0.01"), blind_big: Decimal = Decimal("0.02"), bet_timeout=30,
                  ante: Decimal | None = None, bombpot_blind_multiplier: int | None = None, **kwargs) -> None:
@@ -171,7 +177,7 @@ class PokerBase(Game):
             }
             hand_info = {
                 "hand_type": player_hand.type[0].value,
-                "hand_cards": [c.code for c in player_hand.cards]
+                "hand_cards": list(player_hand.codes)
             }
             hand |= hand_info
             hands.append(hand)
@@ -382,22 +388,91 @@ class PokerBase(Game):
                 p.cards_open = True
                 await self.broadcast_PLAYER_CARDS(db, p)
                 self.log.info("player %s: open cards %s", p.user_id, p.cards)
+        await self.broadcast_equity(db)
+
+    def get_equity_options(self) -> dict:
+        return dict(hand_rank=tuple(self.GAME_HAND_RANK), deck36=(self.GAME_DECK == 36))
+
+    async def broadcast_equity(self, db):
+        # карты открыты, пока борд не закрыт показываем эквити игроков
+        if not self.EQUITY_ENABLED or all(len(board.cards) >= BOARD_SIZE for board in self.boards):
+            return
+        players = [p for p in self.players if p.in_the_game]
+        result = await equity_calculator.calc([p.cards for p in players], [board.cards for board in self.boards],
+                                              list(Deck(self.GAME_DECK)), time_budget=self.EQUITY_TIME_BUDGET,
+                                              **self.get_equity_options())
+        if not result:
+            return
+        equities = [
+            dict(user_id=p.user_id, equity=result["equity"][idx], win=result["win"][idx], tie=result["tie"][idx])
+            for idx, p in enumerate(players)
+        ]
+        self.log.info("equity: %s", equities)
+        await self.broadcast_GAME_EQUITY(db, equities, exact=result["exact"])
 
     def iter_player_hands_combinations(self, player_cards, game_cards):
         cards = player_cards + game_cards
         return combinations(cards, min(5, len(cards)))
 
-    def get_best_hand(self, player_cards, board: Board) -> Hand | None:
-        deck36 = (self.GAME_DECK == 36)
-        results = []
+    @property
+    def hand_evaluator(self) -> HandEvaluator:
+        return HandEvaluator.get(self.GAME_HAND_RANK, deck36=(self.GAME_DECK == 36))
+
+    def get_best_hand_combination(self, player_cards, board: Board) -> Tuple[int, tuple] | None:
+        if not player_cards and not board.cards:
+            return None
+        # состояние оценки хранится в борде и на каждой улице пополняется только новыми картами
+        key = tuple(player_cards)
+        state = board.hands_states.get(key)
+        if state is None:
+            state = board.hands_states[key] = HandState(player_cards)
+        state.update(board.cards)
+        evaluator = self.hand_evaluator
+        rank = evaluator.evaluate_state(state)
+        # карты комбинации для отображения руки выбираются по рангам результата
+        return rank, evaluator.get_cards(rank, tuple(player_cards) + tuple(board.cards))
+
+    @property
+    def low_hand_evaluator(self) -> LowHandEvaluator:
+        return LowHandEvaluator.get(self.GAME_LOW_HAND_RANK)
+
+    def get_best_low_hand_combination(self, player_cards, board: Board) -> Tuple[int, tuple] | None:
+        evaluate = self.low_hand_evaluator.evaluate
+        best = None
         for h in self.iter_player_hands_combinations(player_cards, board.cards):
-            hand = Hand(h, board, deck36=deck36)
-            hand.rank = self.get_hand_rank(hand)
-            results.append(hand)
-        if not results:
+            if (rank := evaluate(h)) and (best is None or rank > best[0]):
+                best = rank, h
+        return best
+
+    def get_players_ranks(self, players_cards, boards_cards, with_low=False) -> list[list[int]]:
+        """Ранги рук игроков по всем бордам без построения Hand (для вскрытия, эквити и разбора истории)"""
+        return rank_showdown(players_cards, boards_cards, hand_evaluator=self.hand_evaluator,
+                             low_hand_evaluator=self.low_hand_evaluator if with_low else None)
+
+    def get_showdown_ranks(self, players) -> dict[int, list[int]]:
+        """Ранги рук игроков на вскрытии: user_id -> ранги в порядке p.hands (hi и low по каждому борду)"""
+        # руки на ривере уже посчитаны (fill_player_hands), заново ранжируются только остальные
+        ranks = {}
+        missing = []
+        for p in players:
+            x = p.get_hands_ranks(self.boards)
+            if x is None:
+                missing.append(p)
+            else:
+                ranks[p.user_id] = x
+        if missing:
+            missing_ranks = self.get_players_ranks([p.cards for p in missing], [board.cards for board in self.boards])
+            ranks.update((p.user_id, x) for p, x in zip(missing, missing_ranks))
+        return ranks
+
+    def get_best_hand(self, player_cards, board: Board) -> Hand | None:
+        result = self.get_best_hand_combination(player_cards, board)
+        if not result:
             return None
-        results.sort(reverse=True, key=lambda x: x.rank)
-        return results[0]
+        rank, cards = result
+        hand = Hand(cards, board, deck36=(self.GAME_DECK == 36), hand_type=self.hand_evaluator.get_type(rank))
+        hand.rank = rank
+        return hand
 
     GAME_HAND_RANK = [
         HandType.HIGH_CARD,
@@ -777,12 +852,10 @@ class PokerBase(Game):
                 w_amount += bank_amount
             winners[p.user_id] = w_amount
         else:
-            rankKey = lambda x: x.hands[0].rank
+            ranks = self.get_showdown_ranks(players)
+            rankKey = lambda x: ranks[x.user_id][0]
             for amount, bank_players in self.banks:
-                bank_players.sort(key=rankKey)
-                bank_winners = []
-                for _, g in groupby(bank_players, key=rankKey):
-                    bank_winners = list(g)
+                bank_winners = get_bank_winners(bank_players, rankKey)
                 # TODO округление
                 w_amount = amount / len(bank_winners)
                 for p in bank_winners:
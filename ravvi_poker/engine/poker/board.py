@@ -12,6 +12,8 @@ class Board:
     def __init__(self, board_type: BoardType):
         self.board_type = board_type
         self.cards: list = []
+        # состояния оценки рук по картам игроков, пополняются картами борда по улицам
+        self.hands_states: dict = {}
 
     def append_card(self, card: int):
         self.cards.append(card)
@@ -1,6 +1,5 @@
-from itertools import groupby
-
 from ravvi_poker.engine.poker.board import BoardType
+from ravvi_poker.engine.poker.multibank import get_bank_winners
 
 
 class MixinMeta(type):
@@ -69,13 +68,11 @@ class DoubleBoardMixin:
                     w_amount += bank_amount
                 winners[num][p.user_id] = w_amount
         else:
+            ranks = self.get_showdown_ranks(players)
             for num in range(2):
-                rankKey = lambda x: x.hands[num].rank
+                rankKey = lambda x: ranks[x.user_id][num]
                 for amount, bank_players in banks[num]:
-                    bank_players.sort(key=rankKey)
-                    bank_winners = []
-                    for _, g in groupby(bank_players, key=rankKey):
-                        bank_winners = list(g)
+                    bank_winners = get_bank_winners(bank_players, rankKey)
                     # TODO округление
                     w_amount = round(amount / len(bank_winners), 2)
                     for p in bank_winners:
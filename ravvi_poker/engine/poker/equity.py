@@ -0,0 +1,189 @@
+import asyncio
+import multiprocessing
+import random
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import combinations
+from math import comb
+from zlib import crc32
+
+from .evaluator import HandEvaluator, LowHandEvaluator, rank_showdown
+from ...logging import getLogger
+
+logger = getLogger(__name__)
+
+# количество карт на полностью открытом борде
+BOARD_SIZE = 5
+# максимальное количество раскладов для точного перебора
+EXACT_LIMIT = 5000
+# максимальное количество раскладов Монте-Карло
+MC_ITERATIONS = 20000
+# время на один расчет (сек)
+TIME_BUDGET = 0.5
+
+
+def get_runouts_count(deck_size, missing) -> int:
+    count = 1
+    for cards_num in missing:
+        count *= comb(deck_size, cards_num)
+        deck_size -= cards_num
+    return count
+
+
+def iter_runouts(deck_cards, missing):
+    """Все варианты докладки карт на борды (карты бордов берутся из одной колоды)"""
+    if not missing:
+        yield ()
+        return
+    cards_num, missing = missing[0], missing[1:]
+    for cards in combinations(deck_cards, cards_num):
+        rest = [c for c in deck_cards if c not in cards]
+        for tail in iter_runouts(rest, missing):
+            yield cards, *tail
+
+
+def get_shares(ranks, boards_num, with_low) -> list[float]:
+    """Доли банка игроков в одном раскладе: банк делится поровну между бордами, в hi-low - между hi и low"""
+    shares = [0.0] * len(ranks)
+    step = 2 if with_low else 1
+    for board_idx in range(boards_num):
+        slots = [board_idx * step]
+        # если low руки нет ни у кого, то hi забирает всю часть борда
+        if with_low and any(r[board_idx * step + 1] for r in ranks):
+            slots.append(board_idx * step + 1)
+        slot_share = 1 / boards_num / len(slots)
+        for slot in slots:
+            best = max(r[slot] for r in ranks)
+            winners = [idx for idx, r in enumerate(ranks) if r[slot] == best]
+            for idx in winners:
+                shares[idx] += slot_share / len(winners)
+    return shares
+
+
+def calc_equity(players_cards, boards_cards, deck_cards, *, hand_rank, deck36=False, low_hand_rank=None,
+                omaha=False, seed=0, time_budget=TIME_BUDGET, exact_limit=EXACT_LIMIT,
+                iterations=MC_ITERATIONS) -> dict:
+    """
+    Эквити игроков при открытых картах.
+    Если вариантов докладки бордов не больше exact_limit - точный перебор, иначе Монте-Карло с seed.
+    equity - средняя доля банка, win - доля раскладов, где игрок забирает весь банк,
+    tie - доля раскладов, где игрок получает часть банка.
+    Выполняется в отдельном процессе, поэтому все аргументы - простые типы.
+    """
+    deadline = time.monotonic() + time_budget
+    hand_evaluator = HandEvaluator.get(hand_rank, deck36=deck36)
+    low_hand_evaluator = LowHandEvaluator.get(low_hand_rank) if low_hand_rank else None
+    with_low = low_hand_evaluator is not None
+
+    known = set().union(*players_cards, *boards_cards)
+    deck_cards = [c for c in deck_cards if c not in known]
+    missing = [BOARD_SIZE - len(board_cards) for board_cards in boards_cards]
+
+    players_num = len(players_cards)
+    equity = [0.0] * players_num
+    win = [0] * players_num
+    tie = [0] * players_num
+
+    def add_runout(runout):
+        boards = [list(board_cards) + list(cards) for board_cards, cards in zip(boards_cards, runout)]
+        ranks = rank_showdown(players_cards, boards, hand_evaluator=hand_evaluator,
+                              low_hand_evaluator=low_hand_evaluator, omaha=omaha)
+        for idx, share in enumerate(get_shares(ranks, len(boards), with_low)):
+            equity[idx] += share
+            if share > 1 - 1e-9:
+                win[idx] += 1
+            elif share:
+                tie[idx] += 1
+
+    runouts = 0
+    exact = get_runouts_count(len(deck_cards), missing) <= exact_limit
+    if exact:
+        for runout in iter_runouts(deck_cards, missing):
+            add_runout(runout)
+            runouts += 1
+    else:
+        rng = random.Random(seed)
+        cards_num = sum(missing)
+        while runouts < iterations:
+            cards = rng.sample(deck_cards, cards_num)
+            runout, offset = [], 0
+            for board_missing in missing:
+                runout.append(cards[offset:offset + board_missing])
+                offset += board_missing
+            add_runout(runout)
+            runouts += 1
+            if runouts % 100 == 0 and time.monotonic() > deadline:
+                break
+
+    return dict(
+        equity=[round(x / runouts, 4) for x in equity],
+        win=[round(x / runouts, 4) for x in win],
+        tie=[round(x / runouts, 4) for x in tie],
+        runouts=runouts,
+        exact=exact,
+    )
+
+
+class EquityCalculator:
+    """Сервис расчета эквити: расчеты в пуле процессов, результаты кешируются по картам игроков и бордов"""
+
+    MAX_WORKERS = 2
+    CACHE_SIZE = 1024
+
+    def __init__(self, max_workers=None, cache_size=None) -> None:
+        self.log = logger
+        self.max_workers = max_workers or self.MAX_WORKERS
+        self.cache_size = cache_size or self.CACHE_SIZE
+        self.cache = OrderedDict()
+        self.executor = None
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            # spawn: дочерние процессы не наследуют состояние цикла событий и соединений с БД
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+        return self.executor
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    @staticmethod
+    def get_key(players_cards, boards_cards, **options):
+        return (
+            tuple(tuple(sorted(player_cards)) for player_cards in players_cards),
+            tuple(tuple(sorted(board_cards)) for board_cards in boards_cards),
+            tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in options.items())),
+        )
+
+    async def calc(self, players_cards, boards_cards, deck_cards, *, time_budget=TIME_BUDGET, **options) -> dict | None:
+        """Расчет с ограничением по времени, None если результат не получен вовремя"""
+        key = self.get_key(players_cards, boards_cards, **options)
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+            return result
+        loop = asyncio.get_running_loop()
+        # seed из ключа: одинаковые карты дают одинаковый результат
+        task = partial(calc_equity, players_cards, boards_cards, deck_cards,
+                       seed=crc32(repr(key).encode()), time_budget=time_budget, **options)
+        future = loop.run_in_executor(self.get_executor(), task)
+        try:
+            # запас на передачу данных и запуск процесса
+            result = await asyncio.wait_for(future, time_budget + 1)
+        except asyncio.TimeoutError:
+            self.log.warning("equity: timeout")
+            return None
+        except Exception as ex:
+            self.log.exception("equity: %s", ex)
+            return None
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+
+equity_calculator = EquityCalculator()
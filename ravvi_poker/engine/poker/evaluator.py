@@ -0,0 +1,389 @@
+from functools import lru_cache
+from itertools import combinations, combinations_with_replacement
+
+from .hands import HandType
+from ..cards import CARD_RANK
+
+# карты кодируются 1..52: (suit_idx * 13 + rank_idx + 1), rank_idx 0..12 -> ранги 2..14
+CARD_SUIT = [0] + [code // 13 for code in range(52)]
+CARD_BIT = [0] + [1 << (code % 13) for code in range(52)]
+
+# ранги по маске (13 бит) в порядке убывания
+MASK_RANKS = [tuple(r + 2 for r in range(12, -1, -1) if mask >> r & 1) for mask in range(1 << 13)]
+MASK_SIZE = [len(ranks) for ranks in MASK_RANKS]
+
+
+def _straight_table(straight_masks, straight_idx0):
+    table = [0] * (1 << 13)
+    for mask in range(1 << 13):
+        for i, straight_mask in enumerate(straight_masks, straight_idx0):
+            if mask & straight_mask == straight_mask:
+                table[mask] = i
+    return table
+
+
+STRAIGHT_52 = _straight_table([0b1000000001111] + [0b11111 << i for i in range(9)], 5)
+STRAIGHT_36 = _straight_table([0b1000011110000] + [0b11111 << i for i in range(4, 9)], 9)
+
+KICKERS_BITS = 20
+
+# ключ рангов: по 4 бита на ранг, ключ набора карт - сумма ключей карт
+CARD_KEY = [0] + [1 << 4 * (code % 13) for code in range(52)]
+
+
+def get_cards_state(cards):
+    """Состояние набора карт для сборки руки из частей: (ключ рангов, масть или -1, маска рангов)"""
+    key, mask = 0, 0
+    suit = CARD_SUIT[cards[0]]
+    for code in cards:
+        key += CARD_KEY[code]
+        mask |= CARD_BIT[code]
+        if CARD_SUIT[code] != suit:
+            suit = -1
+    return key, suit, mask
+
+
+# low: бит 0 - туз, биты 1..7 - ранги 2..8, у старших карт бита нет
+LOW_BIT = [0] + [1 << (code % 13 + 1) if code % 13 <= 6 else (1 if code % 13 == 12 else 0) for code in range(52)]
+
+
+def get_low_mask(cards):
+    """Маска low рангов набора карт или 0, если есть старшая карта или повтор ранга"""
+    mask = 0
+    for code in cards:
+        bit = LOW_BIT[code]
+        if not bit or mask & bit:
+            return 0
+        mask |= bit
+    return mask
+
+
+@lru_cache(maxsize=4096)
+def get_omaha_pairs(player_cards: tuple):
+    return [(cards, *get_cards_state(cards)) for cards in combinations(player_cards, 2)]
+
+
+@lru_cache(maxsize=1024)
+def get_omaha_triples(board_cards: tuple):
+    return [(cards, *get_cards_state(cards)) for cards in combinations(board_cards, 3)]
+
+
+@lru_cache(maxsize=1024)
+def get_omaha_low_triples(board_cards: tuple):
+    return [(cards, mask) for cards in combinations(board_cards, 3) if (mask := get_low_mask(cards))]
+
+
+class HandState:
+    """Маски рангов и мастей карт игрока и борда, пополняются по мере открытия карт борда"""
+
+    __slots__ = ("cards_num", "board_num", "m1", "m2", "m3", "m4", "suits")
+
+    def __init__(self, player_cards) -> None:
+        self.cards_num = 0
+        self.board_num = 0
+        self.m1 = self.m2 = self.m3 = self.m4 = 0
+        self.suits = [0, 0, 0, 0]
+        self.add(player_cards)
+
+    def add(self, cards):
+        for code in cards:
+            bit = CARD_BIT[code]
+            self.suits[CARD_SUIT[code]] |= bit
+            if not self.m1 & bit:
+                self.m1 |= bit
+            elif not self.m2 & bit:
+                self.m2 |= bit
+            elif not self.m3 & bit:
+                self.m3 |= bit
+            else:
+                self.m4 |= bit
+        self.cards_num += len(cards)
+
+    def copy(self) -> "HandState":
+        state = HandState(())
+        state.cards_num, state.board_num = self.cards_num, self.board_num
+        state.m1, state.m2, state.m3, state.m4 = self.m1, self.m2, self.m3, self.m4
+        state.suits = list(self.suits)
+        return state
+
+    def update(self, board_cards):
+        # добавляем только новые карты борда
+        if len(board_cards) > self.board_num:
+            self.add(board_cards[self.board_num:])
+            self.board_num = len(board_cards)
+
+
+class HandEvaluator:
+    """
+    Оценка руки по целочисленным кодам карт без создания объектов Hand.
+
+    Результат - одно целое число: индекс типа руки в порядке `hand_rank` (GAME_HAND_RANK игры)
+    и до пяти рангов карт по 4 бита. Сравнение чисел совпадает со сравнением кортежей
+    PokerBase.get_hand_rank() для лучшей комбинации из 5 карт.
+    """
+
+    _instances = {}
+
+    @classmethod
+    def get(cls, hand_rank, *, deck36=False) -> "HandEvaluator":
+        key = (tuple(hand_rank), deck36)
+        evaluator = cls._instances.get(key)
+        if evaluator is None:
+            evaluator = cls._instances[key] = cls(hand_rank, deck36=deck36)
+        return evaluator
+
+    def __init__(self, hand_rank, *, deck36=False) -> None:
+        self.hand_rank = list(hand_rank)
+        self.deck36 = deck36
+        self.straights = STRAIGHT_36 if deck36 else STRAIGHT_52
+        # проверяем типы рук от старшего к младшему
+        self.checks = [(hand_type, idx << KICKERS_BITS) for idx, hand_type in enumerate(self.hand_rank)]
+        self.checks.reverse()
+        self._ranks5 = None
+        self._flush5 = None
+
+    @staticmethod
+    def pack(ranks) -> int:
+        value, shift = 0, KICKERS_BITS
+        for r in ranks:
+            shift -= 4
+            value |= r << shift
+        return value
+
+    def evaluate(self, cards) -> int:
+        # маски рангов: m1 - есть хотя бы одна карта ранга, m2 - пара, m3 - тройка, m4 - каре
+        m1 = m2 = m3 = m4 = 0
+        suits = [0, 0, 0, 0]
+        for code in cards:
+            bit = CARD_BIT[code]
+            suits[CARD_SUIT[code]] |= bit
+            if not m1 & bit:
+                m1 |= bit
+            elif not m2 & bit:
+                m2 |= bit
+            elif not m3 & bit:
+                m3 |= bit
+            else:
+                m4 |= bit
+        return self.evaluate_masks(min(5, len(cards)), m1, m2, m3, m4, suits)
+
+    def evaluate_state(self, state: HandState) -> int:
+        return self.evaluate_masks(min(5, state.cards_num), state.m1, state.m2, state.m3, state.m4, state.suits)
+
+    def evaluate_masks(self, size, m1, m2, m3, m4, suits) -> int:
+        flush = 0
+        if size == 5:
+            for suit_mask in suits:
+                if MASK_SIZE[suit_mask] >= 5:
+                    flush = suit_mask
+                    break
+        for hand_type, value in self.checks:
+            ranks = self.match(hand_type, size, m1, m2, m3, m4, flush)
+            if ranks is not None:
+                return value | self.pack(ranks)
+        return 0
+
+    def match(self, hand_type, size, m1, m2, m3, m4, flush):
+        if hand_type is HandType.HIGH_CARD:
+            return MASK_RANKS[m1][:size]
+        if hand_type is HandType.ONE_PAIR:
+            if m2:
+                pair = MASK_RANKS[m2][0]
+                return (pair, *MASK_RANKS[m1 & ~(1 << pair - 2)][:size - 2])
+        elif hand_type is HandType.TWO_PAIRS:
+            if MASK_SIZE[m2] >= 2:
+                r1, r2 = MASK_RANKS[m2][:2]
+                return (r1, r2, *MASK_RANKS[m1 & ~(1 << r1 - 2 | 1 << r2 - 2)][:size - 4])
+        elif hand_type is HandType.THREE_OF_KIND:
+            if m3:
+                r = MASK_RANKS[m3][0]
+                return (r, *MASK_RANKS[m1 & ~(1 << r - 2)][:size - 3])
+        elif hand_type is HandType.STRAIGHT:
+            if size == 5 and (top := self.straights[m1]):
+                return (top,)
+        elif hand_type is HandType.FLUSH:
+            if flush:
+                return MASK_RANKS[flush][:5]
+        elif hand_type is HandType.FULL_HOUSE:
+            if size == 5 and m3:
+                r1 = MASK_RANKS[m3][0]
+                if pairs := m2 & ~(1 << r1 - 2):
+                    return r1, MASK_RANKS[pairs][0]
+        elif hand_type is HandType.FOUR_OF_KIND:
+            if m4:
+                r = MASK_RANKS[m4][0]
+                return (r, *MASK_RANKS[m1 & ~(1 << r - 2)][:size - 4])
+        elif hand_type is HandType.STRAIGHT_FLUSH:
+            if flush and (top := self.straights[flush]):
+                return (top,)
+        return None
+
+    def get_type(self, value):
+        """Раскладывает результат evaluate() в формат Hand.type: (HandType, *ranks)"""
+        hand_type = self.hand_rank[value >> KICKERS_BITS]
+        ranks = []
+        for shift in range(KICKERS_BITS - 4, -4, -4):
+            r = value >> shift & 0xF
+            if not r:
+                break
+            ranks.append(r)
+        return hand_type, *ranks
+
+    # количество карт старших рангов комбинации (остальные ранги - по одной карте)
+    RANKS_COUNTS = {
+        HandType.ONE_PAIR: (2,),
+        HandType.TWO_PAIRS: (2, 2),
+        HandType.THREE_OF_KIND: (3,),
+        HandType.FULL_HOUSE: (3, 2),
+        HandType.FOUR_OF_KIND: (4,),
+    }
+
+    def get_cards(self, value, cards) -> tuple:
+        """
+        Карты комбинации для результата evaluate() по рангам и масти, без перебора комбинаций из 5 карт.
+        Из карт одного ранга берутся первые в порядке cards, как в первой подходящей combinations(cards, 5).
+        """
+        hand_type, *ranks = self.get_type(value)
+        suit = None
+        if hand_type in (HandType.STRAIGHT, HandType.STRAIGHT_FLUSH):
+            top = ranks[0]
+            ranks = [top - i for i in range(5)]
+            if top == (9 if self.deck36 else 5):
+                # младший стрит с тузом
+                ranks[4] = 14
+        if hand_type in (HandType.FLUSH, HandType.STRAIGHT_FLUSH):
+            mask = sum(1 << r - 2 for r in ranks)
+            suits = [0, 0, 0, 0]
+            for code in cards:
+                suits[CARD_SUIT[code]] |= CARD_BIT[code]
+            suit = next(i for i, suit_mask in enumerate(suits) if suit_mask & mask == mask)
+        counts = self.RANKS_COUNTS.get(hand_type, ())
+        need = {r: counts[i] if i < len(counts) else 1 for i, r in enumerate(ranks)}
+        result = []
+        for code in cards:
+            r = CARD_RANK[code]
+            if need.get(r) and (suit is None or CARD_SUIT[code] == suit):
+                need[r] -= 1
+                result.append(code)
+        return tuple(result)
+
+    def get_tables5(self):
+        """Таблицы рук из 5 карт: по ключу рангов (без флеша) и по маске рангов одной масти"""
+        if self._ranks5 is None:
+            ranks5 = {}
+            for ranks in combinations_with_replacement(range(13), 5):
+                if any(ranks.count(r) > 4 for r in ranks):
+                    continue
+                # масти чередуются, поэтому флеш не собирается
+                cards = [(i % 4) * 13 + r + 1 for i, r in enumerate(ranks)]
+                ranks5[sum(CARD_KEY[c] for c in cards)] = self.evaluate(cards)
+            flush5 = [0] * (1 << 13)
+            for ranks in combinations(range(13), 5):
+                flush5[sum(1 << r for r in ranks)] = self.evaluate([r + 1 for r in ranks])
+            self._ranks5, self._flush5 = ranks5, flush5
+        return self._ranks5, self._flush5
+
+    def evaluate_omaha(self, player_cards, board_cards):
+        """
+        Лучшая рука из 2 карт игрока и 3 карт борда: (результат, карты комбинации).
+        Тройки карт борда считаются один раз на улицу для всех игроков, пары карт игрока - один раз на раздачу.
+        """
+        pairs = get_omaha_pairs(tuple(player_cards))
+        if not board_cards:
+            return max(((self.evaluate(cards), cards) for cards, *_ in pairs), key=lambda x: x[0], default=None)
+        triples = get_omaha_triples(tuple(board_cards))
+        ranks5, flush5 = self.get_tables5()
+        best, best_cards = -1, None
+        for pc, p_key, p_suit, p_mask in pairs:
+            for gc, g_key, g_suit, g_mask in triples:
+                if p_suit >= 0 and p_suit == g_suit:
+                    rank = flush5[p_mask | g_mask]
+                else:
+                    rank = ranks5[p_key + g_key]
+                if rank > best:
+                    best, best_cards = rank, (pc, gc)
+        if best_cards is None:
+            return None
+        return best, best_cards[0] + best_cards[1]
+
+
+class LowHandEvaluator:
+    """
+    Оценка low руки (8 or better) по маске рангов A,2..8.
+    Результат - целое число len(low_hand_rank) - индекс типа в `low_hand_rank` (чем больше, тем сильнее) или 0.
+    """
+
+    _instances = {}
+
+    @classmethod
+    def get(cls, low_hand_rank) -> "LowHandEvaluator":
+        key = tuple(low_hand_rank)
+        evaluator = cls._instances.get(key)
+        if evaluator is None:
+            evaluator = cls._instances[key] = cls(low_hand_rank)
+        return evaluator
+
+    def __init__(self, low_hand_rank) -> None:
+        self.low_hand_rank = list(low_hand_rank)
+        self.ranks = [0] * (1 << 8)
+        for idx, low_hand_type in enumerate(self.low_hand_rank):
+            mask = 0
+            for r in low_hand_type.value:
+                mask |= 1 if r == "A" else 1 << (int(r) - 1)
+            self.ranks[mask] = len(self.low_hand_rank) - idx
+
+    def evaluate(self, cards) -> int:
+        if len(cards) != 5:
+            return 0
+        return self.ranks[get_low_mask(cards)]
+
+    def evaluate_omaha(self, player_cards, board_cards):
+        """Лучшая low рука из 2 карт игрока и 3 карт борда: (результат, карты комбинации) или None"""
+        if len(board_cards) < 3:
+            return None
+        # борд без трех разных low карт не дает low ни одному игроку
+        triples = get_omaha_low_triples(tuple(board_cards))
+        if not triples:
+            return None
+        best, best_cards = 0, None
+        for pc in combinations(player_cards, 2):
+            if not (p_mask := get_low_mask(pc)):
+                continue
+            for gc, g_mask in triples:
+                if p_mask & g_mask:
+                    continue
+                rank = self.ranks[p_mask | g_mask]
+                if rank > best:
+                    best, best_cards = rank, pc + gc
+        if best_cards is None:
+            return None
+        return best, best_cards
+
+
+def rank_showdown(players_cards, boards_cards, *, hand_evaluator: HandEvaluator,
+                  low_hand_evaluator: LowHandEvaluator | None = None, omaha=False) -> list[list[int]]:
+    """
+    Ранги рук всех игроков по всем бордам за один проход.
+    Для каждого игрока список рангов по бордам, с low_hand_evaluator после каждого hi ранга идет low ранг (0 - нет руки).
+    Работа по борду (маски, тройки карт) выполняется один раз для всех игроков.
+    """
+    results = [[] for _ in players_cards]
+    for board_cards in boards_cards:
+        board_state = HandState(board_cards)
+        for ranks, player_cards in zip(results, players_cards):
+            if omaha:
+                result = hand_evaluator.evaluate_omaha(player_cards, board_cards)
+                ranks.append(result[0] if result else 0)
+            else:
+                state = board_state.copy()
+                state.add(player_cards)
+                ranks.append(hand_evaluator.evaluate_state(state))
+            if low_hand_evaluator is None:
+                continue
+            if omaha:
+                result = low_hand_evaluator.evaluate_omaha(player_cards, board_cards)
+                ranks.append(result[0] if result else 0)
+            else:
+                cards = list(player_cards) + list(board_cards)
+                ranks.append(max((low_hand_evaluator.evaluate(h) for h in combinations(cards, 5)), default=0))
+    return results
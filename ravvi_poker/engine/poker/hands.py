@@ -1,7 +1,7 @@
 from enum import Enum, unique
 
 from .board import Board
-from ..cards import Card
+from ..cards import CARD_ORDER, CARD_RANK, CARDS, Card, get_cards_mask
 
 
 @unique
@@ -186,13 +186,13 @@ low_hands_hashes = {
 
 
 class Hand:
-    def __init__(self, cards, board: Board, deck36=False) -> None:
-        self.cards = [x if isinstance(x, Card) else Card(x) for x in cards]
-        self.cards.sort(key=lambda x: (-x.rank, x.suit))
-        self.mask = 0
-        for c in self.cards:
-            self.mask |= c.mask
-        self.type = self.get_type(deck36) if self.cards else None
+    def __init__(self, cards, board: Board, deck36=False, hand_type=None) -> None:
+        # коды карт и маска руки, Card только для отображения
+        self.codes = sorted((x if isinstance(x, int) else Card(x).code for x in cards), key=CARD_ORDER.__getitem__)
+        self.cards = [CARDS[code] for code in self.codes]
+        self.mask = get_cards_mask(self.codes)
+        # тип руки может быть уже известен из HandEvaluator
+        self.type = hand_type or (self.get_type(deck36) if self.cards else None)
         self.rank = None
         self.value = 0
         self.board = board
@@ -274,7 +274,7 @@ class Hand:
             counter = bin(match)[2:].count("1")
             if counter > 1:
                 result.append((counter, rank_idx + 2))
-        other_ranks = [c.rank for c in self.cards]
+        other_ranks = [CARD_RANK[code] for code in self.codes]
         for _, rank in result:
             other_ranks = [r for r in other_ranks if r != rank]
         other_ranks.sort(reverse=True)
@@ -301,7 +301,7 @@ class LowHand(Hand):
 
     def get_type(self, deck36=False):
         # проверяем есть ли вообще смысл считать low_type
-        if not len(card_ranks := [card_rank for card_rank in set([card.rank for card in self.cards])
+        if not len(card_ranks := [card_rank for card_rank in set([CARD_RANK[code] for code in self.codes])
                                   if card_rank <= 8 or card_rank == 14]) == 5:
             return None
 
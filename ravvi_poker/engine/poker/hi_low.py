@@ -1,6 +1,5 @@
-from itertools import groupby
-
 from ravvi_poker.engine.poker.hands import Hand, LowHand
+from ravvi_poker.engine.poker.multibank import get_bank_winners
 
 
 class HiLowMixin:
@@ -14,16 +13,19 @@ class HiLowMixin:
         return super().get_best_hand(player_cards, board)
 
     def get_best_hand_low(self, player_cards, board) -> LowHand | None:
-        results = []
-        for h in self.iter_player_hands_combinations(player_cards, board.cards):
-            hand = LowHand(h, board)
-            hand.rank = self.get_hand_rank(hand)
-            results.append(hand)
-        if not results or len(results := [r for r in results if r.rank is not None]) == 0:
+        result = self.get_best_low_hand_combination(player_cards, board)
+        if not result:
             return None
+        rank, cards = result
+        hand = LowHand(cards, board)
+        hand.rank = rank
+        return hand
+
+    def get_players_ranks(self, players_cards, boards_cards, with_low=True):
+        return super().get_players_ranks(players_cards, boards_cards, with_low=with_low)
 
-        results.sort(reverse=True, key=lambda x: x.rank)
-        return results[0]
+    def get_equity_options(self) -> dict:
+        return super().get_equity_options() | dict(low_hand_rank=tuple(self.GAME_LOW_HAND_RANK))
 
     async def prepare_hands(self, player) -> list[dict]:
         hands = []
@@ -39,7 +41,7 @@ class HiLowMixin:
                     }
                 hand_info = {
                     "hand_type": player_hand.type[0].value,
-                    "hand_cards": [c.code for c in player_hand.cards]
+                    "hand_cards": list(player_hand.codes)
                 }
                 hand |= hand_info
             else:
@@ -69,8 +71,10 @@ class HiLowMixin:
                         w_amount += bank_amount
                     winners[num][p.user_id] = w_amount
             else:
-                self.handle_high_winners(banks, winners)
-                self.handle_low_winners(banks, winners)
+                # ранги вскрытия считаются один раз для hi и low
+                ranks = self.get_showdown_ranks(players)
+                self.handle_high_winners(banks, winners, ranks)
+                self.handle_low_winners(banks, winners, ranks)
 
                 winners_info = [[], []]
                 for num in range(2):
@@ -113,26 +117,21 @@ class HiLowMixin:
             )
         return banks
 
-    def handle_high_winners(self, banks, winners):
-        rankKey = lambda x: x.hand[0].rank
+    def handle_high_winners(self, banks, winners, ranks):
+        rankKey = lambda x: ranks[x.user_id][0]
         for amount, bank_players in banks[0]:
-            bank_players.sort(key=rankKey)
-            bank_winners = []
-            for _, g in groupby(bank_players, key=rankKey):
-                bank_winners = list(g)
+            bank_winners = get_bank_winners(bank_players, rankKey)
             # TODO округление
             w_amount = round(amount / len(bank_winners), 2)
             for p in bank_winners:
                 amount = winners[0].get(p.user_id, 0)
                 winners[0][p.user_id] = amount + w_amount
 
-    def handle_low_winners(self, banks, winners):
-        rankKey = lambda x: x.hand[1].rank if x.hand[1] else (0,)
+    def handle_low_winners(self, banks, winners, ranks):
+        # 0 - нет low руки
+        rankKey = lambda x: ranks[x.user_id][1]
         for amount, bank_players in banks[1]:
-            bank_players.sort(key=rankKey)
-            bank_winners = []
-            for _, g in groupby(bank_players, key=rankKey):
-                bank_winners = list(g)
+            bank_winners = get_bank_winners(bank_players, rankKey)
             # TODO округление
             w_amount = round(amount / len(bank_winners), 2)
             for p in bank_winners:
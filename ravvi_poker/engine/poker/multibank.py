@@ -56,3 +56,14 @@ def get_banks(players: List[Player]):
     total = Decimal(sum([b[0] for b in banks])).quantize(Decimal("0.01"))
     logger.debug(f"Total: {total}")
     return banks, total
+
+
+def get_bank_winners(bank_players: List[Player], rank_key) -> List[Player]:
+    best, winners = None, []
+    for p in bank_players:
+        rank = rank_key(p)
+        if best is None or rank > best:
+            best, winners = rank, [p]
+        elif rank == best:
+            winners.append(p)
+    return winners
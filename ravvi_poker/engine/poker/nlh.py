@@ -7,7 +7,7 @@ from ravvi_poker.engine.poker.double_board import DoubleBoardMixin
 from ravvi_poker.engine.poker.bomb_pot import BombPotMixin
 
 from .double_board import MixinMeta
-from .hands import HandType, Hand
+from .hands import HandType
 from .base import PokerBase, Bet, Round
 from ..events import Command
 from ..user import User
@@ -101,19 +101,15 @@ class Poker_NLH_3M1(Poker_NLH_X):
                 await self.broadcast_PLAYER_CARDS(db, player)
 
     async def offer_card_for_drop(self, player) -> tuple[int, int]:
-        hands_combinations = []
+        best = None
         for board in self.boards:
             for combination in combinations(player.cards, 2):
-                if board.cards:
-                    combination = combination + tuple(board.cards)
-                hand = Hand(combination, board)
-                hand.rank = self.get_hand_rank(hand)
-                hands_combinations.append(hand)
-
-        hands_combinations.sort(reverse=True, key=lambda x: x.rank)
+                rank = self.hand_evaluator.evaluate(combination + tuple(board.cards))
+                if best is None or rank > best[0]:
+                    best = rank, combination
         card_code_for_drop, card_index_for_drop = None, None
         for num, card in enumerate(player.cards):
-            if card not in [hand_card.code for hand_card in hands_combinations[0].cards]:
+            if card not in best[1]:
                 card_code_for_drop = card
                 card_index_for_drop = num
 
@@ -26,6 +26,8 @@ class Player(PlayerBase):
         super().__init__(user)
         self.role = Player.ROLE_DEFAULT
         self.hands: list[Hand, LowHand] | None = None
+        # карты игрока и количество карт бордов, для которых посчитаны hands
+        self.hands_key: tuple | None = None
         self.active = True
         self.bet_type = None
         self.bet_amount: Decimal = Decimal("0.00")
@@ -45,7 +47,19 @@ class Player(PlayerBase):
     def has_bet_opions(self) -> bool:
         return self.in_the_game and self.bet_type != Bet.ALLIN
 
+    def get_hands_ranks(self, boards: list[Board]) -> list[int] | None:
+        """Ранги уже посчитанных рук (в порядке hands, 0 - нет руки), None - руки посчитаны не для этих карт"""
+        hands_key = (tuple(self.cards), tuple(len(board.cards) for board in boards))
+        if self.hands is None or self.hands_key != hands_key:
+            return None
+        return [hand.rank if hand else 0 for hand in self.hands]
+
     def fill_player_hands(self, func_fill: Callable, boards: list[Board]) -> None:
+        # если карты не изменились (например, на вскрытии после ривера), то используем уже посчитанные руки
+        hands_key = (tuple(self.cards), tuple(len(board.cards) for board in boards))
+        if self.hands is not None and self.hands_key == hands_key:
+            return
+        self.hands_key = hands_key
         self.hands = []
         for board in boards:
             if isinstance(result := func_fill(self.cards, board), list):
@@ -4,6 +4,7 @@ from ravvi_poker.engine.poker.bomb_pot import BombPotMixin
 from ravvi_poker.engine.poker.double_board import MixinMeta, DoubleBoardMixin
 from ravvi_poker.engine.poker.hi_low import HiLowMixin
 from .base import PokerBase
+from .evaluator import rank_showdown
 
 
 class Poker_PLO_X(PokerBase, metaclass=MixinMeta):
@@ -32,6 +33,20 @@ class Poker_PLO_X(PokerBase, metaclass=MixinMeta):
                 for gc in combinations(game_cards, 3):
                     yield pc + gc
 
+    def get_best_hand_combination(self, player_cards, board):
+        # в омахе используются ровно 2 карты игрока и 3 карты борда
+        return self.hand_evaluator.evaluate_omaha(player_cards, board.cards)
+
+    def get_best_low_hand_combination(self, player_cards, board):
+        return self.low_hand_evaluator.evaluate_omaha(player_cards, board.cards)
+
+    def get_equity_options(self) -> dict:
+        return super().get_equity_options() | dict(omaha=True)
+
+    def get_players_ranks(self, players_cards, boards_cards, with_low=False):
+        return rank_showdown(players_cards, boards_cards, hand_evaluator=self.hand_evaluator,
+                             low_hand_evaluator=self.low_hand_evaluator if with_low else None, omaha=True)
+
 
 class Poker_PLO_4(Poker_PLO_X):
     GAME_SUBTYPE = "PLO4"
@@ -1,6 +1,6 @@
 from decimal import Decimal
 
-from ravvi_poker.engine.cards import Card
+from ravvi_poker.engine.cards import CARD_RANK, CARD_SUIT
 from ravvi_poker.engine.poker.bet import Bet
 from ravvi_poker.engine.poker.player import Player
 
@@ -36,10 +36,9 @@ class SevenDeuceController:
         winners_seven_deuce_user_id = []
 
         for player in [p for p in players if p.user_id in [w["user_id"] for w in winners_board["winners"]]]:
-            player_cards = [Card(code=card) for card in player.cards]
             # если есть 7, 2 и они разномастные, то собираем в банк с других игроков деньги в банк seven deuce
-            if 7 in (cards_ranks := [card.rank for card in player_cards]) and 2 in cards_ranks and \
-                    player_cards[0].suit != player_cards[1].suit:
+            if 7 in (cards_ranks := [CARD_RANK[card] for card in player.cards]) and 2 in cards_ranks and \
+                    CARD_SUIT[player.cards[0]] != CARD_SUIT[player.cards[1]]:
                 winners_seven_deuce_user_id.append(player.user_id)
 
                 for player_for_collect_sd in [p for p in players if p.user.id != player.user_id]:
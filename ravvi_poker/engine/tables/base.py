@@ -4,7 +4,9 @@ from decimal import Decimal
 from typing import List, Mapping
 
 from .configs import configCls
+from .journal import TableJournal
 from .status import TableStatus
+from ..bus import local_bus
 from ..events import Command, Message
 from ..game import GameConditionType, Game
 from ..user import User
@@ -45,6 +47,8 @@ class Table:
         self.table_name = table_name
         self.parent_id = parent_id
         self.log = ObjectLoggerAdapter(logger, lambda: self.table_id)
+        # отложенная запись сообщений игры
+        self.journal = TableJournal(self)
         self.users: Mapping[int, User] = {}
         self.seats: List[User] = [None] * table_seats
         self.dealer_idx = -1
@@ -152,7 +156,35 @@ class Table:
     async def emit_msg(self, db: DBI, msg: Message):
         msg.update(table_id=self.table_id)
         self.log.debug("emit_msg: %s", msg)
-        await db.create_table_msg(**msg)
+        if local_bus.get_table(self.table_id) is self:
+            # клиенты в этом же процессе, после фиксации транзакции
+            await local_bus.emit_msg(msg, db)
+            return
+        if self.journal.busy:
+            # журнал записывает пакет: сообщение встает за ним, порядок сохраняется
+            self.journal.add(msg)
+            return
+        # сообщения игры, отправленные раньше, записываются первыми в этой же транзакции
+        self.take_journal(db)
+        # запись одним пакетом при фиксации транзакции шага
+        db.add_table_msg(**msg)
+
+    async def emit_game_msg(self, msg: Message, db: DBI | None = None):
+        """Сообщение игры: запись в table_msg выполняется в фоне (журнал стола)"""
+        msg.update(table_id=self.table_id)
+        self.log.debug("emit_game_msg: %s", msg)
+        if local_bus.get_table(self.table_id) is self:
+            await local_bus.emit_msg(msg, db, transactional=False)
+            return
+        self.journal.add(msg)
+        if db is not None and len(self.journal.pending) >= self.journal.PENDING_LIMIT and not self.journal.busy:
+            # фоновая запись отстает: накопленное записывается в транзакции игры
+            self.take_journal(db)
+
+    def take_journal(self, db: DBI):
+        # второе соединение из пула не запрашивается: столы, держащие соединение, не ждут друг друга
+        for kwargs in self.journal.take(db):
+            db.add_table_msg(**kwargs)
 
     async def emit_TABLE_INFO(self, db, *, cmd_id, client_id, table_info):
         msg = Message(msg_type=Message.Type.TABLE_INFO, cmd_id=cmd_id, client_id=client_id, **table_info)
@@ -255,6 +287,8 @@ class Table:
                                                    buyin_cost=buyin_cost)
             elif cmd_type == Command.Type.EXIT:
                 await self.handle_cmd_exit(db, user_id=user_id)
+            elif cmd_type == Command.Type.INFO:
+                await self.handle_cmd_info(db, cmd_id=cmd_id, client_id=client_id, user_id=user_id)
             elif self.game:
                 await self.game.handle_cmd(db, client_id=client_id, user_id=user_id, cmd_type=cmd_type, props=props)
             else:
@@ -296,6 +330,15 @@ class Table:
         await self.emit_TABLE_INFO(db, cmd_id=cmd_id, client_id=client_id, table_info=table_info)
         self.log.debug("handle_cmd_join: done")
 
+    async def handle_cmd_info(self, db, *, cmd_id, client_id, user_id):
+        # актуальное состояние стола для клиента, уже вошедшего за стол (например, после сброса очереди сообщений)
+        user, _, _ = self.find_user(user_id)
+        if not user:
+            self.log.warning("handle_cmd_info: user %s not joined", user_id)
+            return
+        table_info = self.get_table_info(user_id)
+        await self.emit_TABLE_INFO(db, cmd_id=cmd_id, client_id=client_id, table_info=table_info)
+
     async def handle_cmd_take_seat(self, db, *, cmd_id, client_id, user_id: int, seat_idx: int):
         # check seats allocation
         user, old_seat_idx, seats_available = self.find_user(user_id)
@@ -421,6 +464,10 @@ class Table:
                         await db.update_table_status(self.table_id, status=self.status)
             except Exception as ex:
                 self.log.exception("%s", ex)
+            try:
+                await self.journal.close()
+            except Exception as ex:
+                self.log.exception("journal: %s", ex)
 
         self.log.info("end")
 
@@ -506,8 +553,12 @@ class Table:
 
     async def close_game(self, game):
         users = [p.user for p in game.players]
+        # сообщения игры записываются до закрытия игры, игра не закрывается с незаписанной историей
+        await self.journal.drain()
         async with self.DBI() as db:
             await db.close_game(self.game.game_id, players=users)
+            await db.create_game_history(self.game.game_id, user_ids=[u.id for u in users],
+                                         data=game.history.encode())
 
     async def remove_users(self, db, *, force=False, disconnect=False, broadcast=True):
         # remove users based on user_can_stay return
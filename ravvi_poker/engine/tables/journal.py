@@ -0,0 +1,149 @@
+import time
+import asyncio
+from collections import deque
+
+from ... import codec
+from ...db import DBI
+from ..events import Message
+
+
+class TableJournal:
+    """
+    Отложенная запись сообщений игры стола (write-behind).
+    Сообщения сразу попадают в буфер, запись в table_msg выполняется фоновой задачей пакетами
+    не позже FLUSH_INTERVAL сек после появления, ход игры не ждет фиксации транзакции.
+    Стол, у которого уже есть соединение, забирает накопленные сообщения в свою транзакцию (take),
+    чтобы не занимать второе соединение пула; при откате этой транзакции сообщения возвращаются в буфер.
+    При ошибке записи пакет возвращается в буфер и записывается повторно по одному сообщению
+    с растущей паузой, пока идут повторы, сообщения в транзакции стола не забираются.
+    Ошибки соединения повторяются без ограничения, сообщение с ошибкой данных после RETRY_LIMIT попыток
+    отбрасывается с записью в лог.
+    """
+
+    # максимальная задержка записи (сек)
+    FLUSH_INTERVAL = 0.05
+    # максимальное количество сообщений в одной транзакции записи
+    FLUSH_BATCH = 200
+    # при переполнении буфера сообщения записываются в транзакции игры
+    PENDING_LIMIT = 1000
+    # пауза перед повтором после ошибки записи (сек), удваивается до RETRY_DELAY_MAX
+    RETRY_DELAY = 0.5
+    RETRY_DELAY_MAX = 30
+    # количество попыток записи сообщения
+    RETRY_LIMIT = 5
+
+    def __init__(self, table) -> None:
+        self.table = table
+        self.log = table.log
+        # (время добавления, параметры add_table_msg) в порядке отправки
+        self.pending = deque()
+        # пакет, который записывается сейчас
+        self.inflight = None
+        # неудачные попытки записи подряд
+        self.attempts = 0
+        self.lock = asyncio.Lock()
+        self.ready = asyncio.Event()
+        self.task = None
+        self.stats = dict(written=0, batches=0, moved=0, errors=0, dropped=0, lag_max=0.0)
+
+    def add(self, msg: Message):
+        kwargs = dict(msg)
+        # снимок свойств: игра может изменить вложенные объекты до записи
+        kwargs["props"] = codec.loads(codec.dumpb(kwargs.get("props") or {}))
+        self.pending.append((time.monotonic(), kwargs))
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+        self.ready.set()
+
+    @property
+    def busy(self):
+        """Идет запись пакета или повтор после ошибки: новые сообщения встают в очередь за ними"""
+        return bool(self.inflight or self.attempts)
+
+    def take(self, db: DBI):
+        """Накопленные сообщения для записи в транзакции вызывающего, при откате возвращаются в буфер"""
+        if self.busy:
+            # сообщения после ошибки записываются только журналом (RETRY_LIMIT)
+            return []
+        items = list(self.pending)
+        self.pending.clear()
+        if items:
+            self.stats["moved"] += len(items)
+            db.on_rollback.append(lambda: self.put_back(items))
+        return [kwargs for _, kwargs in items]
+
+    def put_back(self, items):
+        self.pending.extendleft(reversed(items))
+        self.stats["moved"] -= len(items)
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+        self.ready.set()
+
+    def get_retry_delay(self):
+        return min(self.RETRY_DELAY * 2 ** (self.attempts - 1), self.RETRY_DELAY_MAX)
+
+    async def run(self):
+        while True:
+            await self.ready.wait()
+            # собираем пакет
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as ex:
+                self.log.warning("journal: write failed (%s/%s): %s", self.attempts, self.RETRY_LIMIT, ex)
+                await asyncio.sleep(self.get_retry_delay())
+
+    async def flush(self):
+        """Запись всех накопленных сообщений (вызывается также при завершении игры)"""
+        async with self.lock:
+            self.ready.clear()
+            while self.pending:
+                # после ошибки сообщения записываются по одному: отбрасывается только то, что не записывается
+                size = 1 if self.attempts else self.FLUSH_BATCH
+                batch = [self.pending.popleft() for _ in range(min(len(self.pending), size))]
+                self.inflight = batch
+                try:
+                    async with self.table.DBI() as db:
+                        for _, kwargs in batch:
+                            db.add_table_msg(**kwargs)
+                except Exception as ex:
+                    self.stats["errors"] += 1
+                    self.attempts += 1
+                    if self.attempts < self.RETRY_LIMIT or isinstance(ex, DBI.OperationalError):
+                        self.pending.extendleft(reversed(batch))
+                        self.ready.set()
+                        raise
+                    self.log.error("journal: message dropped after %s attempts: %s %s", self.attempts, ex,
+                                   [kwargs for _, kwargs in batch])
+                    self.stats["dropped"] += len(batch)
+                    self.attempts = 0
+                    continue
+                finally:
+                    self.inflight = None
+                self.attempts = 0
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["lag_max"] = max(self.stats["lag_max"], time.monotonic() - batch[0][0])
+
+    async def drain(self):
+        """Запись всех накопленных сообщений с повторами (завершение игры), ошибка - если записать не удалось"""
+        while True:
+            try:
+                await self.flush()
+                return
+            except Exception as ex:
+                if self.attempts >= self.RETRY_LIMIT:
+                    raise
+                self.log.warning("journal: write failed (%s/%s): %s", self.attempts, self.RETRY_LIMIT, ex)
+                await asyncio.sleep(self.get_retry_delay())
+
+    async def close(self):
+        try:
+            await self.drain()
+        finally:
+            if self.task is not None:
+                self.task.cancel()
+                self.task = None
+
+    def get_stats(self):
+        return dict(self.stats, pending=len(self.pending))
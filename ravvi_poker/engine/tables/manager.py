@@ -1,3 +1,4 @@
+import time
 import logging
 import json
 import asyncio
@@ -5,19 +6,27 @@ from typing import Mapping
 
 from ...db import DBI
 from ...db.listener import DBI_Listener
+from ..bus import local_bus
 from . import Table, Table_RG_Club, Table_RG_Lobby, Table_SNG, TableStatus
 
 logger = logging.getLogger(__name__)
 
 
 class TablesManager(DBI_Listener):
+    # кеш клиентов команд: максимальный размер и время жизни записи (сек)
+    CLIENTS_INFO_LIMIT = 10000
+    CLIENTS_INFO_TTL = 300
+
     def __init__(self):
         super().__init__()
         self.log = logger
         self.tables_accept = True
         self.tables: Mapping[int, Table] = {}
+        # client_id -> (время, get_client_info), сбрасывается по user_client_closed и при переподключении
+        self.clients_info = {}
         self.listener = DBI_Listener(log=self.log)
         self.listener.on_listen = self.on_listen
+        self.listener.on_replay = self.on_replay
         self.listener.channels = {
             "table_profile_created": self.on_table_profile_created,
             "table_profile_status": self.on_table_profile_status,
@@ -27,6 +36,7 @@ class TablesManager(DBI_Listener):
 
     async def start(self):
         self.tables_accept = True
+        await local_bus.register_tables_manager(self)
         await self.listener.start()
 
     async def stop(self):
@@ -39,6 +49,7 @@ class TablesManager(DBI_Listener):
         # ждем завершения работы всех столов
         await self._wait_tables_closed()
         self.log.info("shutdown tables done")
+        await local_bus.unregister_tables_manager(self)
         # выключаем прием оповещений
         await self.listener.stop()
 
@@ -47,14 +58,27 @@ class TablesManager(DBI_Listener):
             await asyncio.sleep(0.1)
 
     async def on_listen(self, backend_id):
+        # оповещения о закрытии клиентов во время переподключения не повторяются
+        self.clients_info.clear()
         self.log.info("load tables ...")
         async with DBI() as dbi:
             tables = await dbi.get_open_tables()
+            if "table_cmd" not in self.listener.channels_last_id:
+                # команды, созданные до запуска, не обрабатываются
+                self.listener.channels_last_id["table_cmd"] = await dbi.get_table_cmd_last_id()
         self.log.info("loaded %s tables", len(tables))
         for x in tables:
             await self.start_table(x)
         self.log.info("tables ready")
 
+    async def on_replay(self, dbi, channel, last_id):
+        # команды столов этого процесса, оповещения о которых пропущены при переподключении:
+        # все необработанные, команда с меньшим id может быть зафиксирована позже last_id
+        if channel != "table_cmd" or not self.tables:
+            return []
+        rows = await dbi.get_table_cmds_unprocessed(self.tables)
+        return [dict(cmd_id=row.id, table_id=row.table_id) for row in rows]
+
     async def on_table_profile_created(self, *, table_id):
         if not self.tables_accept:
             # прием и запуск новых столов запрещен
@@ -81,16 +105,36 @@ class TablesManager(DBI_Listener):
             await db.release_table_engine_id(table_id)
         self.log.info("release table %s ", table_id)
 
-    async def on_table_cmd(self, *, cmd_id, table_id):
+    async def get_client_info(self, dbi, client_id):
+        now = time.monotonic()
+        ts, client = self.clients_info.get(client_id, (None, None))
+        if client is not None and now - ts < self.CLIENTS_INFO_TTL:
+            return client
+        client = await dbi.get_client_info(client_id)
+        self.clients_info.pop(client_id, None)
+        if client and not client.closed_ts:
+            if len(self.clients_info) >= self.CLIENTS_INFO_LIMIT:
+                # удаляется самая старая запись
+                del self.clients_info[next(iter(self.clients_info))]
+            self.clients_info[client_id] = (now, client)
+        return client
+
+    async def on_table_cmd(self, *, cmd_id, table_id, client_id=None, cmd_type=None, props=None):
         self.log.info("on_table_cmd: %s: %s", table_id, cmd_id)
         table = self.tables.get(table_id, None)
         if not table:
             return
         async with DBI() as dbi:
-            cmd = await dbi.get_table_cmd(cmd_id)
-            client = await dbi.get_client_info(cmd.client_id)
+            if cmd_type is None:
+                # команда не поместилась в оповещение или прочитана после переподключения
+                cmd = await dbi.get_table_cmd(cmd_id)
+                if cmd.processed_ts:
+                    # повтор команды, которая была в очереди стола во время переподключения
+                    return
+                client_id, cmd_type, props = cmd.client_id, cmd.cmd_type, cmd.props
+            client = await self.get_client_info(dbi, client_id)
             if not client:
-                self.log.warning("client %s not found", cmd.client_id)
+                self.log.warning("client %s not found", client_id)
                 return
             try:
                 await table.handle_cmd(
@@ -98,26 +142,52 @@ class TablesManager(DBI_Listener):
                     cmd_id=cmd_id,
                     client_id=client.client_id,
                     user_id=client.user_id,
-                    cmd_type=cmd.cmd_type,
-                    props=(cmd.props or {}),
+                    cmd_type=cmd_type,
+                    props=(props or {}),
                 )
             except Exception as e:
                 self.log.exception("%s", e)
             finally:
-                await dbi.set_table_cmd_processed(cmd_id)
+                # отметка уходит вместе с сообщениями стола при фиксации
+                dbi.add_table_cmd_processed(cmd_id)
+
+    async def handle_table_cmd(self, table, *, cmd_id, client_id, user_id, cmd_type, props):
+        """Команда клиента этого же процесса (без чтения table_cmd)"""
+        self.log.info("handle_table_cmd: %s: %s", table.table_id, cmd_type)
+        async with DBI() as dbi:
+            try:
+                await table.handle_cmd(
+                    dbi,
+                    cmd_id=cmd_id,
+                    client_id=client_id,
+                    user_id=user_id,
+                    cmd_type=cmd_type,
+                    props=(props or {}),
+                )
+            except Exception as e:
+                self.log.exception("%s", e)
 
     async def on_user_client_closed(self, *, client_id):
         self.log.info("on_user_client_closed: %s ", client_id)
+        _, client = self.clients_info.pop(client_id, (None, None))
+        if client is None:
+            async with DBI() as dbi:
+                client = await dbi.get_client_info(client_id)
+        if not client:
+            self.log.warning("client %s not found", client_id)
+            return
+        for table_id, table in self.tables.items():
+            if client.user_id not in table.users and table_id not in self.listener.queues:
+                continue
+            # в очереди стола: закрытие обрабатывается после полученных раньше команд клиента (JOIN, TAKE_SEAT)
+            self.listener.dispatch(table_id, self.handle_client_close,
+                                   dict(table=table, user_id=client.user_id, client_id=client_id))
+
+    async def handle_client_close(self, *, table, user_id, client_id):
+        if user_id not in table.users:
+            return
         async with DBI() as dbi:
-            client = await dbi.get_client_info(client_id)
-            if not client:
-                self.log.warning("client %s not found", client_id)
-                return
-            user_id = client.user_id
-            for table in self.tables.values():
-                if client.user_id not in table.users:
-                    continue
-                await table.handle_client_close(dbi, user_id=user_id, client_id=client_id)
+            await table.handle_client_close(dbi, user_id=user_id, client_id=client_id)
 
     def table_factory(self, row):
         kwargs = row._asdict()
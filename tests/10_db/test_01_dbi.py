@@ -57,3 +57,40 @@ async def test_dbi_use_id_or_uuid():
     key, value = db.use_id_or_uuid(None, "UUID-111")
     assert key == "uuid"
     assert value == "UUID-111"
+
+
+@pytest.mark.asyncio
+async def test_dbi_json():
+    from decimal import Decimal
+    props = dict(balance=Decimal("10.25"), bets=[Decimal("0.01"), Decimal(2)], name="игрок", seats={1: None})
+    assert DBI.json_dumps(props) == '{"balance":10.25,"bets":[0.01,2],"name":"игрок","seats":{"1":null}}'
+    async with DBI() as db:
+        async with db.cursor() as cursor:
+            await cursor.execute("SELECT %s::jsonb AS props", (DBI.json_dumps(props),))
+            row = await cursor.fetchone()
+    assert row.props == dict(balance=10.25, bets=[0.01, 2.0], name="игрок", seats={"1": None})
+
+
+@pytest.mark.parametrize("backend", ["orjson", "json"])
+def test_codec_decimal(backend, monkeypatch):
+    import sys
+    import json
+    import importlib
+    from decimal import Decimal
+    import ravvi_poker.codec
+
+    if backend == "json":
+        monkeypatch.setitem(sys.modules, "orjson", None)
+    try:
+        codec = importlib.reload(ravvi_poker.codec)
+        assert codec.BACKEND == backend
+        # больше 15 значащих цифр: запись без потери точности
+        values = [Decimal("12345678901234567.89"), Decimal("-0.000000000000000001"), Decimal("10.00")]
+        text = codec.dumps(dict(amounts=values, name="x\x00decimal:1"))
+        assert text == '{"amounts":[12345678901234567.89,-1E-18,10.00],"name":"x\\u0000decimal:1"}'
+        assert codec.dumpb(values).decode() == "[12345678901234567.89,-1E-18,10.00]"
+        assert json.loads(text, parse_float=Decimal)["amounts"] == values
+        assert codec.loads(text)["name"] == "x\x00decimal:1"
+    finally:
+        monkeypatch.undo()
+        importlib.reload(ravvi_poker.codec)
@@ -1,4 +1,5 @@
 import asyncio
+import psycopg
 import pytest
 import pytest_asyncio
 
@@ -38,3 +39,58 @@ async def test_dbi_stress_with_pool(dbi_pool):
     for x, y in zip(values,results):
         assert x == y
     # all requests should be executed w/o errors
+
+
+@pytest.mark.asyncio
+async def test_dbi_pool_reuse(dbi_pool):
+    # соединения открыты заранее
+    stats = DBI.pool_stats()
+    assert stats["size"] == stats["idle"] == DBI.pool.min_size
+    assert stats["connected"] == DBI.pool.min_size
+
+    for x in range(10):
+        assert await run_db_query(x) == x
+    # после ошибки запроса соединение возвращается в пул
+    with pytest.raises(psycopg.Error):
+        async with DBI() as db:
+            await db.dbi.execute("SELECT * FROM unknown_table")
+    stats = DBI.pool_stats()
+    assert stats["acquired"] == 11
+    assert stats["connected"] == DBI.pool.min_size
+    assert stats["discarded"] == 0
+    assert stats["used"] == 0
+    assert stats["wait_max"] >= stats["wait_avg"] > 0
+
+
+@pytest.mark.asyncio
+async def test_dbi_pool_health(dbi_pool):
+    pool = DBI.pool
+    # разорванное соединение заменяется
+    pid = pool.idle[0][0].info.backend_pid
+    async with DBI() as db:
+        await db.dbi.execute("SELECT pg_terminate_backend(%s)", (pid,))
+    pool.check_idle = 0
+    values = range(pool.min_size + 1)
+    assert await asyncio.gather(*[run_db_query(x) for x in values]) == list(values)
+    assert pool.stats["discarded"] == 1
+    await asyncio.sleep(0.1)
+    assert pool.size >= pool.min_size
+
+    # устаревшие соединения закрываются при возврате
+    before = set(pool.created)
+    pool.max_lifetime = 0
+    assert await run_db_query(1) == 1
+    assert not before & set(pool.created)
+
+
+@pytest.mark.asyncio
+async def test_dbi_pool_commit_error(dbi_pool):
+    pool = DBI.pool
+    # ошибка записи пакета сообщений при фиксации не занимает место в пуле
+    for _ in range(pool.limit + 1):
+        with pytest.raises(psycopg.errors.ForeignKeyViolation):
+            async with DBI() as db:
+                db.add_table_msg(table_id=-1, game_id=None, msg_type=1, props={})
+    assert pool.lock._value == pool.limit
+    assert pool.get_stats()["used"] == 0
+    assert await run_db_query(1) == 1
@@ -10,3 +10,66 @@ async def test_client(client):
     await asyncio.sleep(1)
     await asyncio.wait_for(x.stop(), timeout=10)
     
+
+
+@pytest.mark.asyncio
+async def test_dispatch_order():
+    await DBI.pool_open()
+    x = DBI_Listener()
+    received = []
+
+    async def handler(*, table_id, n):
+        # первый стол обрабатывается медленно, второй не должен его ждать
+        if table_id == 1:
+            await asyncio.sleep(0.05)
+        received.append((table_id, n))
+
+    x.channels = {"test_dispatch": handler}
+    await asyncio.wait_for(x.start(), timeout=10)
+    async with DBI() as db:
+        for n in range(5):
+            for table_id in (1, 2):
+                payload = DBI.json_dumps(dict(table_id=table_id, n=n))
+                await db.dbi.execute("SELECT pg_notify('test_dispatch', %s)", (payload,))
+    for _ in range(50):
+        if len(received) == 10:
+            break
+        await asyncio.sleep(0.1)
+    await asyncio.wait_for(x.stop(), timeout=10)
+    await DBI.pool_close()
+
+    # внутри стола порядок сохраняется
+    assert [n for t, n in received if t == 1] == [0, 1, 2, 3, 4]
+    assert [n for t, n in received if t == 2] == [0, 1, 2, 3, 4]
+    # второй стол обработан, пока первый еще в работе
+    assert received.index((2, 4)) < received.index((1, 4))
+
+    stats = x.get_stats()
+    assert stats["notifies"] == 10
+    assert stats["processed"] == 10
+    assert stats["queued"] == 0
+    assert stats["lag_max"] >= stats["lag_last"] >= 0
+
+
+@pytest.mark.asyncio
+async def test_listener_error_reconnect():
+    class X_Listener(DBI_Listener):
+        errors = 0
+
+        async def update_channels(self, dbi, listening):
+            # ошибка в цикле оповещений: переподключение, а после stop - выход из цикла
+            self.errors += 1
+            raise RuntimeError("update_channels")
+
+    x = X_Listener()
+    await asyncio.wait_for(x.start(), timeout=10)
+    x.add_channel("test_reconnect", None)
+    for _ in range(50):
+        if x.errors and x.ready.is_set():
+            break
+        await asyncio.sleep(0.1)
+    assert x.errors and x.ready.is_set()
+    x.add_channel("test_reconnect_2", None)
+    await asyncio.sleep(0.5)
+    await asyncio.wait_for(x.stop(), timeout=10)
+    assert x.task is None
@@ -58,6 +58,7 @@ async def test_game_create(table, users_10):
 
     async with DBI() as db:
         game = await db.close_game(game.id, players)
+        assert game.end_ts
 
     async with DBI() as db:
         game, game_players = await db.get_game_and_players(game.id)
@@ -70,3 +71,30 @@ async def test_game_create(table, users_10):
             assert p.balance == gp.balance_end
             assert gp.balance_end == gp.balance_begin+10
 
+
+
+@pytest.mark.asyncio
+async def test_game_history(table, users_10):
+    users = users_10[:3]
+    players = [X_Player(u, 100) for u in users]
+    async with DBI() as db:
+        game = await db.create_game(table_id=table.id, game_type=table.game_type, game_subtype=table.game_subtype,
+                                    props={}, players=players)
+        await db.close_game(game.id, players)
+        await db.create_game_history(game.id, user_ids=[u.id for u in users], data=b'hand')
+        # повторная запись не меняет историю
+        await db.create_game_history(game.id, user_ids=[], data=b'other')
+
+    async with DBI() as db:
+        row = await db.get_game_history(game.id)
+        assert row.table_id == table.id
+        assert row.user_ids == [u.id for u in users]
+        assert bytes(row.data) == b'hand'
+        assert row.end_ts
+
+        rows = await db.get_games_history(user_id=users[0].id)
+        assert [x.game_id for x in rows] == [game.id]
+        rows = await db.get_games_history(user_id=users[0].id, table_id=table.id, before_id=game.id)
+        assert not rows
+        rows = await db.get_games_history(user_id=users_10[5].id)
+        assert not rows
@@ -1,4 +1,5 @@
 import logging
+import asyncio
 import pytest
 import pytest_asyncio
 
@@ -20,8 +21,106 @@ async def test_table_cmd_create(table, client):
     payload = x.expected[0]
     assert payload['cmd_id']
     assert payload['table_id'] ==  table.id
+    # команда целиком в оповещении
+    assert payload['client_id'] == client.id
+    assert payload['cmd_type'] == 777
+    assert payload['props'] == {}
 
     async with DBI() as db:
         x = await db.get_table_cmd(payload['cmd_id'])
         assert x.client_id == client.id
         assert x.table_id == table.id
+
+
+class X_Replay_Listener(X_DBI_Listener):
+
+    def __init__(self, table_id, *channels) -> None:
+        super().__init__(*channels)
+        self.table_id = table_id
+
+    async def on_expected(self, **payload):
+        await super().on_expected(**payload)
+        # команда обработана
+        async with DBI() as db:
+            await db.set_table_cmd_processed(payload["cmd_id"])
+
+    async def on_replay(self, dbi, channel, last_id):
+        rows = await dbi.get_table_cmds_unprocessed([self.table_id])
+        return [dict(cmd_id=row.id, table_id=row.table_id) for row in rows]
+
+
+async def wait_for(check, timeout=10):
+    for _ in range(int(timeout / 0.1)):
+        if check():
+            return
+        await asyncio.sleep(0.1)
+
+
+@pytest.mark.asyncio
+async def test_table_cmd_replay(table, client):
+    async with X_Replay_Listener(table.id, "table_cmd") as x:
+        # транзакция с командой, id которой меньше следующих, фиксируется позже
+        async with DBI() as db_late:
+            cmd0 = await db_late.create_table_cmd(client_id=client.id, table_id=table.id, cmd_type=777, props=None)
+            async with DBI() as db:
+                cmd1 = await db.create_table_cmd(client_id=client.id, table_id=table.id, cmd_type=777, props=None)
+            await wait_for(lambda: x.expected)
+            assert [p['cmd_id'] for p in x.expected] == [cmd1.id]
+            assert x.channels_last_id['table_cmd'] == cmd1.id
+
+            # обрыв соединения слушателя: оповещения о командах пропущены
+            async with DBI() as db:
+                await db.dbi.execute("SELECT pg_terminate_backend(%s)", (x.pg_backend_pid,))
+        async with DBI() as db:
+            cmd2 = await db.create_table_cmd(client_id=client.id, table_id=table.id, cmd_type=777, props=None)
+            cmd3 = await db.create_table_cmd(client_id=client.id, table_id=table.id, cmd_type=777, props=None)
+            # обработанная команда не повторяется
+            await db.create_table_cmd(client_id=client.id, table_id=table.id, cmd_type=777, props=None,
+                                      processed=True)
+        await wait_for(lambda: len(x.expected) >= 4)
+        async with DBI() as db:
+            cmd4 = await db.create_table_cmd(client_id=client.id, table_id=table.id, cmd_type=777, props=None)
+        await wait_for(lambda: len(x.expected) >= 5)
+
+    # пропущенные команды прочитаны при переподключении, по порядку и по одному разу,
+    # в том числе зафиксированная после last_id команда с меньшим id
+    assert cmd0.id < cmd1.id
+    assert [p['cmd_id'] for p in x.expected] == [cmd1.id, cmd0.id, cmd2.id, cmd3.id, cmd4.id]
+    assert x.replayed == {'table_cmd': {cmd0.id, cmd2.id, cmd3.id}}
+
+
+@pytest.mark.asyncio
+async def test_table_cmd_processed_on_commit(table, client):
+    async with DBI() as db:
+        cmd = await db.create_table_cmd(client_id=client.id, table_id=table.id, cmd_type=777, props=None)
+        row = await db.get_table_cmd(cmd.id)
+        assert not row.processed_ts
+        # частые запросы подготовлены на сервере
+        async with db.cursor() as cursor:
+            await cursor.execute("SELECT count(*) FROM pg_prepared_statements")
+            assert (await cursor.fetchone()).count >= 2
+
+    # отметка обработки и сообщения стола записываются при фиксации
+    async with DBI() as db:
+        db.add_table_msg(table_id=table.id, game_id=None, msg_type=777, props=None, cmd_id=cmd.id)
+        db.add_table_cmd_processed(cmd.id)
+    async with DBI() as db:
+        row = await db.get_table_cmd(cmd.id)
+        assert row.processed_ts
+        rows = await db.get_table_msgs_after(table.id, 0)
+        assert [x.cmd_id for x in rows] == [cmd.id]
+
+    # откат транзакции отменяет отметку
+    cmd = await db_create_cmd(table, client)
+    with pytest.raises(ZeroDivisionError):
+        async with DBI() as db:
+            db.add_table_cmd_processed(cmd.id)
+            1 / 0
+    async with DBI() as db:
+        row = await db.get_table_cmd(cmd.id)
+        assert not row.processed_ts
+
+
+async def db_create_cmd(table, client):
+    async with DBI() as db:
+        return await db.create_table_cmd(client_id=client.id, table_id=table.id, cmd_type=777, props=None)
@@ -10,16 +10,16 @@ async def test_table_msg_create(table, client):
     assert table
     assert client
 
-    async with X_DBI_Listener("table_msg") as x:
+    async with X_DBI_Listener("table_msg", f"table_msg_{table.id}") as x:
         async with DBI() as db:
             msg = await db.create_table_msg(table_id=table.id, game_id=None, msg_type=777, props=None)
         async with DBI() as db:
             msg = await db.create_table_msg(table_id=table.id, game_id=None, msg_type=777, props=None, client_id=client.id)
     assert x.expected and len(x.expected) == 2
-    payload_1 = x.expected[0]
+    payload_1 = x.expected[0]['msgs'][0]
     assert payload_1['msg_id']
     assert payload_1['table_id'] ==  table.id
-    payload_2 = x.expected[1]
+    payload_2 = x.expected[1]['msgs'][0]
     assert payload_1['msg_id']
     assert payload_1['table_id'] ==  table.id
 
@@ -32,3 +32,77 @@ async def test_table_msg_create(table, client):
         x = await db.get_table_msg(payload_2['msg_id'])
         assert x.table_id == table.id
         assert x.client_id == client.id
+
+
+@pytest.mark.asyncio
+async def test_table_msg_payload(table, client):
+    async with X_DBI_Listener("table_msg", f"table_msg_{table.id}") as x:
+        async with DBI() as db:
+            await db.create_table_msg(table_id=table.id, game_id=None, msg_type=777, props=dict(cards=[1, 2]),
+                                      client_id=client.id)
+        # сообщение больше лимита оповещения
+        async with DBI() as db:
+            await db.create_table_msg(table_id=table.id, game_id=None, msg_type=777, props=dict(text="x" * 10000))
+    assert len(x.expected) == 2
+    payload_1, payload_2 = [x['msgs'][0] for x in x.expected]
+    assert payload_1['msg_type'] == 777
+    assert payload_1['client_id'] == client.id
+    assert payload_1['props'] == dict(cards=[1, 2])
+    assert set(payload_2) == {'msg_id', 'table_id', 'origin'}
+
+
+@pytest.mark.asyncio
+async def test_table_msg_batch(table, client):
+    async with X_DBI_Listener("table_msg", f"table_msg_{table.id}") as x:
+        async with DBI() as db:
+            for i in range(20):
+                db.add_table_msg(table_id=table.id, game_id=None, msg_type=777, props=dict(idx=i))
+            # большое сообщение передается только id
+            db.add_table_msg(table_id=table.id, game_id=None, msg_type=777, props=dict(text="x" * 10000))
+            db.add_table_msg(table_id=table.id, game_id=None, msg_type=777, props=dict(idx=20), client_id=client.id)
+    # одно оповещение в канал стола и одно в общий канал для сообщения клиенту
+    assert len(x.expected) == 2
+    assert len(x.expected[0]['msgs']) == 21
+    msgs = [m for payload in x.expected for m in payload['msgs']]
+    assert len(msgs) == 22
+    assert [m['msg_id'] for m in msgs] == sorted(m['msg_id'] for m in msgs)
+    assert [m['props']['idx'] for m in msgs[:20]] == list(range(20))
+    assert 'props' not in msgs[20]
+    assert msgs[21]['client_id'] == client.id
+
+
+@pytest.mark.asyncio
+async def test_table_msg_batch_split(table):
+    async with X_DBI_Listener("table_msg", f"table_msg_{table.id}") as x:
+        async with DBI() as db:
+            for i in range(10):
+                db.add_table_msg(table_id=table.id, game_id=None, msg_type=777, props=dict(idx=i, text="x" * 2000))
+    # оповещения разбиты по лимиту, порядок сохранен
+    assert len(x.expected) > 1
+    msgs = [m for payload in x.expected for m in payload['msgs']]
+    assert [m['props']['idx'] for m in msgs] == list(range(10))
+
+
+@pytest.mark.asyncio
+async def test_table_msg_channels(table, client):
+    async with X_DBI_Listener("table_msg") as x:
+        async with DBI() as db:
+            db.add_table_msg(table_id=table.id, game_id=None, msg_type=777, props=None)
+            db.add_table_msg(table_id=table.id, game_id=None, msg_type=777, props=None, client_id=client.id)
+    # в общий канал только сообщения клиентам
+    assert len(x.expected) == 1
+    assert x.expected[0]['msgs'][0]['client_id'] == client.id
+
+
+@pytest.mark.asyncio
+async def test_table_msg_client_after(table, client):
+    async with DBI() as db:
+        db.add_table_msg(table_id=table.id, game_id=None, msg_type=777, props=None)
+        db.add_table_msg(table_id=table.id, game_id=None, msg_type=777, props=None, client_id=client.id)
+    async with DBI() as db:
+        rows = await db.get_table_msgs_after(table.id, 0)
+        msg_id = rows[0].id - 1
+        # только сообщения указанным клиентам
+        rows = await db.get_client_msgs_after(msg_id, [client.id])
+        assert [x.client_id for x in rows] == [client.id]
+        assert not await db.get_client_msgs_after(msg_id, [-1])
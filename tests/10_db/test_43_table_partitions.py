@@ -0,0 +1,32 @@
+import pytest
+
+from ravvi_poker.db import changes, utils
+from ravvi_poker.db.dbi import DBI
+
+
+def test_table_partitions():
+    # миграция повторяемая
+    utils.apply_sql_files(DBI.DB_NAME, changes.getSQLFiles("v0.4.0"))
+    rows = utils.maintain_partitions(DBI.DB_NAME, ahead_days=2)
+    assert all(action == "create" for action, _ in rows)
+    # разделы уже созданы
+    assert not utils.maintain_partitions(DBI.DB_NAME, ahead_days=2)
+
+
+@pytest.mark.asyncio
+async def test_table_partitions_msgs(table, client):
+    async with DBI() as db:
+        await db.create_table_msg(table_id=table.id, game_id=None, msg_type=777, props=None)
+        msg = await db.create_table_msg(table_id=table.id, game_id=None, msg_type=778, props=None)
+        cmd = await db.create_table_cmd(client_id=client.id, table_id=table.id, cmd_type=1, props={})
+
+    async with DBI() as db:
+        async with db.cursor() as cursor:
+            await cursor.execute("SELECT tableoid::regclass::varchar AS name FROM table_msg WHERE id=%s", (msg.id,))
+            row = await cursor.fetchone()
+        # сообщение записано в раздел дня, а не в раздел по умолчанию
+        assert row.name != "table_msg_default"
+        rows = await db.get_table_msgs_after(table.id, msg.id - 1)
+        assert [x.id for x in rows] == [msg.id]
+        rows = await db.get_table_cmds_unprocessed([table.id])
+        assert cmd.id in [x.id for x in rows]
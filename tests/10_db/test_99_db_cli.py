@@ -15,3 +15,8 @@ def test_db_deploy():
     from ravvi_poker.db.deploy import getSQLFiles
     files = getSQLFiles()
     assert files is not None
+
+def test_db_changes():
+    from ravvi_poker.db.changes import getSQLFiles
+    files = getSQLFiles("v0.4.0")
+    assert files
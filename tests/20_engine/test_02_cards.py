@@ -139,3 +139,45 @@ def test_deck_X():
     with pytest.raises(ValueError):
         deck = Deck(666)
 
+
+
+def test_cards_interned():
+    import pickle
+    from ravvi_poker.engine.cards import CARD_MASK, CARD_RANK, CARD_SUIT, get_cards_mask
+
+    for code in range(53):
+        c = Card(code)
+        assert Card(code) is c
+        assert pickle.loads(pickle.dumps(c)) is c
+        assert CARD_RANK[code] == (c.rank or 0)
+        assert CARD_SUIT[code] == (c.suit or 0)
+        assert CARD_MASK[code] == c.mask
+    assert Card("AS") is Card(rank=14, suit=1)
+    assert get_cards_mask([1, 13, 14]) == Card(1).mask | Card(13).mask | Card(14).mask
+
+    with pytest.raises(AttributeError):
+        Card(1).code = 2
+
+
+def test_deck_deal():
+    from ravvi_poker.engine.cards import BufferedSystemRandom
+
+    deck = Deck(52)
+    dealt = [deck.get_next() for _ in range(10)]
+    assert len(deck) == 42
+    assert len(set(dealt)) == 10
+    assert set(deck) | set(dealt) == set(range(1, 53))
+
+    # seed: одинаковые раздачи
+    deck1, deck2 = Deck(36, seed=7), Deck(36, seed=7)
+    assert [deck1.get_next() for _ in range(36)] == [deck2.get_next() for _ in range(36)]
+    with pytest.raises(IndexError):
+        deck1.get_next()
+
+    rng = BufferedSystemRandom(buffer_size=16)
+    values = [rng.getrandbits(13) for _ in range(100)]
+    assert all(0 <= x < 1 << 13 for x in values)
+    assert len(set(values)) > 1
+    assert all(0 <= rng.random() < 1 for _ in range(100))
+    deck = Deck(52, rng=rng)
+    assert sorted(deck.get_next() for _ in range(52)) == list(range(1, 53))
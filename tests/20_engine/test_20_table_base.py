@@ -54,3 +54,146 @@ async def test_table_start_stop_mgr():
     finally:
         await manager.stop()
         await DBI.pool_close()
+
+
+@pytest.mark.asyncio
+async def test_table_journal(table):
+    from ravvi_poker.engine.events import Message
+
+    x_table = Table(**table._asdict())
+    props = dict(cards=[1, 2])
+    for idx in range(3):
+        await x_table.emit_game_msg(Message(msg_type=Message.Type.GAME_BEGIN, game_id=None, idx=idx, **props))
+    # изменение после отправки не попадает в запись
+    props["cards"].append(3)
+    # запись в фоне
+    assert len(x_table.journal.pending) == 3
+    await asyncio.sleep(0.5)
+    assert not x_table.journal.pending
+
+    # сообщение стола записывается после ранее отправленных сообщений игры
+    await x_table.emit_game_msg(Message(msg_type=Message.Type.GAME_END, game_id=None, idx=3))
+    async with DBI() as db:
+        await x_table.emit_msg(db, Message(msg_type=Message.Type.TABLE_CLOSED, idx=4))
+    assert not x_table.journal.pending
+
+    async with DBI() as db:
+        rows = await db.get_table_msgs_after(table.id, 0)
+    assert [row.props["idx"] for row in rows] == [0, 1, 2, 3, 4]
+    assert rows[0].props["cards"] == [1, 2]
+    stats = x_table.journal.get_stats()
+    # GAME_END записано в транзакции сообщения стола
+    assert stats["written"] == 3
+    assert stats["moved"] == 1
+    assert stats["pending"] == 0
+    await x_table.journal.close()
+
+
+@pytest.mark.asyncio
+async def test_table_journal_retry(table):
+    from ravvi_poker.engine.events import Message
+
+    x_table = Table(**table._asdict())
+    journal = x_table.journal
+    journal.RETRY_DELAY = 0.01
+    journal.RETRY_LIMIT = 3
+    for idx in range(3):
+        journal.add(Message(msg_type=Message.Type.GAME_BEGIN, table_id=table.id, game_id=None, idx=idx))
+    # сообщение, которое нельзя записать (нет стола)
+    journal.pending[1][1]["table_id"] = -1
+    await asyncio.sleep(1)
+    assert not journal.pending
+
+    async with DBI() as db:
+        rows = await db.get_table_msgs_after(table.id, 0)
+    assert [row.props["idx"] for row in rows] == [0, 2]
+    stats = journal.get_stats()
+    assert stats["dropped"] == 1
+    assert stats["written"] == 2
+    assert stats["errors"] == 1 + journal.RETRY_LIMIT
+    await journal.close()
+
+
+@pytest.mark.asyncio
+async def test_table_journal_rollback(table):
+    from ravvi_poker.engine.events import Message
+
+    x_table = Table(**table._asdict())
+    journal = x_table.journal
+    for idx in range(2):
+        journal.add(Message(msg_type=Message.Type.GAME_BEGIN, table_id=table.id, game_id=None, idx=idx))
+    # транзакция стола забрала сообщения игры и откатилась: сообщения возвращаются в журнал
+    with pytest.raises(ZeroDivisionError):
+        async with DBI() as db:
+            x_table.take_journal(db)
+            assert not journal.pending
+            1 / 0
+    assert len(journal.pending) == 2
+    await asyncio.sleep(0.5)
+    assert not journal.pending
+
+    async with DBI() as db:
+        rows = await db.get_table_msgs_after(table.id, 0)
+    assert [row.props["idx"] for row in rows] == [0, 1]
+    assert journal.get_stats()["moved"] == 0
+    await journal.close()
+
+
+@pytest.mark.asyncio
+async def test_table_journal_drain(table, monkeypatch):
+    from ravvi_poker.engine.events import Message
+
+    x_table = Table(**table._asdict())
+    journal = x_table.journal
+    journal.RETRY_DELAY = 0.01
+    journal.RETRY_LIMIT = 3
+
+    class X_DBI(DBI):
+        async def __aenter__(self):
+            raise DBI.OperationalError("connection failed")
+
+    monkeypatch.setattr(x_table, "DBI", X_DBI)
+    journal.add(Message(msg_type=Message.Type.GAME_BEGIN, table_id=table.id, game_id=None, idx=0))
+    with pytest.raises(DBI.OperationalError):
+        await journal.drain()
+    # ошибка соединения: сообщение не отбрасывается, транзакции стола его не забирают
+    assert len(journal.pending) == 1
+    assert journal.busy
+    async with DBI() as db:
+        assert x_table.take_journal(db) is None
+        assert not db.table_msgs
+
+    # соединение восстановлено
+    monkeypatch.setattr(x_table, "DBI", DBI)
+    await journal.drain()
+    assert not journal.pending
+    assert not journal.busy
+    stats = journal.get_stats()
+    assert stats["written"] == 1
+    assert stats["dropped"] == 0
+    await journal.close()
+
+
+@pytest.mark.asyncio
+async def test_table_journal_pool_limit(table, monkeypatch):
+    from ravvi_poker.engine.events import Message
+
+    # столы, держащие все соединения пула, не ждут второе соединение для записи журнала
+    monkeypatch.setattr(DBI, "POOL_LIMIT", 2)
+    monkeypatch.setattr(DBI, "POOL_MIN", 0)
+    await DBI.pool_open()
+    try:
+        tables = [Table(**table._asdict()) for _ in range(2)]
+
+        async def emit(x_table, idx):
+            x_table.journal.add(Message(msg_type=Message.Type.GAME_BEGIN, table_id=table.id, game_id=None, idx=idx))
+            async with DBI() as db:
+                await asyncio.sleep(0.1)
+                await x_table.emit_msg(db, Message(msg_type=Message.Type.TABLE_CLOSED, idx=idx + 1))
+
+        await asyncio.wait_for(asyncio.gather(emit(tables[0], 0), emit(tables[1], 10)), timeout=5)
+        for x_table in tables:
+            await x_table.journal.close()
+        assert DBI.pool_stats()["used"] == 0
+    finally:
+        await DBI.pool_close()
@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 from ravvi_poker.engine.events import Message
@@ -109,3 +111,30 @@ def test_message_private_info():
 
     x = Message(msg_type=Message.Type.GAME_BEGIN, table_id=777)
     msg = x.hide_private_info(for_user_id=10)
+
+
+def test_message_private_views():
+    users = [
+        dict(user_id=10, cards_open=False, cards=[11, 12]),
+        dict(user_id=20, cards_open=False, cards=[21, 22]),
+    ]
+    x = Message(id=1, msg_type=Message.Type.TABLE_INFO, table_id=777, client_id=100, users=users)
+    assert x.get_private_user_ids() == {10, 20}
+    # исходное сообщение не изменяется
+    msg = x.hide_private_info(for_user_id=10)
+    assert msg.users[1]['cards'] == [0, 0]
+    assert users[1] == dict(user_id=20, cards_open=False, cards=[21, 22])
+    assert x.hide_private_info(for_user_id=30).users == x.hide_private_info(for_user_id=40).users
+
+    x = Message(msg_type=Message.Type.GAME_PLAYER_MOVE, table_id=777, user_id=10, options=[1, 2, 3])
+    assert x.get_private_user_ids() == {10}
+    assert Message(msg_type=Message.Type.GAME_BEGIN, table_id=777).get_private_user_ids() == set()
+
+
+def test_message_to_json():
+    x = Message(id=1, msg_type=Message.Type.PLAYER_BET, table_id=777, game_id=5, cmd_id=3, client_id=100,
+                user_id=10, bet=1.5, name="игрок")
+    data = x.to_json()
+    assert json.loads(data) == dict(table_id=777, game_id=5, msg_type=204, user_id=10, bet=1.5, name="игрок")
+    # кодируется один раз
+    assert x.to_json() is data
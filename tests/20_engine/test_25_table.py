@@ -57,6 +57,17 @@ async def test_user_lifecycle():
     assert seat_idx is None
     assert all(s is None for s in table.seats)
 
+    # повторный запрос состояния стола
+    async with db:
+        await table.handle_cmd(db, cmd_id=111, user_id=USER_ID, client_id=100, cmd_type=Command.Type.INFO, props={})
+    assert len(db._events) == 1
+    assert db._event.msg_type == Message.Type(TABLE_INFO_EVENT_TYPE)
+    assert db._event.client_id == 100
+    # пользователь не за столом
+    async with db:
+        await table.handle_cmd(db, cmd_id=112, user_id=123456, client_id=100, cmd_type=Command.Type.INFO, props={})
+    assert not db._events
+
     # садимся на место 3 (посадка запрещена)
     async with db:
         await table.handle_cmd(db, cmd_id=12, user_id=USER_ID, client_id=100, cmd_type=Command.Type.TAKE_SEAT,
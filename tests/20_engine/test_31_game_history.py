@@ -0,0 +1,39 @@
+from ravvi_poker.engine.events import Message
+from ravvi_poker.engine.history import HandHistory, decode_hand
+
+
+def test_hand_history():
+    history = HandHistory()
+    history.add(Message(msg_type=Message.Type.GAME_BEGIN, game_type="NLH", game_subtype="REGULAR",
+                        players=[111, 222, 333], dealer_id=111))
+    history.add(Message(msg_type=Message.Type.PLAYER_CARDS, user_id=111, cards=[1, 2], cards_open=False))
+    history.add(Message(msg_type=Message.Type.PLAYER_CARDS, user_id=222, cards=[3, 4], cards_open=False))
+    history.add(Message(msg_type=Message.Type.PLAYER_CARDS, user_id=333, cards=[5, 6], cards_open=False))
+    history.add(Message(msg_type=Message.Type.PLAYER_BET, user_id=222, bet=3, delta=1, amount=1, bank_total=1))
+    history.add(Message(msg_type=Message.Type.PLAYER_BET, user_id=333, bet=4, delta=2, amount=2, bank_total=3))
+    history.add(Message(msg_type=Message.Type.GAME_CARDS, boards=[dict(board_type=1, cards=[7, 8, 9])]))
+    history.add(Message(msg_type=Message.Type.PLAYER_CARDS, user_id=333, cards=[5, 6], cards_open=True))
+    history.add(Message(msg_type=Message.Type.ROUND_RESULT, rewards=[dict(user_id=333, amount=3)], banks=[3],
+                        bank_total=0))
+    history.add(Message(msg_type=Message.Type.GAME_RESULT, balances=[dict(user_id=333, balance=101)]))
+    history.add(Message(msg_type=Message.Type.GAME_END))
+
+    data = history.encode()
+    assert isinstance(data, bytes)
+
+    hand = decode_hand(data)
+    assert hand["game_type"] == "NLH"
+    assert hand["dealer_id"] == 111
+    assert hand["users"] == [111, 222, 333]
+    assert hand["cards"] == {111: [1, 2], 222: [3, 4], 333: [5, 6]}
+    assert hand["boards"] == [[1, [7, 8, 9]]]
+    assert hand["actions"] == [
+        dict(user_id=222, bet=3, delta=1, amount=1, bank_total=1),
+        dict(user_id=333, bet=4, delta=2, amount=2, bank_total=3),
+    ]
+    assert hand["results"][0]["bank_total"] == 0
+    assert hand["balances"] == [dict(user_id=333, balance=101)]
+
+    # закрытые карты соперников не видны
+    hand = decode_hand(data, user_id=111)
+    assert hand["cards"] == {111: [1, 2], 222: [], 333: [5, 6]}
@@ -75,6 +75,8 @@ async def test_table_manager(engine):
     await asyncio.sleep(1)
     assert user_1.id in x_table.users
     assert user_1.id in [u.id for u in x_table.seats if u]
+    # клиент команды в кеше до закрытия
+    assert engine.clients_info[client_1.id][1].user_id == user_1.id
 
     user_2 = await create_user()
     client_2 = await create_client(user_2)
@@ -86,3 +88,53 @@ async def test_table_manager(engine):
     await asyncio.sleep(10)
     await engine.stop()
     assert not engine.tables
+
+
+@pytest.mark.asyncio
+async def test_table_manager_client_closed(engine):
+    async with DBI() as db:
+        await db.dbi.execute('UPDATE table_profile SET closed_ts=now_utc()')
+    table = await create_table()
+    await engine.start()
+    x_table = engine.tables[table.id]
+
+    user = await create_user()
+    client = await create_client(user)
+    # оповещения о JOIN и закрытии клиента приходят подряд, JOIN еще в очереди стола
+    async with DBI() as db:
+        await db.create_table_cmd(client_id=client.id, table_id=table.id, cmd_type=11, props=dict(take_seat=True))
+        await db.close_client(client.id)
+    await asyncio.sleep(2)
+    assert not engine.listener.queues
+
+    # закрытие обработано после JOIN: за пользователем не осталось закрытого клиента
+    x_user = x_table.users[user.id]
+    assert client.id not in x_user.clients
+    assert not x_user.connected
+
+    await engine.stop()
+    assert not engine.tables
+
+
+@pytest.mark.asyncio
+async def test_table_manager_clients_info(engine, monkeypatch):
+    monkeypatch.setattr(engine, "CLIENTS_INFO_LIMIT", 2)
+    clients = [await create_client(await create_user()) for _ in range(3)]
+    async with DBI() as db:
+        for client in clients:
+            assert (await engine.get_client_info(db, client.id)).client_id == client.id
+    # размер ограничен: удаляется самая старая запись
+    assert list(engine.clients_info) == [clients[1].id, clients[2].id]
+
+    # запись с истекшим временем жизни читается заново
+    monkeypatch.setattr(engine, "CLIENTS_INFO_TTL", 0)
+    async with DBI() as db:
+        await db.close_client(clients[2].id)
+        assert (await engine.get_client_info(db, clients[2].id)).closed_ts
+    assert list(engine.clients_info) == [clients[1].id]
+
+    # при переподключении кеш сбрасывается
+    async with DBI() as db:
+        await db.dbi.execute('UPDATE table_profile SET closed_ts=now_utc()')
+    await engine.on_listen(None)
+    assert not engine.clients_info
@@ -4,7 +4,7 @@ import pytest_asyncio
 import asyncio
 
 from ravvi_poker.db import DBI
-from ravvi_poker.engine.events import Message
+from ravvi_poker.engine.events import Command, Message
 from ravvi_poker.engine.clients import ClientsManager, ClientBase, ClientQueue
 
 log = logging.getLogger(__name__)
@@ -127,3 +127,161 @@ async def test_client_queue(clients_manager: ClientsManager):
     subscribers = clients_manager.table_subscribers.get(table.id, None)
     assert subscribers
     assert x.client_id in subscribers
+
+
+@pytest.mark.asyncio
+async def test_client_large_msg(clients_manager: ClientsManager):
+    table = await create_table()
+    user = await create_user()
+    client = await create_client(user)
+    x = X_ClientBase(clients_manager, client.id, user.id)
+    await x.start()
+    # сообщение больше лимита оповещения читается из table_msg
+    async with DBI() as db:
+        row = await db.create_table_msg(client_id=x.client_id, table_id=table.id, game_id=None, msg_type=Message.Type.TABLE_INFO, props=dict(text="x" * 10000))
+    await asyncio.sleep(1)
+
+    assert x.messages
+    msg = x.messages[0]
+    assert msg.id == row.id
+    assert msg.text == "x" * 10000
+
+
+@pytest.mark.asyncio
+async def test_dispatch_views():
+    manager = ClientsManager()
+    clients = [X_ClientBase(manager, client_id, user_id) for client_id, user_id in [(1, 10), (2, 20), (3, 30), (4, 10)]]
+    for x in clients:
+        await x.start()
+        manager.subscribe(x, 777)
+
+    msg = Message(msg_type=Message.Type.PLAYER_CARDS, table_id=777, user_id=10, cards_open=False, cards=[11, 12])
+    await manager.dispatch_msg(msg)
+    received = [x.messages[0] for x in clients]
+    # личный вид для всех клиентов пользователя 10, публичный вид один для остальных
+    assert received[0] is received[3]
+    assert received[0].cards == [11, 12]
+    assert received[1] is received[2]
+    assert received[1].cards == [0, 0]
+
+
+@pytest.mark.asyncio
+async def test_client_table_channel(clients_manager: ClientsManager):
+    table = await create_table()
+    user = await create_user()
+    client = await create_client(user)
+    x = X_ClientBase(clients_manager, client.id, user.id)
+    await x.start()
+
+    # подписка по TABLE_INFO, сообщение стола в той же транзакции читается после LISTEN канала стола
+    async with DBI() as db:
+        db.add_table_msg(client_id=x.client_id, table_id=table.id, game_id=None, msg_type=Message.Type.TABLE_INFO, props=dict(table_redirect_id=table.id))
+        db.add_table_msg(table_id=table.id, game_id=None, msg_type=Message.Type.GAME_BEGIN, props=dict(idx=1))
+    await asyncio.sleep(1)
+    assert f"table_msg_{table.id}" in clients_manager.listener.channels
+    async with DBI() as db:
+        db.add_table_msg(table_id=table.id, game_id=None, msg_type=Message.Type.GAME_END, props=dict(idx=2))
+    await asyncio.sleep(1)
+    assert [msg.msg_type for msg in x.messages] == [Message.Type.TABLE_INFO, Message.Type.GAME_BEGIN, Message.Type.GAME_END]
+
+    # после отписки последнего клиента канал стола не слушается
+    clients_manager.unsubscribe(x, table.id)
+    assert f"table_msg_{table.id}" not in clients_manager.listener.channels
+    assert table.id not in clients_manager.table_channels
+
+
+@pytest.mark.asyncio
+async def test_client_replay(clients_manager: ClientsManager):
+    table = await create_table()
+    user = await create_user()
+    client = await create_client(user)
+    x = X_ClientBase(clients_manager, client.id, user.id)
+    await x.start()
+    async with DBI() as db:
+        db.add_table_msg(client_id=x.client_id, table_id=table.id, game_id=None, msg_type=Message.Type.TABLE_INFO, props=dict(table_redirect_id=table.id))
+    await asyncio.sleep(1)
+    assert f"table_msg_{table.id}" in clients_manager.listener.channels
+
+    # сообщения, отправленные при обрыве соединения слушателя, доставляются после переподключения
+    async with DBI() as db:
+        await db.dbi.execute("SELECT pg_terminate_backend(%s)", (clients_manager.listener.pg_backend_pid,))
+        db.add_table_msg(table_id=table.id, game_id=None, msg_type=Message.Type.GAME_BEGIN, props=dict(idx=1))
+        db.add_table_msg(client_id=x.client_id, table_id=table.id, game_id=None, msg_type=Message.Type.PLAYER_BALANCE, props=dict(balance=1))
+    await asyncio.sleep(3)
+    assert [msg.msg_type for msg in x.messages] == [Message.Type.TABLE_INFO, Message.Type.GAME_BEGIN, Message.Type.PLAYER_BALANCE]
+
+
+@pytest.mark.asyncio
+async def test_client_table_status(clients_manager: ClientsManager):
+    table = await create_table()
+    user = await create_user()
+    client = await create_client(user)
+    x = X_ClientBase(clients_manager, client.id, user.id)
+    await x.start()
+
+    # стол не запущен: ошибка, статус в кеше
+    await x.send_cmd(dict(table_id=table.id, cmd_type=Command.Type.JOIN, take_seat=True))
+    assert [msg.msg_type for msg in x.messages] == [Message.Type.TABLE_ERROR]
+    assert clients_manager.tables_status[table.id] == table.engine_status
+
+    # смена статуса сбрасывает кеш
+    async with DBI() as db:
+        await db.dbi.execute("UPDATE table_profile SET engine_status=5 WHERE id=%s", (table.id,))
+    await asyncio.sleep(1)
+    assert table.id not in clients_manager.tables_status
+    await x.send_cmd(dict(table_id=table.id, cmd_type=Command.Type.JOIN, take_seat=True))
+    assert [msg.msg_type for msg in x.messages] == [Message.Type.TABLE_ERROR]
+    assert clients_manager.tables_status[table.id] == 5
+
+    # при переподключении кеш сбрасывается (оповещения о статусе за это время не повторяются)
+    await clients_manager.on_listen(None)
+    assert not clients_manager.tables_status
+
+
+@pytest.mark.asyncio
+async def test_client_queue_coalesce():
+    manager = ClientsManager()
+    x = X_ClientQueue(manager, 1, 10)
+    x.tables.add(777)
+    # клиент не успевает отправлять: цикл очереди не запущен
+    await x.handle_msg(Message(msg_type=Message.Type.TABLE_INFO, table_id=777, idx=1))
+    await x.handle_msg(Message(msg_type=Message.Type.GAME_PLAYER_MOVE, table_id=777, idx=2))
+    await x.handle_msg(Message(msg_type=Message.Type.PLAYER_BET, table_id=777, idx=3))
+    await x.handle_msg(Message(msg_type=Message.Type.PLAYER_BALANCE, table_id=777, user_id=10, idx=4))
+    await x.handle_msg(Message(msg_type=Message.Type.PLAYER_BALANCE, table_id=777, user_id=20, idx=5))
+    await x.handle_msg(Message(msg_type=Message.Type.GAME_PLAYER_MOVE, table_id=777, idx=6))
+    await x.handle_msg(Message(msg_type=Message.Type.PLAYER_BALANCE, table_id=777, user_id=10, idx=7))
+    assert x.get_stats()["depth"] == 5
+    assert x.get_stats()["coalesced"] == 2
+
+    await x.start()
+    await x.shutdown()
+    await x.wait_done()
+    assert [msg.idx for msg in x.messages] == [1, 3, 5, 6, 7]
+    assert x.get_stats()["sent"] == 5
+
+
+@pytest.mark.asyncio
+async def test_client_queue_resync():
+    commands = []
+
+    class X_ClientQueueResync(X_ClientQueue):
+        MSG_QUEUE_LIMIT = 10
+
+        async def send_cmd(self, cmd):
+            commands.append(cmd)
+
+    manager = ClientsManager()
+    x = X_ClientQueueResync(manager, 1, 10)
+    x.tables.add(777)
+    for idx in range(15):
+        await x.handle_msg(Message(msg_type=Message.Type.PLAYER_BET, table_id=777, idx=idx))
+    # очередь сброшена, вместо нее запрашивается TABLE_INFO
+    assert x.get_stats()["depth"] == 4
+    assert x.get_stats()["resync"] == 1
+
+    await x.start()
+    await x.shutdown()
+    await x.wait_done()
+    assert [(cmd.table_id, cmd.cmd_type) for cmd in commands] == [(777, Command.Type.INFO)]
+    assert [msg.idx for msg in x.messages] == [11, 12, 13, 14]
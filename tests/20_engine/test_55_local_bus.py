@@ -0,0 +1,176 @@
+import logging
+import pytest
+import pytest_asyncio
+import asyncio
+
+from ravvi_poker.db import DBI
+from ravvi_poker.engine.bus import local_bus
+from ravvi_poker.engine.events import Command, Message
+from ravvi_poker.engine.clients import ClientsManager, ClientQueue
+from ravvi_poker.engine.tables import TablesManager
+
+log = logging.getLogger(__name__)
+
+
+async def create_user():
+    async with DBI() as db:
+        user = await db.create_user()
+    return user
+
+
+async def create_client(user):
+    async with DBI() as db:
+        device = await db.create_device()
+        login = await db.create_login(device.id, user.id, host="127.0.0.1")
+        session = await db.create_session(login.id, host="127.0.0.1")
+        client = await db.create_client(session.id)
+    return client
+
+
+async def create_table():
+    async with DBI() as db:
+        table = await db.create_table(table_type="RG", table_seats=9, table_name="PUBLIC",
+                                      game_type="NLH", game_subtype="REGULAR", club_id=0,
+                                      props=dict(
+                                          bet_timeout=1,
+                                          buyin_min=10,
+                                          buyin_max=20
+                                      ))
+    return table
+
+
+class X_ClientQueue(ClientQueue):
+
+    def __init__(self, manager, client_id, user_id) -> None:
+        super().__init__(manager, client_id, user_id)
+        self.messages: list[Message] = []
+
+    async def on_msg(self, msg: Message):
+        self.log.info("msg: %s", msg)
+        self.messages.append(msg)
+
+
+@pytest_asyncio.fixture()
+async def managers():
+    await DBI.pool_open()
+    # закрыть все существующие столы (невидимы для engine manager)
+    async with DBI() as db:
+        await db.dbi.execute('UPDATE table_profile SET closed_ts=now_utc()')
+    engine = TablesManager()
+    clients = ClientsManager()
+    yield engine, clients
+    await clients.stop()
+    await engine.stop()
+    await DBI.pool_close()
+    await asyncio.sleep(1)
+
+
+@pytest.mark.asyncio
+async def test_local_bus(managers):
+    engine, clients = managers
+    table = await create_table()
+    await engine.start()
+    await clients.start()
+    assert local_bus.is_active
+    assert local_bus.get_table(table.id) is engine.tables[table.id]
+    x_table = engine.tables[table.id]
+
+    user = await create_user()
+    client = await create_client(user)
+    x = X_ClientQueue(clients, client.id, user.id)
+    await x.start()
+
+    # команда обработана столом напрямую
+    await x.send_cmd(dict(table_id=table.id, cmd_type=Command.Type.JOIN, take_seat=True))
+    assert user.id in [u.id for u in x_table.seats if u]
+    await asyncio.sleep(0.1)
+
+    # сообщения доставлены напрямую (без id из table_msg)
+    assert x.messages
+    msg = x.messages[0]
+    assert msg.msg_type == Message.Type.TABLE_INFO
+    assert msg.id is None
+    assert table.id in x.tables
+
+    # запись для аудита
+    await clients.stop()
+    assert not local_bus.is_active
+    async with DBI() as db:
+        async with db.cursor() as cursor:
+            await cursor.execute("SELECT * FROM table_cmd WHERE table_id=%s", (table.id,))
+            rows = await cursor.fetchall()
+            assert len(rows) == 1
+            assert rows[0].client_id == client.id
+            assert rows[0].processed_ts
+            await cursor.execute("SELECT * FROM table_msg WHERE table_id=%s AND client_id=%s ORDER BY id",
+                                 (table.id, client.id))
+            rows = await cursor.fetchall()
+            assert rows
+            assert rows[0].msg_type == Message.Type.TABLE_INFO
+
+
+@pytest.mark.asyncio
+async def test_local_bus_transaction(managers):
+    engine, clients = managers
+    table = await create_table()
+    await engine.start()
+    await clients.start()
+
+    user = await create_user()
+    client = await create_client(user)
+    x = X_ClientQueue(clients, client.id, user.id)
+    await x.start()
+
+    def error_msg(idx):
+        return Message(msg_type=Message.Type.TABLE_ERROR, table_id=table.id, game_id=None, client_id=client.id,
+                       error_code=idx, error_text="")
+
+    # сообщение стола доставляется после фиксации транзакции
+    async with DBI() as db:
+        await local_bus.emit_msg(error_msg(1), db)
+        await asyncio.sleep(0.1)
+        assert not x.messages
+    await asyncio.sleep(0.1)
+    assert [msg.error_code for msg in x.messages] == [1]
+
+    # при откате сообщение стола не отправляется, сообщение игры за ним доставляется
+    with pytest.raises(ZeroDivisionError):
+        async with DBI() as db:
+            await local_bus.emit_msg(error_msg(2), db)
+            await local_bus.emit_msg(error_msg(3), db, transactional=False)
+            1 / 0
+    await asyncio.sleep(0.1)
+    assert [msg.error_code for msg in x.messages] == [1, 3]
+
+    # сообщение игры без сообщений стола в транзакции доставляется сразу
+    async with DBI() as db:
+        await local_bus.emit_msg(error_msg(4), db, transactional=False)
+        await asyncio.sleep(0.1)
+        assert [msg.error_code for msg in x.messages] == [1, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_local_bus_audit_retry(managers, monkeypatch):
+    import ravvi_poker.engine.bus
+
+    table = await create_table()
+    failures = []
+
+    class X_DBI(DBI):
+        async def __aenter__(self):
+            if len(failures) < 2:
+                failures.append(1)
+                raise DBI.OperationalError("connection failed")
+            return await super().__aenter__()
+
+    monkeypatch.setattr(ravvi_poker.engine.bus, "DBI", X_DBI)
+    monkeypatch.setattr(local_bus, "AUDIT_RETRY_DELAY", 0.01)
+    monkeypatch.setattr(local_bus, "AUDIT_RETRY_LIMIT", 2)
+    # ошибка соединения: пакет записывается повторно, а не теряется
+    batch = [("msg", dict(table_id=table.id, game_id=None, msg_type=Message.Type.TABLE_CLOSED, props=dict(idx=idx)))
+             for idx in range(2)]
+    await local_bus.audit_write(batch)
+    assert len(failures) == 2
+    async with DBI() as db:
+        rows = await db.get_table_msgs_after(table.id, 0)
+    assert [row.props["idx"] for row in rows] == [0, 1]
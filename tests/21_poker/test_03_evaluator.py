@@ -0,0 +1,143 @@
+import random
+from itertools import combinations
+
+import pytest
+
+from ravvi_poker.engine.cards import Card, Deck
+from ravvi_poker.engine.poker.base import PokerBase
+from ravvi_poker.engine.poker.board import Board, BoardType
+from ravvi_poker.engine.poker.evaluator import HandEvaluator, LowHandEvaluator
+from ravvi_poker.engine.poker.hands import Hand, HandType, LowHand
+from ravvi_poker.engine.poker.nlh import Poker_NLH_6P
+
+board = Board(BoardType.BOARD1)
+
+
+def x_best_hand(cards, hand_rank, deck36):
+    # эталон: перебор всех комбинаций через Hand
+    results = []
+    for h in combinations(cards, min(5, len(cards))):
+        hand = Hand(h, board, deck36=deck36)
+        results.append((hand_rank.index(hand.type[0]), *hand.type[1:]))
+    return max(results)
+
+
+def test_evaluator_samples():
+    evaluator = HandEvaluator.get(PokerBase.GAME_HAND_RANK)
+    codes = lambda x: [Card(c).code for c in x]
+
+    assert evaluator.get_type(evaluator.evaluate(codes(["A♠", "A♣"]))) == (HandType.ONE_PAIR, 14)
+    assert evaluator.get_type(evaluator.evaluate(codes(["2♠", "A♣", "4♣", "5♦", "3♥", "K♥", "K♦"]))) == \
+           (HandType.STRAIGHT, 5)
+    assert evaluator.get_type(evaluator.evaluate(codes(["2♠", "2♣", "2♦", "5♦", "5♥", "K♥", "K♦"]))) == \
+           (HandType.FULL_HOUSE, 2, 13)
+    assert evaluator.get_type(evaluator.evaluate(codes(["2♠", "2♣", "5♦", "5♥", "K♥", "K♦", "3♠"]))) == \
+           (HandType.TWO_PAIRS, 13, 5, 3)
+
+
+@pytest.mark.parametrize("hand_rank, deck_type", [
+    (PokerBase.GAME_HAND_RANK, 52),
+    (PokerBase.GAME_HAND_RANK, 36),
+    (Poker_NLH_6P.GAME_HAND_RANK, 36),
+])
+def test_evaluator_vs_hand(hand_rank, deck_type):
+    deck36 = deck_type == 36
+    evaluator = HandEvaluator.get(hand_rank, deck36=deck36)
+    rng = random.Random(deck_type)
+    deck = list(Deck(deck_type))
+    for n in [2, 3, 5, 6, 7, 7, 7]:
+        samples = [rng.sample(deck, n) for _ in range(300)]
+        results = []
+        for cards in samples:
+            expected = x_best_hand(cards, hand_rank, deck36)
+            rank = evaluator.evaluate(cards)
+            hand_type = evaluator.get_type(rank)
+            assert (hand_rank.index(hand_type[0]), *hand_type[1:]) == expected, cards
+            # карты комбинации по рангам - первая комбинация с этим результатом
+            combination = next(h for h in combinations(cards, min(5, n)) if evaluator.evaluate(h) == rank)
+            assert sorted(evaluator.get_cards(rank, cards)) == sorted(combination), cards
+            results.append((rank, expected))
+        # порядок чисел совпадает с порядком кортежей
+        assert sorted(results, key=lambda x: x[0]) == sorted(results, key=lambda x: (x[1], x[0]))
+
+
+@pytest.mark.parametrize("player_cards_num", [4, 5, 6])
+def test_evaluator_omaha(player_cards_num):
+    evaluator = HandEvaluator.get(PokerBase.GAME_HAND_RANK)
+    rng = random.Random(player_cards_num)
+    for board_cards_num in [0, 3, 4, 5]:
+        for _ in range(100):
+            cards = rng.sample(range(1, 53), player_cards_num + board_cards_num)
+            player_cards, board_cards = cards[:player_cards_num], cards[player_cards_num:]
+            expected = None
+            for pc in combinations(player_cards, 2):
+                for gc in (combinations(board_cards, 3) if board_cards else [()]):
+                    rank = evaluator.evaluate(pc + gc)
+                    if expected is None or rank > expected[0]:
+                        expected = rank, pc + gc
+            assert evaluator.evaluate_omaha(player_cards, board_cards) == expected
+
+
+def test_low_evaluator_omaha():
+    low_hand_rank = PokerBase.GAME_LOW_HAND_RANK
+    evaluator = LowHandEvaluator.get(low_hand_rank)
+    # колода с большим количеством low карт, чтобы чаще собирались low руки
+    low_deck = [c for c in range(1, 53) if Card(c).rank <= 8 or Card(c).rank == 14]
+    rng = random.Random(8)
+    for deck in [low_deck, list(range(1, 53))]:
+        for board_cards_num in [3, 4, 5]:
+            for _ in range(200):
+                cards = rng.sample(deck, 4 + board_cards_num)
+                player_cards, board_cards = cards[:4], cards[4:]
+                expected = None
+                for pc in combinations(player_cards, 2):
+                    for gc in combinations(board_cards, 3):
+                        hand = LowHand(pc + gc, board)
+                        if hand.type is None:
+                            continue
+                        rank = len(low_hand_rank) - low_hand_rank.index(hand.type[0])
+                        if expected is None or rank > expected[0]:
+                            expected = rank, pc + gc
+                assert evaluator.evaluate_omaha(player_cards, board_cards) == expected
+
+
+def test_rank_showdown():
+    from ravvi_poker.engine.poker.plo import Poker_PLO_4
+    from helpers.mocked_table import MockedTable
+    from ravvi_poker.engine.user import User
+
+    rng = random.Random(5)
+    users = [User(x, f"u{x}", None) for x in [111, 222, 333]]
+    for game_class, player_cards_num in [(PokerBase, 2), (Poker_PLO_4, 4)]:
+        game = game_class(MockedTable(), users)
+        for _ in range(50):
+            cards = rng.sample(range(1, 53), 3 * player_cards_num + 10)
+            players_cards = [cards[i * player_cards_num:(i + 1) * player_cards_num] for i in range(3)]
+            boards_cards = [cards[-10:-5], cards[-5:]]
+            ranks = game.get_players_ranks(players_cards, boards_cards, with_low=True)
+            for player_cards, player_ranks in zip(players_cards, ranks):
+                expected = []
+                for board_cards in boards_cards:
+                    board = Board(BoardType.BOARD1)
+                    board.cards = board_cards
+                    expected.append(game.get_best_hand(player_cards, board).rank)
+                    low_hand = game.get_best_low_hand_combination(player_cards, board)
+                    expected.append(low_hand[0] if low_hand else 0)
+                assert player_ranks == expected
+
+
+def test_showdown_ranks():
+    from ravvi_poker.engine.benchmark import VARIANTS, create_game
+
+    # ранги вскрытия совпадают с рангами рук игроков (p.hands) для всех вариантов
+    rng = random.Random(3)
+    for variant in VARIANTS:
+        for _ in range(20):
+            game = create_game(variant, rng, 6)
+            ranks = game.get_showdown_ranks(game.players)
+            for p in game.players:
+                p.fill_player_hands(game.get_best_hand, game.boards)
+                assert ranks[p.user_id] == [h.rank if h else 0 for h in p.hands]
+            # руки уже посчитаны: ранги берутся из p.hands без повторного ранжирования
+            game.get_players_ranks = None
+            assert game.get_showdown_ranks(game.players) == ranks
@@ -0,0 +1,137 @@
+import os
+import random
+
+import pytest
+from helpers.mocked_table import MockedTable
+from helpers.x_game_case import create_game_case, load_case_data
+
+from ravvi_poker.engine.cards import Card
+from ravvi_poker.engine.poker.base import PokerBase
+from ravvi_poker.engine.poker.equity import EquityCalculator, calc_equity
+from ravvi_poker.engine.poker.evaluator import HandEvaluator
+from ravvi_poker.engine.poker.plo import Poker_PLO_4
+
+DECK = list(range(1, 53))
+NLH_OPTIONS = dict(hand_rank=tuple(PokerBase.GAME_HAND_RANK))
+
+
+def codes(*cards):
+    return [Card(c).code for c in cards]
+
+
+def test_equity_exact():
+    players_cards = [codes("A♠", "A♣"), codes("K♦", "K♥"), codes("Q♦", "J♦")]
+    board_cards = codes("2♦", "7♦", "K♠", "3♣")
+    result = calc_equity(players_cards, [board_cards], DECK, **NLH_OPTIONS)
+    assert result["exact"]
+    assert result["runouts"] == 52 - 10
+
+    # эталон: перебор ривера
+    evaluator = HandEvaluator.get(PokerBase.GAME_HAND_RANK)
+    wins = [0, 0, 0]
+    for card in set(DECK) - set(board_cards).union(*players_cards):
+        ranks = [evaluator.evaluate(cards + board_cards + [card]) for cards in players_cards]
+        wins[ranks.index(max(ranks))] += 1
+    assert result["win"] == [round(x / 42, 4) for x in wins]
+    assert result["equity"] == result["win"]
+    assert result["tie"] == [0, 0, 0]
+
+
+def test_equity_split():
+    # на борде стрит, банк делится всегда
+    players_cards = [codes("2♠", "3♠"), codes("2♣", "3♣")]
+    board_cards = codes("T♦", "J♦", "Q♥", "K♣", "A♠")[:4]
+    result = calc_equity(players_cards, [board_cards], DECK, **NLH_OPTIONS)
+    assert result["equity"] == [0.5, 0.5]
+    assert result["tie"] == [1, 1]
+    assert result["win"] == [0, 0]
+
+
+def test_equity_monte_carlo():
+    players_cards = [codes("A♠", "A♣"), codes("K♦", "K♥")]
+    result = calc_equity(players_cards, [[]], DECK, seed=7, time_budget=10, **NLH_OPTIONS)
+    assert not result["exact"]
+    assert result["runouts"] == 20000
+    assert abs(result["equity"][0] - 0.82) < 0.02
+    assert sum(result["equity"]) == pytest.approx(1, abs=0.001)
+    # с тем же seed результат повторяется
+    assert calc_equity(players_cards, [[]], DECK, seed=7, time_budget=10, **NLH_OPTIONS) == result
+
+
+def test_equity_plo_hi_low_double_board():
+    rng = random.Random(4)
+    options = dict(hand_rank=tuple(Poker_PLO_4.GAME_HAND_RANK), low_hand_rank=tuple(PokerBase.GAME_LOW_HAND_RANK),
+                   omaha=True)
+    for _ in range(5):
+        cards = rng.sample(DECK, 3 * 4 + 8)
+        players_cards = [cards[i * 4:(i + 1) * 4] for i in range(3)]
+        boards_cards = [cards[12:16], cards[16:20]]
+        result = calc_equity(players_cards, boards_cards, DECK, **options)
+        assert result["exact"]
+        assert result["runouts"] == (52 - 20) * (52 - 21)
+        assert sum(result["equity"]) == pytest.approx(1, abs=0.001)
+
+
+def test_equity_time_budget():
+    players_cards = [codes("A♠", "A♣"), codes("K♦", "K♥"), codes("Q♦", "J♦")]
+    result = calc_equity(players_cards, [[], []], DECK, time_budget=0.01, **NLH_OPTIONS)
+    assert not result["exact"]
+    assert 0 < result["runouts"] < 20000
+
+
+@pytest.mark.asyncio
+async def test_equity_calculator():
+    calculator = EquityCalculator(max_workers=1)
+    players_cards = [codes("A♠", "A♣"), codes("K♦", "K♥")]
+    try:
+        result = await calculator.calc(players_cards, [codes("2♦", "7♦", "K♠")], DECK, time_budget=5,
+                                       **NLH_OPTIONS)
+        assert result == calc_equity(players_cards, [codes("2♦", "7♦", "K♠")], DECK, **NLH_OPTIONS)
+        # кеш не зависит от порядка карт
+        cached = await calculator.calc([codes("A♣", "A♠"), codes("K♦", "K♥")], [codes("K♠", "2♦", "7♦")], DECK,
+                                       **NLH_OPTIONS)
+        assert cached is result
+    finally:
+        calculator.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_game_equity():
+    X_Game = create_game_case(PokerBase)
+    X_Game.GAME_TYPE = 'TEST'
+    X_Game.GAME_SUBTYPE = 'TEST'
+    X_Game.EQUITY_ENABLED = True
+    X_Game.EQUITY_TIME_BUDGET = 5
+
+    # олл-ин на префлопе: эквити после каждой улицы кроме ривера
+    kwargs = load_case_data(os.path.join(os.path.dirname(__file__), 'cases'), 'case-03-allin.json')
+    moves = []
+    rounds = 0
+    for step in kwargs["_moves"]:
+        if step["type"] == "GAME_ROUND":
+            rounds += 1
+            if rounds < 4:
+                moves.append({"type": "GAME_EQUITY"})
+        moves.append(step)
+    kwargs["_moves"] = moves
+
+    equities = []
+
+    class X_GameEquity(X_Game):
+        async def broadcast_GAME_EQUITY(self, db, equities_, **kwargs):
+            equities.append(equities_)
+            await super().broadcast_GAME_EQUITY(db, equities_, **kwargs)
+
+    game = X_GameEquity(MockedTable(), **kwargs)
+    await game.run()
+    assert not game._check_steps
+
+    assert len(equities) == 3
+    for item in equities:
+        assert {x["user_id"] for x in item} == {111, 333, 444, 777}
+        assert sum(x["equity"] for x in item) == pytest.approx(1, abs=0.001)
+    # терн J♠Q♠K♠A♠: у 5♠9♠ старший флеш, делёж только на T♠ (роял-флеш на борде)
+    turn = {x["user_id"]: x for x in equities[2]}
+    assert turn[111]["win"] == 0.975
+    assert [turn[user_id]["tie"] for user_id in [111, 333, 444, 777]] == [0.025] * 4
+    assert [turn[user_id]["win"] for user_id in [333, 444, 777]] == [0] * 3
@@ -0,0 +1,42 @@
+import json
+import random
+
+import pytest
+
+from ravvi_poker.engine.benchmark import OPERATIONS, VARIANTS, check_variant, create_game, format_report, run_benchmark
+
+
+def test_benchmark_deals_seeded():
+    for variant in VARIANTS:
+        game1 = create_game(variant, random.Random(1), 6)
+        game2 = create_game(variant, random.Random(1), 6)
+        assert [p.cards for p in game1.players] == [p.cards for p in game2.players]
+        assert [b.cards for b in game1.boards] == [b.cards for b in game2.boards]
+        assert [p.bet_total for p in game1.players] == [p.bet_total for p in game2.players]
+        assert len([p for p in game1.players if p.in_the_game]) >= 2
+
+
+def test_benchmark_report():
+    report = run_benchmark(deals=3, seed=5, players_num=4)
+    assert set(report["results"]) == set(VARIANTS)
+    for variant, results in report["results"].items():
+        boards_num = 2 if "double_board" in variant or "bomb_pot" in variant else 1
+        assert results["get_best_hand"]["calls"] == 3 * 4 * boards_num
+        assert results["get_rounds_results"]["calls"] == 3
+        for op in OPERATIONS:
+            assert results[op]["ops_per_sec"] > 0
+    assert json.loads(format_report(report, as_json=True)) == report
+    assert "plo6" in format_report(report)
+
+
+def test_benchmark_deck_size():
+    # 7 игроков PLO6: 42 карты игроков и 5 карт борда
+    game = create_game("plo6", random.Random(1), 7)
+    assert len({c for p in game.players for c in p.cards}) == 42
+    with pytest.raises(ValueError, match="max 7 players"):
+        check_variant("plo6", 9)
+    with pytest.raises(ValueError):
+        create_game("plo6", random.Random(1), 9)
+    with pytest.raises(ValueError):
+        check_variant("nlh", 1)
+    check_variant("plo5", 9)
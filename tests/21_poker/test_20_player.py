@@ -46,3 +46,32 @@ def test_21_player_role():
     assert PlayerRole.DEALER in role
     assert PlayerRole.SMALL_BLIND in role
     assert PlayerRole.BIG_BLIND not in role
+
+
+def test_21_player_fill_hands():
+    from ravvi_poker.engine.poker.base import PokerBase
+    from ravvi_poker.engine.poker.board import Board, BoardType
+    from helpers.mocked_table import MockedTable
+
+    users = [User(x, f"u{x}", None) for x in [111, 222]]
+    game = PokerBase(MockedTable(), users)
+    board = Board(BoardType.BOARD1)
+    p = Player(users[0])
+    p.cards = [1, 14]
+
+    for card in [27, 5, 9, 40, 13]:
+        board.append_card(card)
+        if len(board.cards) < 3:
+            continue
+        p.fill_player_hands(game.get_best_hand, [board])
+        # пересчет с нуля по новому борду дает тот же результат
+        fresh_board = Board(BoardType.BOARD1)
+        fresh_board.cards = list(board.cards)
+        expected = game.get_best_hand(p.cards, fresh_board)
+        assert p.hands[0].rank == expected.rank
+        assert [c.code for c in p.hands[0].cards] == [c.code for c in expected.cards]
+
+    # на вскрытии руки не пересчитываются
+    hands = p.hands
+    p.fill_player_hands(game.get_best_hand, [board])
+    assert p.hands is hands
@@ -0,0 +1,17 @@
+from starlette.status import HTTP_200_OK, HTTP_404_NOT_FOUND
+from fastapi.testclient import TestClient
+from ravvi_poker.api.auth.types import UserAccessProfile
+
+
+def test_games_history(api_client: TestClient, api_guest: UserAccessProfile):
+    api_client.headers = {"Authorization": "Bearer " + api_guest.access_token}
+
+    response = api_client.get("/api/v1/games/history")
+    assert response.status_code == HTTP_200_OK
+    assert response.json() == []
+
+    response = api_client.get("/api/v1/games/history", params=dict(limit=1000))
+    assert response.status_code == 422
+
+    response = api_client.get("/api/v1/games/0/history")
+    assert response.status_code == HTTP_404_NOT_FOUND
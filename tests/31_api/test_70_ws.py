@@ -46,3 +46,25 @@ def test_ws_join(api_client: TestClient, api_guest: UserAccessProfile, table):
     assert msg.get('msg_type') == 102
     assert msg.get('table_id') == table.id
 
+
+
+def test_ws_stats(api_client: TestClient, api_guest: UserAccessProfile, api_guest_2: UserAccessProfile):
+    from types import SimpleNamespace
+    from ravvi_poker.api.ws import manager
+
+    def x_client(client_id, user_id):
+        stats = dict(client_id=client_id, user_id=user_id, depth=0)
+        return SimpleNamespace(user_id=user_id, get_stats=lambda: stats)
+
+    user_id, user_id_2 = api_guest.user.id, api_guest_2.user.id
+    clients = {-1: x_client(-1, user_id), -2: x_client(-2, user_id_2)}
+    manager.clients.update(clients)
+    try:
+        api_client.headers = {"Authorization": "Bearer " + api_guest.access_token}
+        response = api_client.get("/api/v1/ws/stats")
+        assert response.status_code == 200
+        # клиенты других пользователей не видны
+        assert [x["client_id"] for x in response.json()] == [-1]
+    finally:
+        for client_id in clients:
+            manager.clients.pop(client_id, None)
@@ -19,7 +19,9 @@ class X_DBI:
     def check_methods_compatibility(cls):
         check_func_args(cls.create_game, DBI.create_game)
         check_func_args(cls.close_game, DBI.close_game)
+        check_func_args(cls.create_game_history, DBI.create_game_history)
         check_func_args(cls.create_table_msg, DBI.create_table_msg)
+        check_func_args(cls.add_table_msg, DBI.add_table_msg)
 
     def __init__(self) -> None:
         pass
@@ -39,11 +41,18 @@ class X_DBI:
     async def close_game(self, id: int, players):
         pass
 
+    async def create_game_history(self, id: int, *, user_ids, data: bytes):
+        pass
+
     async def create_table_msg(self, *, table_id, game_id, msg_type, props, cmd_id=None, client_id=None):
         msg = Message(table_id=table_id, game_id=game_id, msg_type=msg_type, props=props, cmd_id=cmd_id, client_id=client_id)
         logger.debug("table_msg %s", msg)
         X_DBI._events.append(msg)
 
+    def add_table_msg(self, *, table_id, game_id, msg_type, props, cmd_id=None, client_id=None):
+        msg = Message(table_id=table_id, game_id=game_id, msg_type=msg_type, props=props, cmd_id=cmd_id, client_id=client_id)
+        logger.debug("table_msg %s", msg)
+        X_DBI._events.append(msg)
 
     async def lock_table_engine_id(self, table_id):
         pass
@@ -37,6 +37,8 @@ class X_CaseMixIn:
     SLEEP_ROUND_RESULT = 0
     SLEEP_SHOWDOWN_CARDS = 0
     SLEEP_GAME_END = 0
+    # эквити проверяется отдельно (test_04_equity)
+    EQUITY_ENABLED = False
 
     def __init__(self, table, _users, _deck, _moves, **kwargs) -> None:
         super().__init__(table, x_users(_users), **kwargs)
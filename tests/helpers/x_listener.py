@@ -3,9 +3,9 @@ import asyncio
 from ravvi_poker.db.listener import DBI, Notify, DBI_Listener
 
 class X_DBI_Listener(DBI_Listener):
-    def __init__(self, channel, sleep=1) -> None:
+    def __init__(self, *channels, sleep=1) -> None:
         super().__init__()
-        self.channels = {channel: self.on_expected}
+        self.channels = {channel: self.on_expected for channel in channels}
         self.expected = []
         self._sleep = sleep
 